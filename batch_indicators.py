@@ -0,0 +1,149 @@
+import numpy as np
+
+#-------------------------------------------------------------------------------
+# Indicators for many tickers at once
+#
+# Every function takes a date x symbol matrix of closing prices (a 2-D NumPy
+# array or a DataFrame with one column per symbol, e.g. the whole S&P 500) and
+# returns arrays of the same shape, row t / column j being the indicator of
+# symbol j on date t. The results match the one-ticker functions in
+# stock_performance.py column by column.
+#
+# Symbols with a shorter history can have leading NaN rows, their indicators
+# start at their first price like a DataFrame starting on that date would.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# Turn the input into a float64 date x symbol matrix
+#-------------------------------------------------------------------------------
+def as_matrix(closes):
+    closes = np.asarray(closes, dtype=np.float64)
+    if (closes.ndim == 1):
+        closes = closes.reshape(-1, 1)
+    return closes
+
+#-------------------------------------------------------------------------------
+# Rolling sum and number of non-NaN values over the last `window` rows
+#-------------------------------------------------------------------------------
+def rolling_sum(values, window):
+    valid = ~np.isnan(values)
+
+    # Cumulative sums with a leading row of zeros, a window is then a difference
+    sums = np.zeros((values.shape[0] + 1, values.shape[1]))
+    counts = np.zeros((values.shape[0] + 1, values.shape[1]), dtype=np.int64)
+    np.cumsum(np.where(valid, values, 0.0), axis=0, out=sums[1:])
+    np.cumsum(valid, axis=0, out=counts[1:])
+
+    start = np.maximum(np.arange(1, values.shape[0] + 1) - window, 0)
+    end = np.arange(1, values.shape[0] + 1)
+
+    return sums[end] - sums[start], counts[end] - counts[start]
+
+#-------------------------------------------------------------------------------
+# Simple Moving Average, rolling(window=window).mean() on every column
+#-------------------------------------------------------------------------------
+def sma_matrix(closes, window=100):
+    closes = as_matrix(closes)
+    sums, counts = rolling_sum(closes, window)
+
+    # Like pandas, a full window of prices is needed
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums / window, np.nan)
+
+#-------------------------------------------------------------------------------
+# Exponential Moving Average, ewm(span=window, adjust=False).mean() on every column
+#
+# The recursion ema[t] = keep[t] * ema[t-1] + add[t] is solved for all dates
+# at once with a prefix scan: after the pass with shift s, row t holds the
+# recursion over its last 2s rows, so log2(dates) passes cover the history.
+#
+# Missing prices follow pandas (ignore_na=False): the last value is carried
+# over the gap, and it decays once per missing row, so the next price weighs
+# alpha / ((1 - alpha)**(gap + 1) + alpha) instead of alpha.
+#-------------------------------------------------------------------------------
+def ema_matrix(closes, window=20):
+    closes = as_matrix(closes)
+    alpha = 2 / (window + 1)
+
+    valid = ~np.isnan(closes)
+    rows = np.arange(closes.shape[0]).reshape(-1, 1)
+
+    # Row of the last price up to each row and before it, -1 if there is none
+    last = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    previous = np.vstack([np.full((1, closes.shape[1]), -1), last[:-1]])
+
+    # Weight of each price, all of it for the first price of a symbol
+    weight = alpha / ((1 - alpha) ** (rows - previous) + alpha)
+    weight = np.where(valid, np.where(previous < 0, 1.0, weight), 0.0)
+
+    keep = 1 - weight
+    add = weight * np.where(valid, closes, 0.0)
+
+    shift = 1
+    while shift < closes.shape[0]:
+        add[shift:] += keep[shift:] * add[:-shift]
+        keep[shift:] *= keep[:-shift]
+        shift *= 2
+
+    # NaN until the first price
+    return np.where(last >= 0, add, np.nan)
+
+#-------------------------------------------------------------------------------
+# Relative Strength Index on every column, same as stock_performance.RSI
+#-------------------------------------------------------------------------------
+def rsi_matrix(closes, window=14):
+    closes = as_matrix(closes)
+
+    diff = np.full_like(closes, np.nan)
+    diff[1:] = closes[1:] - closes[:-1]
+
+    # NaN stays NaN so it doesn't count in the rolling means
+    gain = np.where(diff < 0, 0.0, diff)
+    loss = np.where(diff > 0, 0.0, -diff)
+
+    gain_sums, counts = rolling_sum(gain, window)
+    loss_sums, _ = rolling_sum(loss, window)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # rolling(..., min_periods=1): one change in the window is enough
+        avg_gain = np.where(counts > 0, gain_sums / counts, np.nan)
+        avg_loss = np.where(counts > 0, loss_sums / counts, np.nan)
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+#-------------------------------------------------------------------------------
+# MACD, Signal Line and Histogram on every column, same as stock_performance.MACD
+#-------------------------------------------------------------------------------
+def macd_matrix(closes, short_window=12, long_window=26, signal_window=9):
+    """
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: MACD, Signal_Line, MACD_Hist.
+    """
+    closes = as_matrix(closes)
+
+    macd = ema_matrix(closes, short_window) - ema_matrix(closes, long_window)
+    signal = ema_matrix(macd, signal_window)
+
+    return macd, signal, macd - signal
+
+#-------------------------------------------------------------------------------
+# Cross-sectional screen: latest RSI and MACD of every symbol
+#-------------------------------------------------------------------------------
+def latest_rsi_macd(closes, rsi_window=14, macd_windows=(12, 26, 9)):
+    """
+    Args:
+        closes (DataFrame or np.ndarray): Date x symbol closing prices.
+
+    Returns:
+        Dict[str, np.ndarray]: 'RSI', 'MACD', 'Signal_Line' and 'MACD_Hist' on
+        the last date, one value per symbol (column order of closes).
+    """
+    rsi = rsi_matrix(closes, rsi_window)
+    macd, signal, hist = macd_matrix(closes, *macd_windows)
+
+    return {
+        'RSI': rsi[-1],
+        'MACD': macd[-1],
+        'Signal_Line': signal[-1],
+        'MACD_Hist': hist[-1],
+    }
@@ -0,0 +1,327 @@
+#-------------------------------------------------------------------------------
+# Candlestick scan without the web app
+#
+# The functions here are the scanning core used by the Candlestick page, the
+# background worker and the command line:
+#
+#   python batch_scan.py --universe ndx
+#   python batch_scan.py --universe sp500 --patterns CDLENGULFING CDLHAMMER --format csv -o sp500.csv
+#   python batch_scan.py --universe screener --sector Technology --top 200 --workers 8
+#   python batch_scan.py --universe file --symbols-file my_symbols.txt --no-download
+#   python batch_scan.py --universe sp500 --history 250 --initial-days 400 --stats
+#   python batch_scan.py --universe ndx --timeframe 1wk
+#   python batch_scan.py --universe ndx --interval 5m --timeframe 1h
+#
+# Matches are written as JSON Lines (default) or CSV, to stdout or --output.
+# With --history every bullish and bearish occurrence over the last N bars is
+# written instead, with forward returns, or with --stats the hit counts and
+# forward return statistics of every pattern.
+# A summary with the time spent in every phase goes to stderr as JSON.
+#-------------------------------------------------------------------------------
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from candlestick_patterns import candlesticks
+from constituents import ConstituentsManager
+from datastore import (CsvStore, refresh_store, convert_csv_to_memmap, storage_backends, store_directory,
+                       source_intervals)
+from downloader import yfinance_fetcher, interval_fetcher
+from instrumentation import timed, count, record_error
+from scan_cache import scan_cache_key, data_version, get_shared_scan_cache
+from scanner import scan_symbols, scan_history, pattern_statistics, default_horizons
+from screener import load_screener, yahoo_symbol, numeric_columns
+from timeframes import timeframes, intraday_history_days, derivable, history_days
+from universes import universes, screener_data_directory, scan_workers, scan_executor, download_workers, storage_backend
+
+# Data directory of symbols given in a file
+custom_data_directory = 'data/custom'
+
+#-------------------------------------------------------------------------------
+# Download the missing bars of the symbols into the csv store of a universe,
+# plus the memory-mapped copy when that is the scan backend. Intraday bars go
+# to their own store, every coarser timeframe is resampled from them.
+#-------------------------------------------------------------------------------
+def refresh_data(data_directory, symbol_list, fetcher=yfinance_fetcher, backend=storage_backend,
+                 max_workers=download_workers, progress=None, initial_days=10, interval='1d'):
+    """
+    Args:
+        initial_days (int): Trading days downloaded for a symbol not stored yet.
+        interval (str): Bar interval to download, '1d' or an intraday one such
+            as '5m', which needs a fetcher(symbol, start, end, interval).
+
+    Returns:
+        DownloadReport: Which symbols succeeded and failed.
+    """
+    if (interval != '1d'):
+        fetcher = interval_fetcher(fetcher, interval)
+        data_directory = store_directory(data_directory, interval)
+
+    # The store of data/custom, the screener or a new interval may not exist yet
+    os.makedirs(data_directory, exist_ok=True)
+
+    with timed('download'):
+        report = refresh_store(CsvStore(data_directory), symbol_list, fetcher=fetcher, initial_days=initial_days,
+                               max_workers=max_workers, progress=progress, interval=interval)
+
+    for symbol, error in report.failed.items():
+        record_error('download', symbol, error)
+
+    if (backend == 'memmap' and interval == '1d'):
+        with timed('convert_memmap'):
+            convert_csv_to_memmap(data_directory)
+
+    return report
+
+#-------------------------------------------------------------------------------
+# Scan cache key of a timeframe. Daily scans keep their keys, the bars of the
+# other timeframes may be resampled from any store of the universe, so the
+# versions of all of them are part of the key.
+#-------------------------------------------------------------------------------
+def timeframe_cache_key(data_directory, symbol_list, patterns, timeframe):
+    if (timeframe == '1d'):
+        return scan_cache_key(data_directory, symbol_list, patterns)
+
+    versions = [data_version(store_directory(data_directory, interval), symbol_list)
+                for interval in source_intervals(data_directory, timeframe)]
+    return scan_cache_key(data_directory, symbol_list, patterns, mode=':'.join(['last', timeframe] + versions))
+
+#-------------------------------------------------------------------------------
+# Scan symbols for candlestick patterns, all patterns by default
+#-------------------------------------------------------------------------------
+def scan_data(data_directory, symbol_list, patterns=None, workers=scan_workers, executor=scan_executor,
+              backend=storage_backend, progress=None, cache=None, timeframe='1d'):
+    """
+    Args:
+        cache (ScanCache): Results are taken from and stored in it when given.
+        timeframe (str): Bars the patterns run on, e.g. '1d', '1wk' or '1h'.
+
+    Returns:
+        List[Tuple[str, str]]: (TA-Lib pattern, symbol) matches, pattern by pattern.
+    """
+    if (patterns is None):
+        patterns = list(candlesticks.keys())
+
+    if (cache is not None):
+        key = timeframe_cache_key(data_directory, symbol_list, patterns, timeframe)
+        matches = cache.get(key)
+        if (matches is not None):
+            count('scan_cache_hits')
+            return matches
+        count('scan_cache_misses')
+
+    with timed('scan'):
+        matches = scan_symbols(data_directory, symbol_list, patterns, progress, workers=workers,
+                               executor=executor, backend=backend, timeframe=timeframe)
+    count('symbols_scanned', len(symbol_list))
+
+    if (cache is not None):
+        cache.put(key, matches)
+
+    return matches
+
+class BatchResult:
+    def __init__(self, symbols, matches, failed, timings, empty=None):
+        self.symbols = symbols
+        self.matches = matches
+        self.failed = failed
+        self.empty = empty or []
+        self.timings = timings
+
+#-------------------------------------------------------------------------------
+# Download and scan, timing each phase
+#-------------------------------------------------------------------------------
+def run_batch_scan(data_directory, symbol_list, patterns=None, download=True, workers=scan_workers,
+                   executor=scan_executor, backend=storage_backend, fetcher=yfinance_fetcher, timings=None,
+                   history=None, horizons=default_horizons, initial_days=10, cache=None, interval='1d',
+                   timeframe='1d'):
+    """
+    Args:
+        timings (dict): Earlier phases (e.g. 'symbols') to include in the result.
+        cache (ScanCache): Cache of last bar scan results.
+        history (int): Scan the last `history` bars instead of the last bar.
+        horizons (Tuple[int, ...]): Forward return horizons of a history scan.
+        initial_days (int): Trading days downloaded for a symbol not stored yet.
+        interval (str): Bar interval downloaded, '1d' or an intraday one.
+        timeframe (str): Bars the last bar scan runs on.
+
+    Returns:
+        BatchResult: symbols, matches (scanner.scan_history records with
+        history), symbols whose download failed, and seconds per phase.
+    """
+    timings = dict(timings or {})
+    failed = []
+    empty = []
+
+    if (download):
+        start = time.perf_counter()
+        report = refresh_data(data_directory, symbol_list, fetcher=fetcher, backend=backend,
+                              initial_days=initial_days, interval=interval)
+        failed = sorted(report.failed)
+        empty = sorted(report.empty)
+        timings['download'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if (history is None):
+        matches = scan_data(data_directory, symbol_list, patterns, workers=workers, executor=executor,
+                            backend=backend, cache=cache, timeframe=timeframe)
+    else:
+        matches = scan_history(data_directory, symbol_list, patterns, history, horizons, workers=workers,
+                               executor=executor, backend=backend)
+    timings['scan'] = time.perf_counter() - start
+
+    return BatchResult(list(symbol_list), matches, failed, timings, empty)
+
+#-------------------------------------------------------------------------------
+# Output
+#-------------------------------------------------------------------------------
+def match_rows(matches):
+    for pattern, symbol in matches:
+        yield {'pattern': pattern, 'name': candlesticks.get(pattern), 'symbol': symbol}
+
+def history_rows(records, symbol_list, patterns):
+    returns = [name for name in records.dtype.names if name.startswith('return_')]
+
+    for record in records:
+        pattern = patterns[record['pattern']]
+        row = {'symbol': symbol_list[record['symbol']], 'pattern': pattern, 'name': candlesticks.get(pattern),
+               'date': str(record['date']), 'signal': int(record['signal'])}
+
+        # NaN isn't valid JSON, a return not known yet is null
+        for name in returns:
+            row[name] = None if record[name] != record[name] else round(float(record[name]), 6)
+        yield row
+
+def statistics_rows(table):
+    for row in table.to_dict('records'):
+        yield {name: (None if value != value else value.item() if hasattr(value, 'item') else value)
+               for name, value in row.items()}
+
+def write_rows(rows, out, output_format='jsonl'):
+    if (output_format == 'csv'):
+        writer = None
+        for row in rows:
+            if (writer is None):
+                writer = csv.DictWriter(out, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+    else:
+        for row in rows:
+            out.write(json.dumps(row) + '\n')
+
+#-------------------------------------------------------------------------------
+# Symbols and data directory of the universe chosen on the command line
+#-------------------------------------------------------------------------------
+def resolve_universe(args):
+    if (args.universe in universes):
+        symbols = ConstituentsManager(args.universe).get(force=args.refresh_symbols).symbols
+        return symbols, universes[args.universe]['data_directory']
+
+    if (args.universe == 'screener'):
+        ranges = {'Market Cap': (args.min_market_cap * 1e9, None)} if args.min_market_cap else None
+        symbols = load_screener().select(sector=args.sector, ranges=ranges, top=args.top, by=args.by)
+        return [yahoo_symbol(symbol) for symbol in symbols if '^' not in symbol], screener_data_directory
+
+    with open(args.symbols_file, 'r') as f:
+        return f.read().split(), args.data_directory or custom_data_directory
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Scan a universe of symbols for candlestick patterns.')
+    parser.add_argument('--universe', choices=sorted(universes) + ['screener', 'file'], default='ndx')
+    parser.add_argument('--symbols-file', help='one symbol per line, for --universe file')
+    parser.add_argument('--data-directory', help='where the data of --universe file is kept')
+    parser.add_argument('--refresh-symbols', action='store_true', help='refresh the index constituents first')
+    parser.add_argument('--sector', nargs='+', help='screener sectors')
+    parser.add_argument('--min-market-cap', type=float, default=0, help='screener minimum, billion $')
+    parser.add_argument('--top', type=int, help='screener: only the top N by --by')
+    parser.add_argument('--by', choices=numeric_columns, default='Volume', help='screener column for --top')
+    parser.add_argument('--patterns', nargs='+', metavar='CDL...', help='TA-Lib pattern names, default all')
+    parser.add_argument('--workers', type=int, default=scan_workers)
+    parser.add_argument('--executor', choices=['process', 'thread'], default=scan_executor)
+    parser.add_argument('--backend', choices=sorted(storage_backends), default=storage_backend)
+    parser.add_argument('--no-download', dest='download', action='store_false', help='scan the stored data only')
+    parser.add_argument('--no-cache', dest='cache', action='store_false', help="don't use the scan result cache")
+    parser.add_argument('--initial-days', type=int,
+                        help='trading days downloaded for new symbols, default 10, 20 weeks or 20 months of '
+                             'days for --timeframe 1wk or 1mo')
+    parser.add_argument('--interval', choices=['1d'] + list(intraday_history_days), default='1d',
+                        help='bar interval to download')
+    parser.add_argument('--timeframe', choices=list(timeframes),
+                        help='bars to scan, resampled from the stored bars, default --interval')
+    parser.add_argument('--history', type=int, metavar='BARS', help='report every occurrence in the last BARS bars')
+    parser.add_argument('--horizons', type=int, nargs='+', default=list(default_horizons),
+                        help='forward return horizons in bars, with --history')
+    parser.add_argument('--stats', action='store_true', help='with --history, write statistics per pattern')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('-o', '--output', help='output file, default stdout')
+    args = parser.parse_args(argv)
+
+    if (args.universe == 'file' and not args.symbols_file):
+        parser.error('--universe file needs --symbols-file')
+    if (args.stats and args.history is None):
+        parser.error('--stats needs --history')
+
+    if (args.timeframe is None):
+        args.timeframe = args.interval
+    if (args.interval != '1d' and not derivable(args.interval, args.timeframe)):
+        parser.error(f'--timeframe {args.timeframe} bars can\'t be built from --interval {args.interval} bars')
+    if (args.interval != '1d' and args.timeframe == '1d'):
+        parser.error('--timeframe 1d scans the daily store, download it with --interval 1d')
+    if (args.history is not None and args.timeframe != '1d'):
+        parser.error('--history scans daily bars only')
+    if (args.initial_days is None):
+        args.initial_days = history_days(args.timeframe)
+
+    patterns = None
+    if (args.patterns):
+        patterns = [pattern.upper() for pattern in args.patterns]
+        unknown = [pattern for pattern in patterns if pattern not in candlesticks]
+        if (unknown):
+            parser.error('unknown patterns: ' + ', '.join(unknown))
+
+    start = time.perf_counter()
+    symbol_list, data_directory = resolve_universe(args)
+    timings = {'symbols': time.perf_counter() - start}
+
+    result = run_batch_scan(data_directory, symbol_list, patterns, download=args.download, workers=args.workers,
+                            executor=args.executor, backend=args.backend, timings=timings, history=args.history,
+                            horizons=tuple(args.horizons), initial_days=args.initial_days,
+                            cache=get_shared_scan_cache() if args.cache else None, interval=args.interval,
+                            timeframe=args.timeframe)
+
+    start = time.perf_counter()
+    if (args.history is None):
+        rows = match_rows(result.matches)
+    elif (args.stats):
+        rows = statistics_rows(pattern_statistics(result.matches, patterns))
+    else:
+        rows = history_rows(result.matches, result.symbols, patterns or list(candlesticks.keys()))
+
+    if (args.output):
+        with open(args.output, 'w', newline='') as out:
+            write_rows(rows, out, args.format)
+    else:
+        write_rows(rows, sys.stdout, args.format)
+    result.timings['write'] = time.perf_counter() - start
+
+    summary = {
+        'universe': args.universe,
+        'timeframe': args.timeframe,
+        'symbols': len(result.symbols),
+        'matches': len(result.matches),
+        'failed_downloads': result.failed,
+        'empty_downloads': result.empty,
+        'timings': {phase: round(seconds, 3) for phase, seconds in result.timings.items()},
+    }
+    print(json.dumps(summary), file=sys.stderr)
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
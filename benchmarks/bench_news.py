@@ -0,0 +1,112 @@
+#-------------------------------------------------------------------------------
+# Compare the headline extraction approaches on recorded pages
+#
+#   python benchmarks/bench_news.py page1.html page2.html ...
+#
+# Without arguments a synthetic page with a few thousand links is used.
+# For every approach: parse time (best of --repeat runs), peak memory
+# (tracemalloc) and for the streaming parser the time to the first headline.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from news_fetcher import iter_headlines, parse_headlines, parse_headlines_soup, html_parser
+
+base_url = 'https://www.businesstoday.in'
+
+#-------------------------------------------------------------------------------
+# The full-tree approach: build the whole document, then find_all('a')
+#-------------------------------------------------------------------------------
+def parse_headlines_full_tree(html, base_url):
+    from bs4 import BeautifulSoup as BS
+
+    trav = BS(html, "html.parser")
+
+    headlines = []
+    for link in trav.find_all('a'):
+        if (
+            str(type(link.string)) == "<class 'bs4.element.NavigableString'>"
+            and len(link.string.strip()) > 35
+        ):
+            href = link['href']
+            headlines.append((link.string.strip(), href if href.startswith('http') else base_url + href))
+
+    return headlines
+
+#-------------------------------------------------------------------------------
+# A page shaped like a news listing: navigation, teasers and article links
+#-------------------------------------------------------------------------------
+def synthetic_page(articles=2000):
+    parts = ['<html><head><title>Economy</title></head><body><nav>']
+    parts += [f'<a href="/section/{i}">Section {i}</a>' for i in range(50)]
+    parts.append('</nav><main>')
+
+    for i in range(articles):
+        parts.append(
+            f'<div class="story"><a href="/story/{i}"><img src="/img/{i}.jpg"/></a>'
+            f'<h2><a href="/story/{i}">Economy update number {i}: markets move on the latest policy news</a></h2>'
+            f'<p>Teaser text for story {i} with <b>bold</b> words and more words.</p></div>'
+        )
+
+    parts.append('</main></body></html>')
+    return ''.join(parts).encode('utf-8')
+
+#-------------------------------------------------------------------------------
+# Time and peak memory of one approach
+#-------------------------------------------------------------------------------
+def measure(function, html, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(html, base_url)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(html, base_url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'seconds': round(best, 5), 'peak_mb': round(peak / 2**20, 2), 'headlines': len(result)}
+
+def first_headline_seconds(html, chunk_size=16 * 1024):
+    chunks = (html[i:i + chunk_size] for i in range(0, len(html), chunk_size))
+
+    start = time.perf_counter()
+    next(iter_headlines(chunks, base_url), None)
+    return round(time.perf_counter() - start, 5)
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the headline extraction.')
+    parser.add_argument('pages', nargs='*', help='recorded HTML pages')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pages = {path: open(path, 'rb').read() for path in args.pages} or {'synthetic': synthetic_page()}
+
+    results = []
+    for name, html in pages.items():
+        results.append({
+            'page': name,
+            'bytes': len(html),
+            'full_tree_html_parser': measure(parse_headlines_full_tree, html, args.repeat),
+            f'soup_strainer_{html_parser()}': measure(parse_headlines_soup, html, args.repeat),
+            'streaming': dict(measure(parse_headlines, html, args.repeat),
+                              first_headline_seconds=first_headline_seconds(html)),
+        })
+
+    print(json.dumps(results, indent=2))
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#-------------------------------------------------------------------------------
+# Memory of a whole universe held as DataFrames vs. as one OHLC panel
+#
+#   python benchmarks/bench_panel.py data/sp500
+#   python benchmarks/bench_panel.py --symbols 2000 --bars 2500
+#
+# Without a directory a synthetic universe of csv files (same columns as the
+# yfinance downloads) is written to a temporary directory first. Each layout
+# is then loaded in a fresh interpreter:
+#   dataframes - one pd.read_csv DataFrame per symbol, what the scan used to keep
+#   panel      - ohlc_panel.load_panel
+# and reports the memory it retains (tracemalloc) and the peak RSS.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pandas as pd
+from datastore import CsvStore
+from ohlc_panel import load_panel
+from synthetic import write_synthetic
+
+#-------------------------------------------------------------------------------
+# Load the universe in one layout, runs in the child interpreter
+#-------------------------------------------------------------------------------
+def load_layout(directory, layout):
+    symbol_list = CsvStore(directory).symbols()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    if (layout == 'dataframes'):
+        data = {symbol: pd.read_csv(os.path.join(directory, symbol + '.csv')) for symbol in symbol_list}
+        bars = sum(len(df) for df in data.values())
+    else:
+        data = load_panel(directory, symbol_list)
+        bars = data.values.shape[1]
+
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        'layout': layout,
+        'symbols': len(symbol_list),
+        'bars': bars,
+        'seconds': round(elapsed, 3),
+        'retained_mb': round(retained / 2**20, 2),
+        'peak_mb': round(peak / 2**20, 2),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the memory of the OHLC panel.')
+    parser.add_argument('csv_directory', nargs='?', help='directory holding <symbol>.csv files')
+    parser.add_argument('--symbols', type=int, default=500, help='synthetic symbols')
+    parser.add_argument('--bars', type=int, default=2500, help='synthetic bars per symbol')
+    parser.add_argument('--child', nargs=2, metavar=('DIRECTORY', 'LAYOUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if (args.child):
+        print(json.dumps(load_layout(*args.child)))
+        return
+
+    with tempfile.TemporaryDirectory() as synthetic_directory:
+        directory = args.csv_directory
+        if (directory is None):
+            directory = synthetic_directory
+            write_synthetic(directory, args.symbols, args.bars)
+
+        results = []
+        for layout in ('dataframes', 'panel'):
+            output = subprocess.run([sys.executable, __file__, '--child', directory, layout],
+                                    check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output))
+
+    ratio = results[1]['retained_mb'] / results[0]['retained_mb'] if results[0]['retained_mb'] else None
+    print(json.dumps({'results': results, 'panel_share': round(ratio, 4) if ratio else None}, indent=2))
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#-------------------------------------------------------------------------------
+# Import time and memory of every page of the app
+#
+#   python benchmarks/bench_startup.py
+#   python benchmarks/bench_startup.py --repeat 5 --max-seconds 2.0
+#
+# Every page module is imported in a fresh interpreter, the way a new app
+# process opens its first page:
+#   cold - with an empty bytecode cache, every module is compiled
+#   warm - with the bytecode cache of the cold run
+# The median of --repeat runs is reported with the peak RSS and the heavy
+# libraries the page pulled in. streamlit, which every page imports, is the
+# baseline. With --max-seconds the exit status is 1 when a warm import of a
+# page takes longer, to catch an import creeping back into a page.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+root_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Same module names as the pages mapping in main.py
+page_modules = ['stock_performance', 'candlestick', 'tickers', 'news']
+
+heavy_modules = ['talib', 'yfinance', 'yahooquery', 'plotly', 'matplotlib', 'bs4', 'lxml', 'pandas', 'numpy']
+
+#-------------------------------------------------------------------------------
+# Import one module, runs in the child interpreter
+#-------------------------------------------------------------------------------
+child_code = '''
+import importlib, json, resource, sys, time
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({
+    'seconds': seconds,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in sys.argv[2:] if name in sys.modules],
+}))
+'''
+
+def import_in_child(module, pycache_directory):
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=pycache_directory)
+    output = subprocess.run([sys.executable, '-c', child_code, module] + heavy_modules, cwd=root_directory,
+                            env=env, check=True, capture_output=True, text=True).stdout
+
+    # Streamlit may log warnings about running without `streamlit run`, the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+#-------------------------------------------------------------------------------
+# Cold and warm import of one module
+#-------------------------------------------------------------------------------
+def measure(module, repeat):
+    cold = []
+    warm = []
+    runs = []
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as pycache_directory:
+            cold.append(import_in_child(module, pycache_directory)['seconds'])
+            runs.append(import_in_child(module, pycache_directory))
+            warm.append(runs[-1]['seconds'])
+
+    return {
+        'module': module,
+        'cold_seconds': round(statistics.median(cold), 3),
+        'warm_seconds': round(statistics.median(warm), 3),
+        'max_rss_mb': round(statistics.median(run['max_rss_mb'] for run in runs), 1),
+        'loaded': runs[-1]['loaded'],
+    }
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the app pages.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-seconds', type=float, help='fail when a warm page import takes longer')
+    parser.add_argument('modules', nargs='*', default=['streamlit'] + page_modules)
+    args = parser.parse_args()
+
+    results = [measure(module, args.repeat) for module in args.modules]
+    print(json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2))
+
+    if (args.max_seconds is not None):
+        slow = [result['module'] for result in results
+                if result['module'] in page_modules and result['warm_seconds'] > args.max_seconds]
+        if (slow):
+            print('Slower than {}s: {}'.format(args.max_seconds, ', '.join(slow)), file=sys.stderr)
+            sys.exit(1)
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#-------------------------------------------------------------------------------
+# Compare load time and memory of the OHLC storage backends
+#
+#   python benchmarks/bench_storage.py data/sp500
+#
+# The csv files of the directory are converted to a memmap store in a temporary
+# directory, then every backend loads all symbols in a fresh interpreter so
+# the peak RSS of one backend doesn't leak into the next.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from datastore import open_store, convert_csv_to_memmap
+
+#-------------------------------------------------------------------------------
+# Load every symbol of a store once, runs in the child interpreter
+#-------------------------------------------------------------------------------
+def load_all(directory, backend, symbol_list):
+    start = time.perf_counter()
+
+    store = open_store(directory, backend)
+    bars = 0
+    checksum = 0.0
+
+    for symbol in symbol_list:
+        ohlc = store.load_ohlc(symbol)
+        if (ohlc is not None):
+            bars += len(ohlc[3])
+            # Touch the data so the memmap pages are really read
+            checksum += float(ohlc[3].sum())
+
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    return {
+        'backend': backend,
+        'symbols': len(symbol_list),
+        'bars': bars,
+        'seconds': round(elapsed, 4),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'checksum': checksum,
+    }
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OHLC storage backends.')
+    parser.add_argument('csv_directory', help='directory holding <symbol>.csv files')
+    parser.add_argument('--child', nargs=2, metavar=('DIRECTORY', 'BACKEND'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    symbol_list = sorted(name[:-len('.csv')] for name in os.listdir(args.csv_directory) if name.endswith('.csv'))
+
+    if (args.child):
+        print(json.dumps(load_all(args.child[0], args.child[1], symbol_list)))
+        return
+
+    with tempfile.TemporaryDirectory() as memmap_directory:
+        start = time.perf_counter()
+        convert_csv_to_memmap(args.csv_directory, memmap_directory, symbol_list)
+        convert_seconds = time.perf_counter() - start
+
+        results = []
+        for directory, backend in ((args.csv_directory, 'csv'), (memmap_directory, 'memmap')):
+            output = subprocess.run([sys.executable, __file__, args.csv_directory, '--child', directory, backend],
+                                    check=True, capture_output=True, text=True).stdout
+            results.append(json.loads(output))
+
+    print(json.dumps({'convert_seconds': round(convert_seconds, 4), 'results': results}, indent=2))
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
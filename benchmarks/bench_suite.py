@@ -0,0 +1,389 @@
+#-------------------------------------------------------------------------------
+# Offline benchmark suite of the hot paths
+#
+#   python benchmarks/bench_suite.py                          # everything at 100, 500 and 7000 symbols
+#   python benchmarks/bench_suite.py --sizes 100 500 -o before.json
+#   python benchmarks/bench_suite.py --only scan tickers --compare before.json
+#   python benchmarks/bench_suite.py --record                 # re-record the HTML fixtures
+#
+# Nothing is downloaded: the symbols are a deterministic synthetic universe
+# (see synthetic.py), the news page and the Wikipedia tables are the HTML
+# fixtures in benchmarks/fixtures. Every benchmark and size runs in a fresh
+# interpreter so its peak memory is its own, and reports:
+#   throughput_per_s - items (symbols, queries, pages) per second
+#   latency_ms       - p50, p90, p99 and max of one item
+#   max_rss_mb       - peak RSS of the interpreter, rss_growth_mb the part
+#                      added by the benchmark, the modules it imports included
+# The results go to stdout or --output as JSON. With --compare the ratios to
+# an earlier result file are written to stderr, a throughput ratio below 1 or
+# a latency ratio above 1 is a regression.
+#-------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+benchmark_directory = os.path.dirname(os.path.abspath(__file__))
+root_directory = os.path.join(benchmark_directory, '..')
+fixture_directory = os.path.join(benchmark_directory, 'fixtures')
+
+sys.path.insert(0, root_directory)
+
+from datastore import convert_csv_to_memmap, storage_backends
+from synthetic import write_synthetic
+
+default_sizes = [100, 500, 7000]
+
+# The pages the fixtures were recorded from, as (file, url)
+fixtures = {
+    'news': ('businesstoday_economy.html', 'https://www.businesstoday.in/latest/economy'),
+    'ndx': ('wikipedia_nasdaq100.html', 'https://en.wikipedia.org/wiki/Nasdaq-100'),
+    'sp500': ('wikipedia_sp500.html', 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'),
+}
+
+def fixture_path(name):
+    return os.path.join(fixture_directory, fixtures[name][0])
+
+#-------------------------------------------------------------------------------
+# Timing helpers
+#-------------------------------------------------------------------------------
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(sorted_values, share):
+    if (not sorted_values):
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+def time_items(function, items):
+    """
+    Returns:
+        Tuple[float, List[float]]: Total seconds and the seconds of every item.
+    """
+    latencies = []
+    start = time.perf_counter()
+
+    for item in items:
+        item_start = time.perf_counter()
+        function(item)
+        latencies.append(time.perf_counter() - item_start)
+
+    return time.perf_counter() - start, latencies
+
+def summarize(items, seconds, latencies):
+    latencies = sorted(latencies)
+    return {
+        'items': items,
+        'seconds': round(seconds, 4),
+        'throughput_per_s': round(items / seconds, 2) if seconds > 0 else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 4) if latencies else None,
+            'p90': round(percentile(latencies, 0.90) * 1000, 4) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 4) if latencies else None,
+            'max': round(latencies[-1] * 1000, 4) if latencies else None,
+        },
+    }
+
+#-------------------------------------------------------------------------------
+# Benchmarks, each runs in a child interpreter and returns the timings of its
+# items. `symbol_list` is None for the ones that don't depend on the size.
+#-------------------------------------------------------------------------------
+def bench_process_symbol(args, data_directory, symbol_list):
+    # candlestick.py is the Candlestick page, importing it is part of its cost
+    from candlestick import process_symbol
+
+    seconds, latencies = time_items(lambda symbol: process_symbol(data_directory, symbol, args.pattern), symbol_list)
+    return summarize(len(symbol_list), seconds, latencies), {'pattern': args.pattern}
+
+def bench_scan(args, data_directory, symbol_list):
+    # The path of scan_symbols_for_candlestick_patterns, without the scan cache
+    from batch_scan import scan_data
+    from candlestick_patterns import candlesticks
+    from scanner import load_symbol_ohlc, scan_symbol
+
+    patterns = list(candlesticks.keys())
+
+    start = time.perf_counter()
+    matches = scan_data(data_directory, symbol_list, patterns, workers=args.workers, backend=args.backend)
+    seconds = time.perf_counter() - start
+
+    # Latency of one symbol (load and all patterns) on a sample, serially
+    sample = symbol_list[:args.latency_sample]
+    _, latencies = time_items(lambda symbol: scan_symbol(load_symbol_ohlc(data_directory, symbol, args.backend),
+                                                         patterns), sample)
+
+    result = summarize(len(symbol_list), seconds, latencies)
+    return result, {'patterns': len(patterns), 'matches': len(matches), 'workers': args.workers,
+                    'backend': args.backend, 'latency_sample': len(sample)}
+
+def bench_indicators(args, data_directory, symbol_list):
+    from datastore import CsvStore
+    from stock_performance import SMA, EMA, RSI, linear_regression, MACD
+
+    store = CsvStore(data_directory)
+    functions = {'SMA': SMA, 'EMA': EMA, 'RSI': RSI, 'linear_regression': linear_regression, 'MACD': MACD}
+    function_seconds = dict.fromkeys(functions, 0.0)
+    latencies = []
+
+    # Reading the csv files isn't part of the indicators
+    for symbol in symbol_list:
+        data = store.read(symbol)
+
+        symbol_start = time.perf_counter()
+        for name, function in functions.items():
+            start = time.perf_counter()
+            function(data)
+            function_seconds[name] += time.perf_counter() - start
+        latencies.append(time.perf_counter() - symbol_start)
+
+    result = summarize(len(symbol_list), sum(latencies), latencies)
+    return result, {'function_seconds': {name: round(seconds, 4) for name, seconds in function_seconds.items()}}
+
+def search_queries(df, count, seed):
+    """
+    Queries users type: exact symbols, the first letters of a name, a whole
+    name word and a name with two letters swapped.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), count)]
+
+    queries = []
+    for i, (symbol, name) in enumerate(zip(rows['Symbol'].astype(str), rows['Name'].astype(str))):
+        word = name.split()[0] if name.split() else symbol
+        kind = i % 4
+        if (kind == 0):
+            queries.append(symbol)
+        elif (kind == 1):
+            queries.append(word[:3])
+        elif (kind == 2):
+            queries.append(word)
+        elif (len(word) > 3):
+            queries.append(word[0] + word[2] + word[1] + word[3:])
+        else:
+            queries.append(word)
+
+    return queries
+
+def bench_tickers(args, data_directory, symbol_list):
+    import pandas as pd
+    from search_index import TickerIndex
+    from tickers import search_company_by_name, max_results
+
+    # The first `size` companies of the screener file the page searches
+    df = pd.read_csv(os.path.join(root_directory, 'nasdaq_screener.csv')).head(len(symbol_list))
+
+    start = time.perf_counter()
+    index = TickerIndex(df)
+    build_seconds = time.perf_counter() - start
+
+    queries = search_queries(df, args.queries, args.seed)
+    seconds, latencies = time_items(lambda query: search_company_by_name(df, query, index=index, limit=max_results),
+                                    queries)
+
+    return summarize(len(queries), seconds, latencies), {'companies': len(df), 'index_build_seconds': round(build_seconds, 4)}
+
+def bench_news(args, data_directory, symbol_list):
+    from news_fetcher import NewsFetcher, default_sources
+
+    with open(fixture_path('news'), 'rb') as f:
+        html = f.read()
+
+    class Response:
+        status_code = 200
+        headers = {}
+        content = html
+
+    # The fetch layer behind news.scraping, every get is a full refresh of the fixture
+    fetcher = NewsFetcher(sources=default_sources, ttl=0, http_get=lambda url, headers, timeout: Response())
+    source = default_sources[0]['name']
+
+    seconds, latencies = time_items(lambda _: fetcher.refresh(source), range(args.repeat))
+    return summarize(args.repeat, seconds, latencies), {'bytes': len(html),
+                                                        'headlines': len(fetcher.cache[source]['headlines'])}
+
+def bench_constituents(args, data_directory, symbol_list):
+    from constituents import wikipedia_symbols
+    from universes import universes
+
+    tables = [(fixture_path(key), universes[key]['table_num'], universes[key]['column_name']) for key in ('ndx', 'sp500')]
+    symbols = {}
+
+    def parse(table):
+        path, table_num, column_name = table
+        symbols[path] = len(wikipedia_symbols(path, table_num, column_name))
+
+    seconds, latencies = time_items(parse, tables * args.repeat)
+    return summarize(len(tables) * args.repeat, seconds, latencies), {'symbols': sorted(symbols.values())}
+
+# name -> (function, runs at every size)
+benchmarks = {
+    'process_symbol': (bench_process_symbol, True),
+    'scan': (bench_scan, True),
+    'indicators': (bench_indicators, True),
+    'tickers': (bench_tickers, True),
+    'news': (bench_news, False),
+    'constituents': (bench_constituents, False),
+}
+
+#-------------------------------------------------------------------------------
+# Run one benchmark, in the child interpreter
+#-------------------------------------------------------------------------------
+def run_child(args):
+    name, size, data_directory = args.child
+    size = int(size)
+    function, sized = benchmarks[name]
+
+    symbol_list = write_synthetic(data_directory, size, args.bars, args.seed) if sized else None
+
+    # Streamlit logs warnings about running without `streamlit run`
+    import logging
+    logging.disable(logging.WARNING)
+
+    rss_before = max_rss_mb()
+    result, details = function(args, data_directory, symbol_list)
+
+    result = dict({'benchmark': name, 'symbols': size if sized else None}, **result)
+    result['max_rss_mb'] = round(max_rss_mb(), 1)
+    result['rss_growth_mb'] = round(max_rss_mb() - rss_before, 1)
+    result['details'] = details
+    print(json.dumps(result))
+
+def child_arguments(args):
+    return ['--bars', str(args.bars), '--seed', str(args.seed), '--workers', str(args.workers),
+            '--backend', args.backend, '--pattern', args.pattern, '--queries', str(args.queries),
+            '--repeat', str(args.repeat), '--latency-sample', str(args.latency_sample)]
+
+def run_benchmark(args, name, size, data_directory):
+    output = subprocess.run([sys.executable, __file__, '--child', name, str(size), data_directory]
+                            + child_arguments(args), cwd=root_directory, check=True, capture_output=True,
+                            text=True).stdout
+
+    # The result is the last line, anything before it was printed by the code under test
+    return json.loads(output.strip().splitlines()[-1])
+
+#-------------------------------------------------------------------------------
+# Ratios to an earlier run
+#-------------------------------------------------------------------------------
+def compare(results, baseline_path):
+    with open(baseline_path, 'r') as f:
+        baseline = {(result['benchmark'], result['symbols']): result for result in json.load(f)['results']}
+
+    rows = []
+    for result in results:
+        old = baseline.get((result['benchmark'], result['symbols']))
+        if (old is None or not old['throughput_per_s'] or not old['latency_ms']['p50']):
+            continue
+
+        rows.append({
+            'benchmark': result['benchmark'],
+            'symbols': result['symbols'],
+            'throughput_ratio': round(result['throughput_per_s'] / old['throughput_per_s'], 3),
+            'p50_ratio': round(result['latency_ms']['p50'] / old['latency_ms']['p50'], 3),
+            'max_rss_ratio': round(result['max_rss_mb'] / old['max_rss_mb'], 3),
+        })
+
+    return rows
+
+#-------------------------------------------------------------------------------
+# Replace the fixtures with the live pages
+#-------------------------------------------------------------------------------
+def record_fixtures():
+    import requests
+
+    for name, (file_name, url) in fixtures.items():
+        response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(fixture_directory, file_name), 'wb') as f:
+            f.write(response.content)
+        print(f'{name}: {len(response.content)} bytes from {url}', file=sys.stderr)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root_directory, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths on synthetic data and recorded pages.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes, help='universe sizes in symbols')
+    parser.add_argument('--only', nargs='+', choices=sorted(benchmarks), help='benchmarks to run, all by default')
+    parser.add_argument('--bars', type=int, default=500, help='synthetic bars per symbol')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-directory', help='keep the synthetic data here between runs')
+    parser.add_argument('--workers', type=int, default=1, help='scan pool workers, 1 scans serially')
+    parser.add_argument('--backend', choices=sorted(storage_backends), default='csv')
+    parser.add_argument('--pattern', default='CDLENGULFING', help='pattern of the process_symbol benchmark')
+    parser.add_argument('--queries', type=int, default=500, help='searches of the tickers benchmark')
+    parser.add_argument('--repeat', type=int, default=20, help='runs of the news and constituents benchmarks')
+    parser.add_argument('--latency-sample', type=int, default=200, help='symbols timed one by one in the scan')
+    parser.add_argument('-o', '--output', help='write the results here instead of stdout')
+    parser.add_argument('--compare', metavar='RESULTS', help='earlier results to compare with')
+    parser.add_argument('--record', action='store_true', help='download the fixtures again and exit')
+    parser.add_argument('--child', nargs=3, metavar=('BENCHMARK', 'SIZE', 'DIRECTORY'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if (args.child):
+        run_child(args)
+        return
+
+    if (args.record):
+        record_fixtures()
+        return
+
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        # The synthetic files depend on the bars and the seed
+        base_directory = args.data_directory or temporary_directory
+        data_directory = os.path.join(os.path.abspath(base_directory), f'bars{args.bars}_seed{args.seed}')
+
+        # Write the largest universe once, the smaller ones are its first symbols
+        start = time.perf_counter()
+        write_synthetic(data_directory, max(args.sizes), args.bars, args.seed)
+        if (args.backend == 'memmap'):
+            convert_csv_to_memmap(data_directory)
+        generate_seconds = time.perf_counter() - start
+
+        results = []
+        for name in args.only or list(benchmarks):
+            _, sized = benchmarks[name]
+            for size in (sorted(args.sizes) if sized else [0]):
+                print(f'{name} {size or ""}'.rstrip(), file=sys.stderr)
+                results.append(run_benchmark(args, name, size, data_directory))
+
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'bars': args.bars,
+        'seed': args.seed,
+        'generate_seconds': round(generate_seconds, 2),
+        'results': results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if (args.output):
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if (args.compare):
+        print(json.dumps(compare(results, args.compare), indent=2), file=sys.stderr)
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import os
+import numpy as np
+import pandas as pd
+
+#-------------------------------------------------------------------------------
+# Deterministic synthetic OHLC data for the benchmarks
+#
+# Every symbol is a random walk drawn from its own generator, seeded by the
+# seed and the symbol's number, so the first 100 symbols of a 7000 symbol
+# universe are the same as a 100 symbol universe and the same seed always
+# writes the same files. The csv files look like the downloaded ones: Date
+# index, Open, High, Low, Close, Adj Close and Volume.
+#-------------------------------------------------------------------------------
+last_date = '2024-12-31'
+
+def synthetic_symbols(symbols):
+    return [f'S{n:05d}' for n in range(symbols)]
+
+#-------------------------------------------------------------------------------
+# Bars of the n-th symbol
+#-------------------------------------------------------------------------------
+def synthetic_ohlc(n, bars, seed=0):
+    """
+    Returns:
+        DataFrame: Daily bars ending on last_date. Symbols start on different
+        dates like real listings, so some have fewer than `bars` rows.
+    """
+    rng = np.random.default_rng([seed, n])
+    dates = pd.bdate_range(end=last_date, periods=bars, name='Date')
+
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    open_ = close * (1 + rng.normal(0, 0.01, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+    volume = rng.integers(10**5, 10**7, bars)
+
+    start = int(rng.integers(0, bars // 4 + 1))
+    data = pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close,
+                         'Adj Close': close, 'Volume': volume}, index=dates)
+    return data[start:]
+
+#-------------------------------------------------------------------------------
+# Write a synthetic universe as a csv store, files already there are kept
+#-------------------------------------------------------------------------------
+def write_synthetic(directory, symbols, bars, seed=0):
+    """
+    Returns:
+        List[str]: The symbols of the universe.
+    """
+    os.makedirs(directory, exist_ok=True)
+    symbol_list = synthetic_symbols(symbols)
+
+    for n, symbol in enumerate(symbol_list):
+        path = os.path.join(directory, symbol + '.csv')
+        if (not os.path.exists(path)):
+            synthetic_ohlc(n, bars, seed).to_csv(path)
+
+    return symbol_list
@@ -1,114 +1,113 @@
 import streamlit as st
 import os                   # a built-in os module with methods for interacting with the operating system
-import pandas as pd
-import yfinance as yf
+import math
 import talib
-import plotly.express as px
 import plotly.graph_objs as go
-from datetime import datetime, timedelta
 from candlestick_patterns import candlesticks
-from yahooquery import Ticker
+from scanner import load_symbol_ohlc
+from batch_scan import refresh_data, scan_data
+from datastore import CsvStore, stale_symbols
+from timeframes import history_days
+from scan_cache import get_shared_scan_cache
+from price_cache import get_shared_cache, cached_fetcher
+from screener import load_screener, yahoo_symbol
+from snapshots import latest_snapshot_name, load_snapshot
+from constituents import ConstituentsManager
+from universes import (universes, ndx_data_directory, ndx_symbols, sp500_data_directory, sp500_symbols,
+                       screener_data_directory, screener_symbols, snapshot_directory, storage_backend,
+                       data_refresh_seconds, earnings_offline)
+from earnings import EarningsCache
+from data_access import get_data_access, DeadlineExceeded
+from instrumentation import record_error, register_stats
 
 # Array of company symbols/tickers
 ndx_list = []
 sp500_list = []
 
 #-------------------------------------------------------------------------------
-# Paths, files and urls
+# For each symbol in the list, download the missing days of data into csv
+#   A symbol not stored yet gets the last `initial_days` trading days, a
+#   stored symbol only gets the bars after its last stored bar, or the whole
+#   range again when its history is shorter (see datastore.py).
 #-------------------------------------------------------------------------------
-ndx_url = 'https://en.wikipedia.org/wiki/Nasdaq-100'
-sp500_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-
-ndx_data_directory = 'data/ndx'
-ndx_symbols = ndx_data_directory + '/ndx.txt'
-ndx_test_symbol = ndx_data_directory + '/aapl.csv'
-
-sp500_data_directory = 'data/sp500'
-sp500_symbols = sp500_data_directory + '/sp500.txt'
-sp500_test_symbol = sp500_data_directory + '/tsla.csv'
-
-#-------------------------------------------------------------------------------
-# Download symbols from wikipedia and write to local file
-#-------------------------------------------------------------------------------
-def build_symbol_list(url, table_num, column_name, output_file):
-
-    list = []
-
-    # Download and sort list of symbols
-    list = sorted(pd.read_html(url)[table_num][column_name].tolist())
-
-    # Save list to file
-    with open(output_file, 'w') as file:
-        for item in list:
-            file.write(str(item) + '\n')
-            
-    return list
-
-#-------------------------------------------------------------------------------
-# For each symbol in the list, download data into csv
-#-------------------------------------------------------------------------------
-@st.cache_data
-def download_symbol_data(test_file, symbols_file, output_dir, message):
-
-    # If there is already a csv file, assume we've already created all the csv files
-    if (not os.path.exists(test_file)):
+@st.cache_data(ttl=data_refresh_seconds)
+def download_symbol_data(symbols_file, output_dir, message, symbol_list=None, initial_days=10):
 
+    # The symbols can be passed in directly, e.g. a screener selection, so they are part of the cache key
+    if (symbol_list is None):
         with open(symbols_file, 'r') as f:
             symbol_list = f.read().split()
+    else:
+        symbol_list = list(symbol_list)
 
-        start_date = datetime.today()
+    # Progress bar
+    progress_text = message
+    pbar = st.sidebar.progress(0, text=progress_text)
 
-        # Subtract 10 days, excluding weekends
-        days_to_subtract = 10
-        weekend_days = {5, 6}  # Saturday (5) and Sunday (6)
-        days_subtracted = 0
+    def progress(percent_complete):
+        pbar.progress(percent_complete, text=progress_text)
 
-        for _ in range(days_to_subtract):
-            start_date -= timedelta(days=1)
-            if start_date.weekday() in weekend_days:
-                days_to_subtract += 1  # Skip weekend day from the count
-            else:
-                days_subtracted += 1
+    # Download concurrently, symbols that fail don't stop the others and keep their old data
+    # (and rebuild the memory-mapped copy of the csv files when that is the scan backend)
+    report = refresh_data(output_dir, symbol_list, fetcher=cached_fetcher(get_shared_cache()), progress=progress,
+                          initial_days=initial_days)
 
-        # Progress bar
-        progress_text = message
-        pbar = st.sidebar.progress(0, text=progress_text)
-        increment = 1 / len(symbol_list)
+    if (report.failed):
+        st.sidebar.warning('Failed to download: ' + ', '.join(sorted(report.failed)))
 
-        for i, symbol in enumerate(symbol_list):
-            data = yf.download(symbol, start=start_date, end=datetime.today(), progress=False)
-            data.to_csv('{}/{}.csv'.format(output_dir, symbol))
+    # Hide the progress bar
+    pbar.empty()  
 
-            percent_complete = (i + 1) * increment
-            pbar.progress(percent_complete, text=progress_text)
+#-------------------------------------------------------------------------------
+# Download only the symbols that are missing or behind, a list that is up to
+# date costs a read of the manifest and no download at all
+#-------------------------------------------------------------------------------
+def download_stale_symbols(symbols_file, output_dir, message, symbol_list, initial_days=10):
+    stale = stale_symbols(CsvStore(output_dir), symbol_list, initial_days=initial_days)
+    if (stale):
+        download_symbol_data(symbols_file, output_dir, message, symbol_list=tuple(stale), initial_days=initial_days)
 
-        # Hide the progress bar
-        pbar.empty()  
+#-------------------------------------------------------------------------------
+# Earnings of all symbols, cached in memory and on disk and shared by all sessions
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def get_earnings_cache():
+    cache = EarningsCache(offline=earnings_offline)
+    register_stats('earnings_cache', cache.stats)
+    return cache
 
 #-------------------------------------------------------------------------------
-# Get additional data via yahooquery and prep to plot
+# Plot the earnings fetched via yahooquery (through the earnings cache and the
+# data access layer): the entry, None or the exception the fetch raised
 #-------------------------------------------------------------------------------
-def getEarningsData(symbol):
-    ticker = Ticker(symbol)
-    earnings_data = ticker.earning_history
-    est = ticker.earnings[symbol]['earningsChart']['currentQuarterEstimate']
+def getEarningsData(symbol, earnings):
+    if (isinstance(earnings, DeadlineExceeded)):
+        st.info(f'Earnings data for {symbol.upper()} is still loading.')
+        return
+    if (isinstance(earnings, Exception) or earnings is None):
+        st.info(f'No earnings data for {symbol.upper()}.')
+        return
+
+    earnings_data = earnings['history']
+    est = earnings['estimate']
 
     fig = go.Figure()
 
     # Bar chart
     fig.add_trace(go.Bar(
-        x=earnings_data['period'],
-        y=earnings_data['epsEstimate'],
+        x=[row['period'] for row in earnings_data],
+        y=[row['epsEstimate'] for row in earnings_data],
         name='EPS Estimate',
     ))
     fig.add_trace(go.Bar(
-        x=earnings_data['period'],
-        y=earnings_data['epsActual'],
+        x=[row['period'] for row in earnings_data],
+        y=[row['epsActual'] for row in earnings_data],
         name='EPS Actual',
     ))
 
     # Horizontal line and table
-    fig.add_hline(y=est, line_color='green', line_width=2, line_dash='dash', annotation_text=f"Estimate: {est}")
+    if (est is not None):
+        fig.add_hline(y=est, line_color='green', line_width=2, line_dash='dash', annotation_text=f"Estimate: {est}")
     fig.add_trace(go.Table(
         header=dict(values=['Current Quarter Estimate']),
         cells=dict(values=[[est]]),
@@ -165,32 +164,23 @@ def process_symbol(data_directory, symbol, pattern):
 
     talib_function = getattr(talib, pattern)
 
-    fullpath = os.path.join(data_directory, symbol + '.csv')
-
-    # Check if the file is a file (i.e., not a directory)
-    if (os.path.isfile(fullpath)):
+    # Get the Open, High, Low and Close arrays from the store
+    ohlc = load_symbol_ohlc(data_directory, symbol, storage_backend)
 
-        # Get dataframe
-        df = pd.read_csv(fullpath)
+    if (ohlc is not None and len(ohlc[3]) > 0):
 
-        # Ignore any errors in file such as 'NaN' or an empty file
+        # Skip the symbol on errors in the file such as 'NaN', counted by the metrics
         try:
-            # Call talib candlestick function with the symbol df
-            ret = talib_function(df['Open'], df['High'], df['Low'], df['Close'])
+            # Call talib candlestick function with the symbol arrays
+            ret = talib_function(*ohlc)
 
             # We only need the last value to know if the data symbol is showing the
-            # candlestick pattern. Using tail where the '1' is how many to get from the end.
-            # The result is an array, so we use [0] to get the first value
-            last = ret.tail(1).values[0]
+            # candlestick pattern. talib returns 100 for bullish, -100 for bearish,
+            # only concerned about bullish
+            return ret[-1] == 100
 
-            # talib returns 100 for bullish, -100 for bearish, only concerned about bullish
-            if (last == 100):
-                return True
-            else:
-                return False
-        
-        except:
-            pass
+        except Exception as error:
+            record_error('process_symbol', symbol, error)
 
 #-------------------------------------------------------------------------------
 # For all the patterns, scan all the symbols
@@ -207,41 +197,26 @@ def process_symbol(data_directory, symbol, pattern):
 # ('Three Outside Up/Down', 'WMT')
 # ('Engulfing Pattern', 'ALLE')
 # ('Engulfing Pattern', 'WBD')
+#
+# Results come from the scan cache on disk (see scan_cache.py) while the data
+# of the symbols is unchanged, also after a restart and across app processes.
 #-------------------------------------------------------------------------------
-@st.cache_data
-def scan_symbols_for_candlestick_patterns(data_directory, symbol_list, progress_text):
+def scan_symbols_for_candlestick_patterns(data_directory, symbol_list, progress_text, timeframe='1d'):
 
-    # for each candlestick pattern, loop through each symbol
-    #    if the symbol shows the pattern, add pattern to list of successful matches,
-    #    bump counter of matches for the candlestick pattern
+    # for each symbol, load its data once and run every candlestick pattern on it
+    #    if the symbol shows the pattern, add pattern to list of successful matches
 
-    # Used for the progress bar
-    total_entries = len(candlesticks)
+    # Progress bar
+    pbar = st.sidebar.progress(0, text=progress_text)
 
-    pattern_matching_list = []
+    def progress(percent_complete):
+        pbar.progress(min(percent_complete, 1.0), text=progress_text)
 
     # Loop through the keys, which refer to the TALIB function
     #    'CDL2CROWS':'Two Crows',
     #    'CDL3BLACKCROWS':'Three Black Crows',
-
-    # Progress bar
-    pbar = st.sidebar.progress(0, text=progress_text)
-    percent_complete = 0.0
-    increment = 1 / total_entries
-
-    # For all candlestick patterns
-    for pattern in candlesticks.keys():
-
-        # For all symbols
-        for symbol in symbol_list:
-
-            # Does symbol meet the pattern
-            if (process_symbol(data_directory, symbol, pattern)):
-                pattern_matching_list.append((pattern, symbol))
-
-        if (percent_complete <= 1):
-            pbar.progress(percent_complete, text=progress_text)
-            percent_complete += increment
+    pattern_matching_list = scan_data(data_directory, symbol_list, list(candlesticks.keys()), progress=progress,
+                                      cache=get_shared_scan_cache(), timeframe=timeframe)
 
     # Hide the progress bar
     pbar.empty()
@@ -255,36 +230,162 @@ def scan_symbols_for_candlestick_patterns(data_directory, symbol_list, progress_
 
     return new_list
 
+#-------------------------------------------------------------------------------
+# Index constituents, one manager per universe shared by all sessions
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def get_constituents(universe):
+    return ConstituentsManager(universe)
+
+#-------------------------------------------------------------------------------
+# Symbols of a universe from the local file, refreshed from wikipedia when
+# stale or on demand. Symbols that joined the index get their data downloaded
+# right away, the others keep their stored data.
+#-------------------------------------------------------------------------------
+def load_constituents(universe, message, initial_days=10):
+    force = st.sidebar.button('Refresh ' + universes[universe]['title'] + ' symbols', key='refresh_' + universe)
+
+    # A slow Wikipedia only delays the page up to the deadline when there is a
+    # local list to go on with, the very first list is waited for
+    access = get_data_access()
+    try:
+        change = access.run(access.constituents(get_constituents(universe), force))
+    except DeadlineExceeded:
+        change = access.run(access.constituents(get_constituents(universe), force, deadline=math.inf))
+
+    if (change.added):
+        download_symbol_data(universes[universe]['symbols_file'], universes[universe]['data_directory'], message,
+                             symbol_list=tuple(change.added), initial_days=initial_days)
+
+    if (change):
+        st.sidebar.info(f'{universes[universe]["title"]}: {len(change.added)} symbols added, '
+                        f'{len(change.removed)} removed')
+
+    return change.symbols
+
+#-------------------------------------------------------------------------------
+# Scan results precomputed by worker.py, cached per snapshot so a new snapshot
+# is picked up on the next rerun
+#-------------------------------------------------------------------------------
+@st.cache_data
+def load_snapshot_results(universe, name):
+    snapshot = load_snapshot(snapshot_directory, universe, name)
+
+    # Same readable format as scan_symbols_for_candlestick_patterns
+    return [(candlesticks.get(pattern), symbol) for pattern, symbol in snapshot['matches']]
+
+#-------------------------------------------------------------------------------
+# Latest precomputed scan results of a universe, None if the worker isn't used
+#-------------------------------------------------------------------------------
+def precomputed_results(universe):
+    name = latest_snapshot_name(snapshot_directory, universe)
+    if (name is None):
+        return None
+
+    try:
+        results = load_snapshot_results(universe, name)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    st.sidebar.caption(f'Scan results of {name[:4]}-{name[4:6]}-{name[6:8]} {name[9:11]}:{name[11:13]}')
+    return results
+
+#-------------------------------------------------------------------------------
+# Screener table, parsed once per process and shared by all sessions
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def get_screener():
+    return load_screener()
+
+#-------------------------------------------------------------------------------
+# Sidebar filters on the screener, returns the symbols to scan
+#-------------------------------------------------------------------------------
+def choose_screener_symbols():
+    screener = get_screener()
+
+    st.sidebar.write('### Screener filter')
+    sectors = st.sidebar.multiselect('Sector', screener.options('Sector'))
+    min_market_cap = st.sidebar.number_input('Minimum Market Cap (billion $)', min_value=0.0, value=10.0)
+    top = st.sidebar.slider('Top N by Volume', min_value=10, max_value=1000, value=100)
+
+    symbol_list = screener.select(sector=sectors or None, ranges={'Market Cap': (min_market_cap * 1e9, None)},
+                                  top=top, by='Volume')
+
+    # Preferred shares and warrants ('ABC^D') aren't on Yahoo Finance under those names
+    return [yahoo_symbol(symbol) for symbol in symbol_list if '^' not in symbol]
+
+#-------------------------------------------------------------------------------
+# Timeframes of the scan: label -> timeframe (see timeframes.py)
+#-------------------------------------------------------------------------------
+scan_timeframes = {'Daily': '1d', 'Weekly': '1wk', 'Monthly': '1mo'}
+
 #-------------------------------------------------------------------------------
 # Main processing loop
 #-------------------------------------------------------------------------------
-def main_loop(ndx, sp500):
+def main_loop(ndx, sp500, screener_list=None, timeframe='1d'):
+
+    # None until the results of a market are loaded or scanned
+    ndx_result_list = None
+    sp500_result_list = None
+    screener_result_list = None
 
-    ndx_result_list = []
-    sp500_result_list = []
+    # Weekly and monthly patterns need more than the 10 days a new symbol gets for daily scans
+    initial_days = history_days(timeframe)
 
     #-----------------------------------------------
     # Streamlit sidebar - Download progress bars
     #-----------------------------------------------
-    # Get list of ndx symbols, read file it exists, otherwise download from wikipedia
-    # For nasdaq -> the fifth table and column named 'Ticker'
-    if (ndx):
-        ndx_list = build_symbol_list(url=ndx_url, table_num = 4, column_name='Ticker', output_file=ndx_symbols)
-        
+    # Precomputed scan results are used when worker.py is running,
+    # otherwise the data is downloaded and scanned here. The worker scans
+    # daily bars, weekly and monthly bars are resampled from them and scanned here
+    if (ndx and timeframe == '1d'):
+        ndx_result_list = precomputed_results('ndx')
+
+    if (ndx and ndx_result_list is None):
+        # Get list of ndx symbols from the local file, refreshed from wikipedia when stale
+        ndx_list = load_constituents('ndx', 'Downloading New Nasdaq 100 Symbols', initial_days)
+
         # Nasdaq 100
         # Download symbol data into csv files
         # Scan for candlestick patterns
-        download_symbol_data(ndx_test_symbol, ndx_symbols, ndx_data_directory, 'Downloading Nasdaq 100 Data')
-        ndx_result_list = scan_symbols_for_candlestick_patterns(ndx_data_directory, ndx_list, "Scanning Nasdaq 100 for Candlestick Patterns...")
+        download_stale_symbols(ndx_symbols, ndx_data_directory, 'Downloading Nasdaq 100 Data', ndx_list, initial_days)
+        ndx_result_list = scan_symbols_for_candlestick_patterns(ndx_data_directory, ndx_list, "Scanning Nasdaq 100 for Candlestick Patterns...",
+                                                                 timeframe)
+
+    if (sp500 and timeframe == '1d'):
+        sp500_result_list = precomputed_results('sp500')
+
+    if (sp500 and sp500_result_list is None):
+        sp500_list = load_constituents('sp500', 'Downloading New S&P 500 Symbols', initial_days)
+
+        # Download symbol data into csv files
+        # Scan for candlestick patterns
+        download_stale_symbols(sp500_symbols, sp500_data_directory, 'Downloading S&P 500 Data', sp500_list,
+                               initial_days)
+        sp500_result_list = scan_symbols_for_candlestick_patterns(sp500_data_directory, sp500_list, "Scanning S&P 500 for Candlestick Patterns...",
+                                                                   timeframe)
 
-    if (sp500):
-        # For S&P 500, we need the first table (0) and column named 'Symbol'
-        sp500_list = build_symbol_list(url=sp500_url, table_num = 0, column_name='Symbol', output_file=sp500_symbols)
+    if (screener_list):
+        # Symbols picked by the screener filter
+        with open(screener_symbols, 'w') as file:
+            for item in screener_list:
+                file.write(item + '\n')
 
         # Download symbol data into csv files
         # Scan for candlestick patterns
-        download_symbol_data(sp500_test_symbol, sp500_symbols, sp500_data_directory, 'Downloading S&P 500 Data')
-        sp500_result_list = scan_symbols_for_candlestick_patterns(sp500_data_directory, sp500_list, "Scanning S&P 500 for Candlestick Patterns...")
+        download_symbol_data(screener_symbols, screener_data_directory, 'Downloading Screener Data', symbol_list=tuple(screener_list),
+                             initial_days=initial_days)
+        screener_result_list = scan_symbols_for_candlestick_patterns(screener_data_directory, screener_list, "Scanning Screener Symbols for Candlestick Patterns...",
+                                                                      timeframe)
+
+    # Markets that weren't chosen have no results
+    ndx_result_list = ndx_result_list or []
+    sp500_result_list = sp500_result_list or []
+    screener_result_list = screener_result_list or []
+
+    # Fetch the earnings of every matching symbol in the background, so
+    # flipping through the matches doesn't wait for them
+    get_earnings_cache().prefetch(symbol for _, symbol in ndx_result_list + sp500_result_list + screener_result_list)
 
     #-----------------------------------------------
     # Streamlit main - tabs
@@ -294,7 +395,7 @@ def main_loop(ndx, sp500):
     st.write("### Choose the market you want displayed")
     st.write(":brain: *Keep in mind that you have to **download** the market data before vizualizing. You can download the data by selecting one above.*")
 
-    tab_titles = ['Nasdaq 100', 'S&P 500'] # a list of titles for the tabs
+    tab_titles = ['Nasdaq 100', 'S&P 500', 'Screener'] # a list of titles for the tabs
     tabs = st.tabs(tab_titles) # creates the actual tabs in the Streamlit app
     css = '''
     <style>
@@ -313,19 +414,27 @@ def main_loop(ndx, sp500):
     with tabs[0]:
         # Will return this format: ('Engulfing Pattern', 'ADI')
         selection_ndx = st.selectbox('Nasdaq 100', sorted(ndx_result_list), key='ndx', label_visibility='hidden')
-        
-        # use [1] as we want to pass in the symbol, 'ADI' from the above example
-        if (selection_ndx != None):
-            show_tradingview_chart(selection_ndx[1])
-            getEarningsData(selection_ndx[1])
 
     with tabs[1]:
         # Will return this format: JM ...
         selection_sp500 = st.selectbox('S&P 500', sorted(sp500_result_list), key='sp500', label_visibility='hidden')
 
-        if (selection_sp500 != None):
-            show_tradingview_chart(selection_sp500[1])
-            getEarningsData(selection_sp500[1])
+    with tabs[2]:
+        selection_screener = st.selectbox('Screener', sorted(screener_result_list), key='screener', label_visibility='hidden')
+
+    # Every tab is rendered on each rerun: fetch the earnings of the three
+    # selected symbols at the same time, within the fetch deadline
+    # use [1] as we want to pass in the symbol, 'ADI' from the above example
+    selections = [selection_ndx, selection_sp500, selection_screener]
+    access = get_data_access()
+    earnings = access.gather({i: access.earnings(get_earnings_cache(), selection[1])
+                              for i, selection in enumerate(selections) if selection != None})
+
+    for i, selection in enumerate(selections):
+        if (selection != None):
+            with tabs[i]:
+                show_tradingview_chart(selection[1])
+                getEarningsData(selection[1], earnings[i])
 
 @st.cache_data              
 # the function or code block will only be executed once 
@@ -343,6 +452,9 @@ def initial_setup():
     if not os.path.isdir(sp500_data_directory):
         os.makedirs(sp500_data_directory)
 
+    if not os.path.isdir(screener_data_directory):
+        os.makedirs(screener_data_directory)
+
 #-------------------------------------------------------------------------------
 # Main
 #-------------------------------------------------------------------------------
@@ -350,7 +462,7 @@ def main():
     """
     This is the main function of the program.
 
-    It sets up the initial configuration and allows the user to choose between Nasdaq 100 and S&P 500.
+    It sets up the initial configuration and allows the user to choose between Nasdaq 100, S&P 500 and a screener filter.
 
     It then calls the main_loop function with the appropriate parameters based on the user's choice.
     """
@@ -361,13 +473,18 @@ def main():
 
     initial_setup()
 
-    # Selectbox to choose between Nasdaq and S&P 500
-    choice = st.selectbox('Select Market', ('', 'Nasdaq 100', 'S&P 500'))
+    # Selectbox to choose between Nasdaq, S&P 500 and a screener filter
+    choice = st.selectbox('Select Market', ('', 'Nasdaq 100', 'S&P 500', 'Screener'))
+
+    # Bars the patterns are matched on, resampled from the daily data
+    timeframe = scan_timeframes[st.selectbox('Timeframe', list(scan_timeframes))]
 
     if choice == 'Nasdaq 100':
-        main_loop(ndx=True, sp500=False)
+        main_loop(ndx=True, sp500=False, timeframe=timeframe)
     elif choice == 'S&P 500':
-        main_loop(ndx=False, sp500=True)
+        main_loop(ndx=False, sp500=True, timeframe=timeframe)
+    elif choice == 'Screener':
+        main_loop(ndx=False, sp500=False, screener_list=choose_screener_symbols(), timeframe=timeframe)
     else:
         main_loop(ndx=False, sp500=False)
 
@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from datastore import atomic_write
+from universes import universes, constituents_refresh_seconds, constituents_retry_seconds
+
+#-------------------------------------------------------------------------------
+# Index constituents kept in the local symbol file
+#
+# <data_directory>/<universe>.txt        - one symbol per line (ndx.txt, sp500.txt)
+# <data_directory>/constituents.json     - time of the last refresh from Wikipedia,
+#                                          the symbols it added and removed, and
+#                                          the time of a failed refresh since
+#
+# The symbols are read from the local file. Wikipedia is only asked again when
+# the file is missing, older than max_age or a refresh is requested, and the
+# refresh reports which symbols joined and left the index, so only the new
+# ones need their data downloaded. After a failed refresh the local file is
+# used for retry_seconds before Wikipedia is asked again.
+#-------------------------------------------------------------------------------
+constituents_file = 'constituents.json'
+
+#-------------------------------------------------------------------------------
+# Symbols of a Wikipedia table, sorted
+#-------------------------------------------------------------------------------
+def wikipedia_symbols(url, table_num, column_name):
+    return sorted(str(symbol) for symbol in pd.read_html(url)[table_num][column_name].tolist())
+
+class ConstituentsChange:
+    def __init__(self, symbols, added=(), removed=(), refreshed=None):
+        self.symbols = list(symbols)
+        self.added = list(added)
+        self.removed = list(removed)
+        self.refreshed = refreshed
+
+    def __bool__(self):
+        return bool(self.added or self.removed)
+
+class ConstituentsManager:
+    """
+    Args:
+        universe (str): Key into universes.universes, e.g. 'sp500'.
+        max_age (float): Seconds before the symbol file is refreshed from
+            Wikipedia, None to only refresh on demand.
+        retry_seconds (float): Seconds a failed refresh is not retried.
+        fetch (Callable): fetch(url, table_num, column_name) -> symbols.
+    """
+    def __init__(self, universe, max_age=constituents_refresh_seconds, fetch=wikipedia_symbols,
+                 clock=time.time, retry_seconds=constituents_retry_seconds):
+        self.universe = universe
+        self.settings = universes[universe]
+        self.max_age = max_age
+        self.retry_seconds = retry_seconds
+        self.fetch = fetch
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        self.symbols_file = self.settings['symbols_file']
+        self.state_file = os.path.join(self.settings['data_directory'], constituents_file)
+
+    #---------------------------------------------------------------------------
+    # Local symbol file and refresh state
+    #---------------------------------------------------------------------------
+    def read_symbols(self):
+        try:
+            with open(self.symbols_file, 'r') as f:
+                return f.read().split()
+        except OSError:
+            return None
+
+    def load_state(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def refreshed_at(self):
+        """
+        Returns:
+            float: Time of the last refresh, the symbol file's mtime when it
+            was written before refreshes were recorded, None if there is none.
+        """
+        state = self.load_state()
+        if ('refreshed' in state):
+            return state['refreshed']
+
+        try:
+            return os.path.getmtime(self.symbols_file)
+        except OSError:
+            return None
+
+    def is_stale(self):
+        refreshed = self.refreshed_at()
+        if (refreshed is None):
+            return True
+        return self.max_age is not None and self.clock() - refreshed >= self.max_age
+
+    def is_retry_due(self):
+        failed = self.load_state().get('failed')
+        return failed is None or self.clock() - failed >= self.retry_seconds
+
+    def record_failure(self):
+        state = self.load_state()
+        state['failed'] = self.clock()
+
+        def write_state(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, indent=1)
+
+        # Only delays the next attempt, not worth failing over
+        try:
+            os.makedirs(self.settings['data_directory'], exist_ok=True)
+            atomic_write(self.state_file, write_state)
+        except OSError:
+            pass
+
+    #---------------------------------------------------------------------------
+    # Current constituents, refreshed from Wikipedia only when stale
+    #---------------------------------------------------------------------------
+    def get(self, force=False):
+        """
+        Args:
+            force (bool): Refresh from Wikipedia even if the file is fresh.
+
+        Returns:
+            ConstituentsChange: The symbols, plus the symbols added and removed
+            if this call refreshed them.
+        """
+        with self.lock:
+            symbols = self.read_symbols()
+
+            if (symbols is not None and not force and (not self.is_stale() or not self.is_retry_due())):
+                return ConstituentsChange(symbols, refreshed=self.refreshed_at())
+
+            try:
+                return self.refresh(symbols)
+            except Exception:
+                # Wikipedia down or its table changed: keep the local list and
+                # don't ask again before retry_seconds
+                self.record_failure()
+                if (symbols is None):
+                    raise
+                return ConstituentsChange(symbols, refreshed=self.refreshed_at())
+
+    def refresh(self, old_symbols):
+        symbols = self.fetch(self.settings['url'], self.settings['table_num'], self.settings['column_name'])
+
+        old = set(old_symbols or ())
+        added = sorted(set(symbols) - old) if old_symbols is not None else []
+        removed = sorted(old - set(symbols))
+        refreshed = self.clock()
+
+        os.makedirs(self.settings['data_directory'], exist_ok=True)
+
+        def write_symbols(tmp_path):
+            with open(tmp_path, 'w') as file:
+                for item in symbols:
+                    file.write(item + '\n')
+
+        def write_state(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump({
+                    'refreshed': refreshed,
+                    'refreshed_iso': datetime.fromtimestamp(refreshed).isoformat(timespec='seconds'),
+                    'added': added,
+                    'removed': removed,
+                }, f, indent=1)
+
+        atomic_write(self.symbols_file, write_symbols)
+        atomic_write(self.state_file, write_state)
+
+        return ConstituentsChange(symbols, added, removed, refreshed)
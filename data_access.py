@@ -0,0 +1,200 @@
+import asyncio
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from constituents import ConstituentsChange
+from instrumentation import count, register_stats
+from price_cache import get_shared_cache, day_range
+from universes import fetch_deadline_seconds
+
+#-------------------------------------------------------------------------------
+# Data access layer shared by all pages and sessions
+#
+# One asyncio event loop runs in a background thread. Every fetch (price
+# history, earnings, news, index constituents) is a coroutine on that loop, so
+# a page can issue several at once and wait for all of them together:
+#
+#   access = get_data_access()
+#   results = access.gather({'prices': access.prices('META', start, end),
+#                            'earnings': access.earnings(earnings_cache, 'META')})
+#
+# - Coalescing: requests for the same data that arrive while it is being
+#   fetched, from any session, share that one fetch.
+# - Deadlines: a request waits at most `deadline` seconds. Past it the cached
+#   data is returned however old it is, the fetch goes on in the background
+#   and fills the cache for the next rerun. DeadlineExceeded is raised only
+#   when nothing is cached at all.
+# - A failed fetch also falls back to the cached data, and raises otherwise.
+#
+# yfinance, yahooquery, pandas.read_html and requests block, so the fetches
+# themselves run in one shared thread pool; the loop only schedules them,
+# coalesces and keeps time.
+#-------------------------------------------------------------------------------
+
+class DeadlineExceeded(Exception):
+    """The data wasn't fetched within the deadline and nothing is cached."""
+
+class DataAccess:
+    """
+    Args:
+        max_workers (int): Threads running the blocking fetches.
+        deadline (float): Default seconds a request waits, None for no limit.
+    """
+    def __init__(self, max_workers=16, deadline=fetch_deadline_seconds):
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='data-access')
+
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self.loop.run_forever, name='data-access-loop', daemon=True)
+        self.thread.start()
+
+        # key -> task fetching it, only used on the loop's thread
+        self.inflight = {}
+
+        self.stats = {'requests': 0, 'coalesced': 0, 'deadline_fallbacks': 0, 'error_fallbacks': 0}
+
+    def tally(self, name):
+        # Only called on the loop's thread, no lock needed
+        self.stats[name] += 1
+        count('data_access_' + name)
+
+    #---------------------------------------------------------------------------
+    # Run a blocking call, coalesced by key, within the deadline
+    #---------------------------------------------------------------------------
+    async def fetch(self, key, function, fallback=None, deadline=None):
+        """
+        Args:
+            key (Tuple): Identifies the data, equal keys share one fetch.
+            function (Callable): function() -> data, blocking.
+            fallback (Callable): fallback() -> cached data or None, blocking.
+            deadline (float): Seconds to wait, defaults to self.deadline,
+                math.inf waits for the fetch however long it takes.
+
+        Returns:
+            The fetched data, or the fallback's past the deadline or on error.
+        """
+        self.tally('requests')
+
+        task = self.inflight.get(key)
+        if (task is None):
+            task = self.loop.create_task(self.run_fetch(key, function))
+            self.inflight[key] = task
+        else:
+            self.tally('coalesced')
+
+        if (deadline is None):
+            deadline = self.deadline
+
+        try:
+            # Shielded: a request giving up doesn't cancel the fetch for the others
+            return await asyncio.wait_for(asyncio.shield(task), None if deadline == math.inf else deadline)
+        except asyncio.TimeoutError:
+            self.tally('deadline_fallbacks')
+            data = await self.call_fallback(fallback)
+            if (data is None):
+                raise DeadlineExceeded(f'{key} not fetched within {deadline}s')
+            return data
+        except Exception:
+            data = await self.call_fallback(fallback)
+            if (data is None):
+                raise
+            self.tally('error_fallbacks')
+            return data
+
+    async def run_fetch(self, key, function):
+        try:
+            return await self.loop.run_in_executor(None, function)
+        finally:
+            self.inflight.pop(key, None)
+
+    async def call_fallback(self, fallback):
+        if (fallback is None):
+            return None
+        return await self.loop.run_in_executor(None, fallback)
+
+    #---------------------------------------------------------------------------
+    # Sources
+    #---------------------------------------------------------------------------
+    async def prices(self, symbol, start, end, interval='1d', cache=None, deadline=None):
+        """
+        Returns:
+            DataFrame: Bars of symbol with start <= date < end, through the
+            price cache (the shared one by default). Every request gets its
+            own copy, pages add columns to it.
+        """
+        cache = cache if cache is not None else get_shared_cache()
+        start, end = day_range(start, end)
+
+        # Coalesced requests all get the one frame the fetch returned
+        data = await self.fetch(('prices', symbol, interval, start, end),
+                                lambda: cache.get(symbol, start, end, interval),
+                                lambda: cache.get_stale(symbol, start, end, interval), deadline)
+        return data.copy()
+
+    async def earnings(self, cache, symbol, deadline=None):
+        """
+        Returns:
+            dict: The EarningsCache entry, None if there is no data for the symbol.
+        """
+        data = await self.fetch(('earnings', symbol), lambda: cache.get(symbol) or {},
+                                lambda: cache.cached(symbol)[0], deadline)
+
+        # {} stands for 'no earnings', None would have meant 'nothing cached'
+        return data or None
+
+    async def news(self, fetcher, name, deadline=None):
+        """
+        Returns:
+            dict: The NewsFetcher entry of the source.
+        """
+        return await self.fetch(('news', name), lambda: fetcher.get([name])[name],
+                                lambda: fetcher.cache.get(name), deadline)
+
+    async def constituents(self, manager, force=False, deadline=None):
+        """
+        Returns:
+            ConstituentsChange: Past the deadline the local symbol list, unchanged.
+        """
+        def local():
+            symbols = manager.read_symbols()
+            return None if symbols is None else ConstituentsChange(symbols, refreshed=manager.refreshed_at())
+
+        return await self.fetch(('constituents', manager.universe, force), lambda: manager.get(force=force),
+                                local, deadline)
+
+    #---------------------------------------------------------------------------
+    # Blocking entry points for the Streamlit script thread
+    #---------------------------------------------------------------------------
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def gather(self, coroutines):
+        """
+        Args:
+            coroutines (Dict[str, Coroutine]): The requests, run concurrently.
+
+        Returns:
+            Dict[str, object]: The result of every request, or the exception
+            it raised (e.g. DeadlineExceeded).
+        """
+        async def gather_all():
+            return await asyncio.gather(*coroutines.values(), return_exceptions=True)
+
+        return dict(zip(coroutines.keys(), self.run(gather_all())))
+
+#-------------------------------------------------------------------------------
+# The data access layer of this process
+#-------------------------------------------------------------------------------
+shared_access = None
+shared_access_lock = threading.Lock()
+
+def get_data_access():
+    global shared_access
+
+    with shared_access_lock:
+        if (shared_access is None):
+            shared_access = DataAccess()
+            register_stats('data_access', shared_access.stats)
+
+    return shared_access
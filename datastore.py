@@ -0,0 +1,542 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from downloader import bulk_download, yfinance_fetcher, DownloadError
+from instrumentation import metrics
+from timeframes import intraday_history_days, derivable, get_shared_resample_cache
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, the manifest lock between processes is a no-op there
+    fcntl = None
+
+#-------------------------------------------------------------------------------
+# Per-symbol csv store with a manifest of the last stored bar
+#
+# <directory>/<symbol>.csv   - daily bars of one symbol, indexed by Date
+# <directory>/manifest.json  - last stored bar and row count per symbol
+#
+# A refresh only fetches the days after the last stored bar and appends them.
+# Every file is written to a temporary file first and then renamed over the
+# old one, so a failed or interrupted refresh leaves each symbol either fully
+# updated or untouched, never half written.
+#-------------------------------------------------------------------------------
+manifest_file = 'manifest.json'
+
+ohlc_columns = ['Open', 'High', 'Low', 'Close']
+
+#-------------------------------------------------------------------------------
+# Memory-mapped store files, built from the csv store by convert_csv_to_memmap
+#
+# <directory>/ohlc.f8          - float64 array of shape (4, bars of all symbols),
+#                                one row per Open/High/Low/Close
+# <directory>/ohlc_dates.i8    - int64 dates (days since 1970-01-01) of every bar
+# <directory>/ohlc_index.json  - symbol -> [offset, length] into the arrays
+#-------------------------------------------------------------------------------
+memmap_values_file = 'ohlc.f8'
+memmap_dates_file = 'ohlc_dates.i8'
+memmap_index_file = 'ohlc_index.json'
+
+#-------------------------------------------------------------------------------
+# Go back a number of trading days (weekends excluded) from a date
+#-------------------------------------------------------------------------------
+def trading_days_ago(days, start_date=None):
+    if (start_date is None):
+        start_date = datetime.today()
+
+    weekend_days = {5, 6}  # Saturday (5) and Sunday (6)
+    days_subtracted = 0
+
+    while days_subtracted < days:
+        start_date -= timedelta(days=1)
+        if start_date.weekday() not in weekend_days:
+            days_subtracted += 1
+
+    return start_date
+
+#-------------------------------------------------------------------------------
+# Write a file atomically: write a temporary file, then rename it
+#
+# The temporary file has a unique name in the same directory, so processes
+# writing the same file at once (worker, app, replicas) never share one, the
+# last rename wins.
+#-------------------------------------------------------------------------------
+def atomic_write(path, write):
+    """
+    Args:
+        path (str): The file to write.
+        write (Callable): write(tmp_path), writes the content to tmp_path.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=os.path.basename(path) + '.',
+                                    suffix='.tmp')
+    os.close(fd)
+
+    try:
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+#-------------------------------------------------------------------------------
+# Date of a bar in the manifest: daily bars keep the plain date, intraday
+# bars the time too
+#-------------------------------------------------------------------------------
+def bar_date(timestamp):
+    return timestamp.strftime('%Y-%m-%d') if timestamp == timestamp.normalize() else timestamp.isoformat()
+
+#-------------------------------------------------------------------------------
+# Exclusive lock between processes on a lock file
+#-------------------------------------------------------------------------------
+@contextmanager
+def file_lock(path):
+    if (fcntl is None):
+        yield
+        return
+
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+#-------------------------------------------------------------------------------
+# Bars of one symbol file, None if it is missing or can't be read
+#-------------------------------------------------------------------------------
+def read_csv_bars(path):
+    try:
+        return pd.read_csv(path, index_col='Date', parse_dates=True)
+    except (OSError, ValueError, pd.errors.EmptyDataError):
+        return None
+
+#-------------------------------------------------------------------------------
+# The csv store of one universe (data/ndx, data/sp500, ...)
+#-------------------------------------------------------------------------------
+class CsvStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.manifest = self.load_manifest()
+        # Symbols appended since the manifest was last saved
+        self.changed = set()
+
+    def path(self, symbol):
+        return os.path.join(self.directory, symbol + '.csv')
+
+    def symbols(self):
+        return sorted(name[:-len('.csv')] for name in os.listdir(self.directory) if name.endswith('.csv'))
+
+    #---------------------------------------------------------------------------
+    # Manifest
+    #---------------------------------------------------------------------------
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, manifest_file), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'updated': None, 'symbols': {}}
+
+    def save_manifest(self):
+        # Other processes save the same manifest: it is read again under the
+        # lock and only the symbols appended here replace their entries
+        path = os.path.join(self.directory, manifest_file)
+
+        with self.lock, file_lock(path + '.lock'):
+            manifest = self.load_manifest()
+            for symbol in self.changed:
+                manifest['symbols'][symbol] = self.manifest['symbols'][symbol]
+            manifest['updated'] = datetime.now().isoformat(timespec='seconds')
+
+            def write(tmp_path):
+                with open(tmp_path, 'w') as f:
+                    json.dump(manifest, f, indent=1, sort_keys=True)
+
+            atomic_write(path, write)
+            self.manifest = manifest
+            self.changed = set()
+
+    #---------------------------------------------------------------------------
+    # Date of the last stored bar, from the manifest or else from the file
+    #---------------------------------------------------------------------------
+    def last_date(self, symbol):
+        entry = self.manifest['symbols'].get(symbol)
+        if (entry is not None):
+            return pd.Timestamp(entry['last_date'])
+
+        data = self.read(symbol)
+        if (data is None or data.empty):
+            return None
+
+        return data.index[-1]
+
+    #---------------------------------------------------------------------------
+    # Date of the first stored bar. Manifests written before it was recorded
+    # get it from the file once, it is saved with the next manifest.
+    #---------------------------------------------------------------------------
+    def first_date(self, symbol):
+        entry = self.manifest['symbols'].get(symbol)
+        if (entry is not None and 'first_date' in entry):
+            return pd.Timestamp(entry['first_date'])
+
+        data = self.read(symbol)
+        if (data is None or data.empty):
+            return None
+
+        if (entry is not None):
+            with self.lock:
+                entry['first_date'] = bar_date(data.index[0])
+                self.changed.add(symbol)
+
+        return data.index[0]
+
+    #---------------------------------------------------------------------------
+    # Read and write symbol data
+    #---------------------------------------------------------------------------
+    def read(self, symbol):
+        return read_csv_bars(self.path(symbol))
+
+    def load_ohlc(self, symbol):
+        """
+        Returns:
+            Tuple[np.ndarray, ...]: Open, High, Low and Close as float64 arrays,
+            or None if the file is missing or can't be read.
+        """
+        # Ignore any errors in file such as an empty file or missing columns
+        try:
+            df = pd.read_csv(self.path(symbol), usecols=ohlc_columns)
+        except (OSError, ValueError, pd.errors.EmptyDataError):
+            return None
+
+        if (metrics.enabled):
+            metrics.count('csv_bytes_read', os.path.getsize(self.path(symbol)))
+
+        # TA-Lib wants contiguous float64 arrays
+        return tuple(df[column].to_numpy(dtype=np.float64) for column in ohlc_columns)
+
+    def load_dates(self, symbol):
+        """
+        Returns:
+            np.ndarray: datetime64[D] date of every bar, None if the file is
+            missing or can't be read.
+        """
+        try:
+            df = pd.read_csv(self.path(symbol), usecols=['Date'])
+        except (OSError, ValueError, pd.errors.EmptyDataError):
+            return None
+
+        return pd.to_datetime(df['Date']).to_numpy().astype('datetime64[D]')
+
+    def append(self, symbol, new_data):
+        """
+        Append bars to the symbol's file. Bars already stored for the same date
+        are replaced by the new ones.
+        """
+        existing = self.read(symbol)
+        if (existing is not None and not existing.empty):
+            new_data = pd.concat([existing, new_data])
+
+        new_data = new_data[~new_data.index.duplicated(keep='last')].sort_index()
+        atomic_write(self.path(symbol), new_data.to_csv)
+
+        with self.lock:
+            self.manifest['symbols'][symbol] = {
+                'first_date': bar_date(new_data.index[0]),
+                'last_date': bar_date(new_data.index[-1]),
+                'rows': len(new_data),
+            }
+            self.changed.add(symbol)
+
+#-------------------------------------------------------------------------------
+# Read-only store over one memory-mapped array file per universe
+#
+# Nothing is parsed when a symbol is loaded, load_ohlc returns views into the
+# mapped file and the OS pages the bars in on first access.
+#-------------------------------------------------------------------------------
+class MemmapStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+        with open(os.path.join(directory, memmap_index_file), 'r') as f:
+            meta = json.load(f)
+
+        self.index = meta['symbols']
+        total_bars = meta['bars']
+
+        if (total_bars == 0):
+            self.values = np.empty((len(ohlc_columns), 0))
+            self.dates = np.empty(0, dtype=np.int64)
+        else:
+            self.values = np.memmap(os.path.join(directory, memmap_values_file), dtype=np.float64,
+                                    mode='r', shape=(len(ohlc_columns), total_bars))
+            self.dates = np.memmap(os.path.join(directory, memmap_dates_file), dtype=np.int64,
+                                   mode='r', shape=(total_bars,))
+
+    def symbols(self):
+        return list(self.index)
+
+    def load_ohlc(self, symbol):
+        """
+        Returns:
+            Tuple[np.ndarray, ...]: Zero-copy Open, High, Low and Close views,
+            or None if the symbol isn't stored.
+        """
+        entry = self.index.get(symbol)
+        if (entry is None):
+            return None
+
+        offset, length = entry
+        return tuple(np.asarray(self.values[i, offset:offset + length]) for i in range(len(ohlc_columns)))
+
+    def load_dates(self, symbol):
+        entry = self.index.get(symbol)
+        if (entry is None):
+            return None
+
+        offset, length = entry
+        return np.asarray(self.dates[offset:offset + length]).astype('datetime64[D]')
+
+#-------------------------------------------------------------------------------
+# One-shot converter from the csv store to the memory-mapped store
+#-------------------------------------------------------------------------------
+def convert_csv_to_memmap(csv_directory, output_directory=None, symbol_list=None):
+    """
+    Args:
+        csv_directory (str): Directory holding the <symbol>.csv files.
+        output_directory (str): Where the memmap files go, defaults to csv_directory.
+        symbol_list (List[str]): Symbols to convert, defaults to every csv file.
+
+    Returns:
+        MemmapStore: The converted store.
+    """
+    if (output_directory is None):
+        output_directory = csv_directory
+
+    csv_store = CsvStore(csv_directory)
+
+    if (symbol_list is None):
+        symbol_list = csv_store.symbols()
+
+    frames = []
+    index = {}
+    offset = 0
+
+    for symbol in symbol_list:
+        data = csv_store.read(symbol)
+        if (data is None or data.empty or not set(ohlc_columns).issubset(data.columns)):
+            continue
+
+        index[symbol] = [offset, len(data)]
+        offset += len(data)
+        frames.append(data)
+
+    values = np.empty((len(ohlc_columns), offset), dtype=np.float64)
+    dates = np.empty(offset, dtype=np.int64)
+
+    for data, (start, length) in zip(frames, index.values()):
+        values[:, start:start + length] = data[ohlc_columns].to_numpy(dtype=np.float64).T
+        dates[start:start + length] = data.index.values.astype('datetime64[D]').astype(np.int64)
+
+    # Data files first, the index last: a reader never sees an index without its data
+    atomic_write(os.path.join(output_directory, memmap_values_file), values.tofile)
+    atomic_write(os.path.join(output_directory, memmap_dates_file), dates.tofile)
+
+    def write_index(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump({'bars': offset, 'symbols': index}, f)
+
+    atomic_write(os.path.join(output_directory, memmap_index_file), write_index)
+
+    return MemmapStore(output_directory)
+
+#-------------------------------------------------------------------------------
+# In-memory panel of a csv store (see ohlc_panel.py)
+#-------------------------------------------------------------------------------
+def open_panel(directory):
+    # Imported here, ohlc_panel builds on this module
+    from ohlc_panel import load_panel
+    return load_panel(directory)
+
+#-------------------------------------------------------------------------------
+# Open the store of a universe with the chosen backend ('csv', 'memmap' or 'panel')
+#-------------------------------------------------------------------------------
+storage_backends = {
+    'csv': CsvStore,
+    'memmap': MemmapStore,
+    'panel': open_panel,
+}
+
+def open_store(directory, backend='csv'):
+    if (backend not in storage_backends):
+        raise ValueError(f"Unknown storage backend '{backend}', expected one of {sorted(storage_backends)}")
+
+    return storage_backends[backend](directory)
+
+#-------------------------------------------------------------------------------
+# Fetch only the missing days for each symbol and append them to the store
+#-------------------------------------------------------------------------------
+def refresh_store(store, symbol_list, fetcher=yfinance_fetcher, initial_days=10,
+                  end=None, progress=None, interval='1d', **download_args):
+    """
+    Args:
+        store (CsvStore): The store to refresh.
+        symbol_list (List[str]): Symbols to bring up to date.
+        fetcher (Callable): fetcher(symbol, start, end) -> DataFrame of
+            `interval` bars.
+        initial_days (int): Trading days fetched for a symbol not yet stored,
+            at most the history Yahoo Finance has for intraday intervals.
+        interval (str): Bar interval of the store, '1d' or an intraday one.
+        end (datetime): Last day to fetch, defaults to today.
+        download_args: Passed on to downloader.bulk_download.
+
+    Returns:
+        DownloadReport: Symbols refreshed and symbols that failed. Failed
+        symbols keep their previous data. Symbols the source returned no
+        bars for are in empty, not in succeeded.
+    """
+    if (end is None):
+        end = datetime.today()
+
+    if (interval in intraday_history_days):
+        initial_days = min(initial_days, intraday_history_days[interval])
+    initial_start = trading_days_ago(initial_days, end)
+
+    # Start each symbol on the day after its last stored bar. Intraday bars
+    # start again at the last stored bar, which may have been still forming.
+    # Daily bars starting after initial_start are fetched again from there, so
+    # a longer initial_days also deepens the history already stored.
+    start_dates = {}
+    for symbol in symbol_list:
+        last = store.last_date(symbol)
+        if (last is None or (interval == '1d' and short_history(store, symbol, initial_start))):
+            start_dates[symbol] = initial_start
+        else:
+            start_dates[symbol] = last + timedelta(days=1) if interval == '1d' else last
+
+    stale_symbols = [symbol for symbol in symbol_list if start_dates[symbol].date() <= end.date()]
+
+    # No new bars (weekend, holiday) isn't an error for a refresh, the symbol
+    # is reported as empty rather than failed or succeeded
+    def fetch_missing(symbol, start, end):
+        try:
+            return fetcher(symbol, start_dates[symbol], end)
+        except DownloadError:
+            return None
+
+    fetch_missing.host = getattr(fetcher, 'host', 'default')
+
+    empty = set()
+    empty_lock = threading.Lock()
+
+    def write(symbol, new_data):
+        if (new_data is not None and not new_data.empty):
+            store.append(symbol, new_data)
+        else:
+            with empty_lock:
+                empty.add(symbol)
+
+    report = bulk_download(stale_symbols, initial_start, end, write, fetcher=fetch_missing,
+                           progress=progress, **download_args)
+
+    report.empty = [symbol for symbol in report.succeeded if symbol in empty]
+    report.succeeded = [symbol for symbol in report.succeeded if symbol not in empty]
+
+    # Only symbols that were written successfully are in the manifest
+    store.save_manifest()
+
+    return report
+
+#-------------------------------------------------------------------------------
+# Does the stored history of a symbol start after `start`
+#
+# A week of slack for holidays, which trading_days_ago doesn't know about. A
+# symbol listed after `start` is fetched from `start` on every refresh, the
+# fetch only returns the days it has.
+#-------------------------------------------------------------------------------
+def short_history(store, symbol, start):
+    first = store.first_date(symbol)
+    return first is not None and first > start + timedelta(days=7)
+
+#-------------------------------------------------------------------------------
+# Symbols not stored yet, whose last bar is before the previous trading day or,
+# with initial_days, whose history is shorter than that
+#-------------------------------------------------------------------------------
+def stale_symbols(store, symbol_list, end=None, initial_days=None):
+    previous_day = trading_days_ago(1, end).date()
+    initial_start = None if initial_days is None else trading_days_ago(initial_days, end)
+
+    stale = []
+    for symbol in symbol_list:
+        last = store.last_date(symbol)
+        if (last is None or last.date() < previous_day
+                or (initial_start is not None and short_history(store, symbol, initial_start))):
+            stale.append(symbol)
+
+    return stale
+
+#-------------------------------------------------------------------------------
+# Stores of other bar intervals
+#
+# <data_directory>/<symbol>.csv           - daily bars, the longest history
+# <data_directory>/<interval>/<symbol>.csv - intraday bars, e.g. data/ndx/5m
+#-------------------------------------------------------------------------------
+def store_directory(data_directory, interval='1d'):
+    return data_directory if interval == '1d' else os.path.join(data_directory, interval)
+
+#-------------------------------------------------------------------------------
+# The stored intervals the bars of a timeframe can be built from, preferred first
+#-------------------------------------------------------------------------------
+def source_intervals(data_directory, timeframe):
+    """
+    Daily and longer timeframes come from the daily store first, it has the
+    longest history, then from the intraday stores: the coarsest one first
+    (the fewest bars to read).
+
+    Returns:
+        List[str]: '1d' and keys of timeframes.intraday_history_days whose
+        store exists.
+    """
+    intervals = ['1d'] + list(reversed(list(intraday_history_days)))
+
+    return [interval for interval in intervals
+            if derivable(interval, timeframe) and os.path.isdir(store_directory(data_directory, interval))]
+
+#-------------------------------------------------------------------------------
+# Bars of a symbol in any timeframe, resampled from its stored bars once per
+# version of the stored file and shared by all sessions
+#-------------------------------------------------------------------------------
+def load_timeframe(data_directory, symbol, timeframe):
+    """
+    Returns:
+        DataFrame: The symbol's bars (shared, copy before changing), None if
+        the symbol is missing or can't be read.
+    """
+    intervals = source_intervals(data_directory, timeframe)
+    if (not intervals):
+        raise ValueError(f"No store in {data_directory} to build '{timeframe}' bars from, download one of "
+                         f"{[i for i in intraday_history_days if derivable(i, timeframe)]}")
+
+    for interval in intervals:
+        path = os.path.join(store_directory(data_directory, interval), symbol + '.csv')
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+
+        # The file is only read when the bars aren't cached, the manifest isn't needed
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        return get_shared_resample_cache().get(key, timeframe, lambda: read_csv_bars(path))
+
+    return None
@@ -0,0 +1,228 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+#-------------------------------------------------------------------------------
+# Bulk downloader for symbol data
+#
+# Symbols are fetched on a bounded worker pool. Each request first takes a
+# token from the per-host rate limiter, failed fetches are retried with an
+# exponential backoff and the symbols that still fail are reported with the
+# reason, the rest of the batch is not affected.
+#
+# The fetcher is any callable fetcher(symbol, start, end) -> DataFrame, so the
+# downloader can be run against yfinance, a local stub HTTP server or a plain
+# function in a benchmark.
+#-------------------------------------------------------------------------------
+yahoo_host = 'query1.finance.yahoo.com'
+
+#-------------------------------------------------------------------------------
+# Raised by a fetcher when a symbol has no data
+#-------------------------------------------------------------------------------
+class DownloadError(Exception):
+    pass
+
+#-------------------------------------------------------------------------------
+# Summary of a bulk download
+#-------------------------------------------------------------------------------
+class DownloadReport:
+    """
+    Attributes:
+        succeeded (List[str]): Symbols downloaded and written.
+        failed (Dict[str, str]): Symbols that failed, with the last error.
+        empty (List[str]): Symbols the source returned no bars for, only set
+            by datastore.refresh_store, they aren't in succeeded.
+        attempts (Dict[str, int]): Number of fetch attempts per symbol.
+    """
+    def __init__(self):
+        self.succeeded = []
+        self.failed = {}
+        self.empty = []
+        self.attempts = {}
+
+    def __repr__(self):
+        return (f"DownloadReport(succeeded={len(self.succeeded)}, failed={len(self.failed)}, "
+                f"empty={len(self.empty)})")
+
+#-------------------------------------------------------------------------------
+# Token bucket rate limiter, one bucket per host
+#-------------------------------------------------------------------------------
+class RateLimiter:
+    """
+    Args:
+        rate (float): Requests per second allowed per host, None for no limit.
+        burst (int): Requests allowed back to back before the rate applies.
+    """
+    def __init__(self, rate=None, burst=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, host):
+        if (self.rate is None):
+            return
+
+        while True:
+            with self.lock:
+                now = self.clock()
+                tokens, last = self.buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+
+                if (tokens >= 1):
+                    self.buckets[host] = (tokens - 1, now)
+                    return
+
+                self.buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+
+            self.sleep(wait)
+
+#-------------------------------------------------------------------------------
+# Fetch one symbol from Yahoo Finance
+#-------------------------------------------------------------------------------
+def yfinance_fetcher(symbol, start, end, interval='1d'):
+    """
+    Uses Ticker.history rather than yf.download, yf.download keeps its results
+    in module globals and isn't safe to call from several threads.
+
+    Returns:
+        DataFrame: Date indexed Open, High, Low, Close, Adj Close and Volume.
+    """
+    import yfinance as yf
+
+    data = yf.Ticker(symbol).history(start=start, end=end, interval=interval, auto_adjust=False, actions=False)
+
+    if (data.empty):
+        raise DownloadError('no data returned')
+
+    # Same layout as yf.download writes to csv
+    data.index = data.index.tz_localize(None)
+    data.index.name = 'Date'
+    return data[['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']]
+
+yfinance_fetcher.host = yahoo_host
+
+#-------------------------------------------------------------------------------
+# fetcher(symbol, start, end) of one bar interval, e.g. '5m', for a fetcher
+# taking the interval as its fourth argument like yfinance_fetcher
+#-------------------------------------------------------------------------------
+def interval_fetcher(fetcher, interval):
+    def fetch(symbol, start, end):
+        return fetcher(symbol, start, end, interval)
+
+    fetch.host = getattr(fetcher, 'host', 'default')
+    return fetch
+
+#-------------------------------------------------------------------------------
+# Build a fetcher reading <symbol>.csv files from an HTTP server
+#-------------------------------------------------------------------------------
+def http_csv_fetcher(url_template, timeout=10):
+    """
+    Args:
+        url_template (str): URL with a {symbol} placeholder, for example
+            'http://127.0.0.1:8000/{symbol}.csv' for a local stub server.
+        timeout (float): Request timeout in seconds.
+
+    Returns:
+        Callable: fetcher(symbol, start, end) -> DataFrame
+    """
+    import io
+    import pandas as pd
+    import requests as req
+
+    session = req.Session()
+
+    def fetcher(symbol, start, end):
+        response = session.get(url_template.format(symbol=symbol), timeout=timeout)
+        response.raise_for_status()
+
+        data = pd.read_csv(io.BytesIO(response.content), index_col='Date', parse_dates=True)
+        data = data.loc[str(start)[:10]:str(end)[:10]]
+
+        if (data.empty):
+            raise DownloadError('no data returned')
+
+        return data
+
+    fetcher.host = urlparse(url_template).netloc
+    return fetcher
+
+#-------------------------------------------------------------------------------
+# Write a downloaded DataFrame to <output_dir>/<symbol>.csv
+#-------------------------------------------------------------------------------
+def csv_writer(output_dir):
+    def write(symbol, data):
+        data.to_csv('{}/{}.csv'.format(output_dir, symbol))
+
+    return write
+
+#-------------------------------------------------------------------------------
+# Download many symbols concurrently
+#-------------------------------------------------------------------------------
+def bulk_download(symbol_list, start, end, write, fetcher=yfinance_fetcher,
+                  max_workers=8, rate_limiter=None, retries=3, backoff=0.5,
+                  progress=None, sleep=time.sleep):
+    """
+    Args:
+        symbol_list (List[str]): Symbols to download.
+        start, end (datetime): Date range passed to the fetcher.
+        write (Callable[[str, DataFrame], None]): Stores a downloaded symbol.
+        fetcher (Callable): fetcher(symbol, start, end) -> DataFrame. The
+            optional 'host' attribute selects the rate limiter bucket.
+        max_workers (int): Maximum number of downloads in flight.
+        rate_limiter (RateLimiter): Per-host limiter, defaults to 5 requests/s.
+        retries (int): Retries after the first failed attempt.
+        backoff (float): Seconds before the first retry, doubled every retry.
+        progress (Callable[[float], None]): Called with the fraction completed.
+
+    Returns:
+        DownloadReport: Which symbols succeeded and which failed and why.
+    """
+    if (rate_limiter is None):
+        rate_limiter = RateLimiter(rate=5.0, burst=max_workers)
+
+    host = getattr(fetcher, 'host', 'default')
+    report = DownloadReport()
+
+    def download(symbol):
+        for attempt in range(retries + 1):
+            report.attempts[symbol] = attempt + 1
+
+            try:
+                rate_limiter.acquire(host)
+                write(symbol, fetcher(symbol, start, end))
+                return None
+            except Exception as error:
+                last_error = error
+
+            if (attempt < retries):
+                sleep(backoff * (2 ** attempt))
+
+        return f'{type(last_error).__name__}: {last_error}'
+
+    total_entries = len(symbol_list)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(download, symbol): symbol for symbol in symbol_list}
+
+        for i, future in enumerate(as_completed(futures)):
+            symbol = futures[future]
+            error = future.result()
+
+            if (error is None):
+                report.succeeded.append(symbol)
+            else:
+                report.failed[symbol] = error
+
+            if (progress is not None):
+                progress((i + 1) / total_entries)
+
+    # Keep the symbol order of the input, not the completion order
+    order = {symbol: i for i, symbol in enumerate(symbol_list)}
+    report.succeeded.sort(key=order.get)
+
+    return report
@@ -0,0 +1,114 @@
+import numpy as np
+
+#-------------------------------------------------------------------------------
+# Downsampling of chart series to about the pixel width of the chart
+#
+#   minmax - split the points into buckets and keep the lowest and the highest
+#            point of every bucket, fully vectorized, every peak and trough of
+#            the series is still drawn
+#   lttb   - Largest-Triangle-Three-Buckets: one point per bucket, the one
+#            forming the largest triangle with its neighbours, keeps the
+#            visual shape of a line with fewer points
+#
+# Both return indices into the series, so the dates of the kept points are
+# looked up the same way as their values. NaN points (e.g. the start of a
+# moving average) are never kept.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# Bucket boundaries splitting n points into `buckets` nearly equal parts
+#-------------------------------------------------------------------------------
+def bucket_bounds(n, buckets):
+    return np.linspace(0, n, buckets + 1).astype(np.int64)
+
+#-------------------------------------------------------------------------------
+# Min-max decimation
+#-------------------------------------------------------------------------------
+def minmax_indices(y, max_points):
+    """
+    Args:
+        y (np.ndarray): The series.
+        max_points (int): Most points to keep, two per bucket.
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if (len(valid) <= max_points):
+        return valid
+
+    buckets = max(1, max_points // 2)
+    values = y[valid]
+
+    # Pad the points to a (buckets, width) matrix, padding never wins a min or max
+    bounds = bucket_bounds(len(values), buckets)
+    width = int(np.max(np.diff(bounds)))
+    positions = bounds[:-1, None] + np.arange(width)
+    inside = positions < bounds[1:, None]
+    positions = np.where(inside, positions, bounds[:-1, None])
+
+    matrix = values[positions]
+    lows = np.take_along_axis(positions, np.argmin(np.where(inside, matrix, np.inf), axis=1)[:, None], axis=1)
+    highs = np.take_along_axis(positions, np.argmax(np.where(inside, matrix, -np.inf), axis=1)[:, None], axis=1)
+
+    return valid[np.unique(np.concatenate([lows.ravel(), highs.ravel()]))]
+
+#-------------------------------------------------------------------------------
+# Largest-Triangle-Three-Buckets
+#-------------------------------------------------------------------------------
+def lttb_indices(x, y, max_points):
+    """
+    Args:
+        x (np.ndarray): Positions of the points (numbers, e.g. days).
+        y (np.ndarray): The series.
+        max_points (int): Points to keep, the first and the last included.
+
+    Returns:
+        np.ndarray: Sorted indices of the kept points.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if (len(valid) <= max_points or max_points < 3):
+        return valid
+
+    x = x[valid]
+    y = y[valid]
+
+    # The first and last points are kept, the others go into max_points - 2 buckets
+    bounds = bucket_bounds(len(valid) - 2, max_points - 2) + 1
+
+    # Average point of every bucket, the 'next' corner of the triangles, and
+    # the last point standing in for the bucket after the last one
+    counts = np.diff(bounds)
+    x_avg = np.append(np.add.reduceat(x[:-1], bounds[:-1]) / counts, x[-1])
+    y_avg = np.append(np.add.reduceat(y[:-1], bounds[:-1]) / counts, y[-1])
+
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = len(valid) - 1
+    a = 0
+
+    for i in range(max_points - 2):
+        start, end = bounds[i], bounds[i + 1]
+
+        # Twice the triangle area between the last kept point, each point of
+        # the bucket and the average of the next bucket
+        area = np.abs((x[a] - x_avg[i + 1]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (y_avg[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+
+    return valid[kept]
+
+#-------------------------------------------------------------------------------
+# Indices of a series to draw
+#-------------------------------------------------------------------------------
+def downsample_indices(x, y, max_points, method='lttb'):
+    if (method == 'lttb'):
+        return lttb_indices(x, y, max_points)
+    if (method == 'minmax'):
+        return minmax_indices(y, max_points)
+
+    raise ValueError(f"Unknown downsampling method '{method}', expected 'lttb' or 'minmax'")
@@ -0,0 +1,239 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datastore import atomic_write
+
+#-------------------------------------------------------------------------------
+# Earnings data layer
+#
+# The earnings of a symbol (past quarters' EPS estimates and actuals plus the
+# current quarter's estimate) only change around the quarterly report, so
+# they are kept for `ttl` seconds:
+#   memory - symbol -> entry, shared by all sessions of the process
+#   disk   - data/cache/earnings/<symbol>.json, shared by the app processes,
+#            survives restarts and is all that offline mode serves
+#
+# prefetch() fetches the missing symbols of a whole pattern-match list in the
+# background with one multi-symbol request per batch, so flipping through the
+# matches doesn't wait on the network. The fetcher is injectable:
+#   fetcher(symbols) -> {symbol: {'history': [...], 'estimate': float}}
+# symbols it has no data for are left out.
+#-------------------------------------------------------------------------------
+cache_directory = 'data/cache/earnings'
+
+# Symbols per multi-symbol request
+batch_size = 50
+
+#-------------------------------------------------------------------------------
+# Default fetcher: one yahooquery Ticker for a batch of symbols
+#-------------------------------------------------------------------------------
+def yahooquery_fetcher(symbols):
+    from yahooquery import Ticker
+
+    ticker = Ticker(list(symbols), asynchronous=True)
+    history = ticker.earning_history
+    earnings = ticker.earnings
+
+    # A failed symbol comes back as an error string instead of data
+    if (not hasattr(history, 'reset_index')):
+        return {}
+    history = history.reset_index()
+
+    results = {}
+    for symbol in symbols:
+        rows = history[history['symbol'] == symbol]
+        chart = earnings.get(symbol) if isinstance(earnings, dict) else None
+        if (rows.empty or not isinstance(chart, dict)):
+            continue
+
+        results[symbol] = {
+            'history': [{'period': row['period'], 'epsEstimate': row['epsEstimate'], 'epsActual': row['epsActual']}
+                        for row in rows.to_dict('records')],
+            'estimate': chart.get('earningsChart', {}).get('currentQuarterEstimate'),
+        }
+
+    return results
+
+class EarningsCache:
+    """
+    Args:
+        directory (str): Disk store location, None for a memory-only cache.
+        ttl (float): Seconds the earnings of a symbol stay fresh.
+        offline (bool): Never fetch, serve whatever the disk store has.
+        fetcher (Callable): fetcher(symbols) -> {symbol: entry}.
+    """
+    def __init__(self, directory=cache_directory, ttl=12 * 60 * 60, offline=False,
+                 fetcher=yahooquery_fetcher, max_workers=2, clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self.fetcher = fetcher
+        self.clock = clock
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+        # symbol -> entry with 'fetched_at', 'history' and 'estimate'
+        self.memory = {}
+        # symbol -> when the fetcher last had no data for it
+        self.unavailable = {}
+        # symbol -> future of the batch fetching it
+        self.fetching = {}
+        self.lock = threading.Lock()
+
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'fetched': 0, 'misses': 0}
+
+        if (directory is not None):
+            os.makedirs(directory, exist_ok=True)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.stats[name] += n
+
+    def is_fresh(self, entry):
+        return self.offline or self.clock() - entry['fetched_at'] < self.ttl
+
+    def known_unavailable(self, symbol):
+        checked_at = self.unavailable.get(symbol)
+        return checked_at is not None and self.clock() - checked_at < self.ttl
+
+    #---------------------------------------------------------------------------
+    # Disk store
+    #---------------------------------------------------------------------------
+    def path(self, symbol):
+        return os.path.join(self.directory, symbol + '.json')
+
+    def load(self, symbol):
+        if (self.directory is None):
+            return None
+
+        try:
+            with open(self.path(symbol), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store(self, symbol, entry):
+        if (self.directory is None):
+            return
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f, default=str)
+
+        atomic_write(self.path(symbol), write)
+
+    #---------------------------------------------------------------------------
+    # Cached entry, fresh or not, memory first
+    #---------------------------------------------------------------------------
+    def cached(self, symbol):
+        entry = self.memory.get(symbol)
+        if (entry is not None):
+            return entry, 'memory_hits'
+
+        entry = self.load(symbol)
+        if (entry is not None):
+            with self.lock:
+                self.memory[symbol] = entry
+            return entry, 'disk_hits'
+
+        return None, None
+
+    #---------------------------------------------------------------------------
+    # Fetch a batch of symbols and store what came back
+    #---------------------------------------------------------------------------
+    def fetch(self, symbols):
+        try:
+            results = self.fetcher(symbols)
+        except Exception:
+            # Network down or rate limited: the stale entries are still served
+            return {}
+
+        fetched_at = self.clock()
+
+        # No earnings (ETFs, new listings): don't ask again until the ttl is over
+        with self.lock:
+            for symbol in symbols:
+                if (symbol not in results):
+                    self.unavailable[symbol] = fetched_at
+
+        for symbol, entry in results.items():
+            entry = dict(entry, fetched_at=fetched_at)
+            with self.lock:
+                self.memory[symbol] = entry
+            self.store(symbol, entry)
+
+        self.count('fetched', len(results))
+        return results
+
+    def run_batch(self, symbols):
+        try:
+            self.fetch(symbols)
+        finally:
+            with self.lock:
+                for symbol in symbols:
+                    self.fetching.pop(symbol, None)
+
+    #---------------------------------------------------------------------------
+    # Fetch every symbol not cached or stale in the background
+    #---------------------------------------------------------------------------
+    def prefetch(self, symbols):
+        """
+        Returns:
+            List[Future]: The batches started, already fetching symbols and
+            fresh ones are skipped.
+        """
+        if (self.offline):
+            return []
+
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            entry, _ = self.cached(symbol)
+            if ((entry is None and not self.known_unavailable(symbol))
+                    or (entry is not None and not self.is_fresh(entry))):
+                missing.append(symbol)
+
+        futures = []
+        with self.lock:
+            missing = [symbol for symbol in missing if symbol not in self.fetching]
+
+            for i in range(0, len(missing), batch_size):
+                batch = missing[i:i + batch_size]
+                future = self.pool.submit(self.run_batch, batch)
+                for symbol in batch:
+                    self.fetching[symbol] = future
+                futures.append(future)
+
+        return futures
+
+    #---------------------------------------------------------------------------
+    # Earnings of one symbol
+    #---------------------------------------------------------------------------
+    def get(self, symbol, timeout=10):
+        """
+        Returns:
+            dict: 'history' (list of period, epsEstimate, epsActual), 'estimate'
+            and 'fetched_at', None if there is no data for the symbol.
+        """
+        entry, tier = self.cached(symbol)
+        if (entry is not None and self.is_fresh(entry)):
+            self.count(tier)
+            return entry
+
+        if (self.offline or (entry is None and self.known_unavailable(symbol))):
+            self.count('misses')
+            return entry
+
+        # Wait for the prefetch fetching it, or fetch it now
+        with self.lock:
+            future = self.fetching.get(symbol)
+
+        if (future is not None):
+            wait([future], timeout=timeout)
+        else:
+            self.fetch([symbol])
+
+        new_entry = self.memory.get(symbol)
+        if (new_entry is None or new_entry is entry):
+            self.count('misses')
+        return new_entry or entry
@@ -0,0 +1,326 @@
+from collections import deque
+
+#-------------------------------------------------------------------------------
+# Streaming indicators
+#
+# Each indicator keeps a small rolling state and is updated one bar at a time,
+# so appending a bar costs the same no matter how long the history is.
+# peek(x) gives the value a bar would have without adding it, for the bar that
+# is still open (e.g. this week's bar of a weekly chart, which changes until
+# the week is over). The outputs match the batch functions in stock_performance.py (SMA, EMA, RSI,
+# MACD and talib's LINEARREG) to floating point tolerance, also over missing
+# (NaN) closes. One difference: talib's LINEARREG stays NaN for good after a
+# NaN close, the linear regression here recovers once it leaves the window.
+#-------------------------------------------------------------------------------
+nan = float('nan')
+
+def check_window(window):
+    if (window < 1):
+        raise ValueError(f'window must be at least 1, got {window}')
+
+#-------------------------------------------------------------------------------
+# Exponential Moving Average, same as ewm(span=window, adjust=False).mean()
+#
+# Over NaN closes the last value is carried and, like pandas (ignore_na=False),
+# decays once per missing bar: the next close weighs alpha against
+# (1 - alpha)**(gap + 1) for the old value.
+#-------------------------------------------------------------------------------
+class EMAState:
+    def __init__(self, window=20):
+        check_window(window)
+        self.alpha = 2 / (window + 1)
+        self.value = None
+        # NaN closes since the last close
+        self.gap = 0
+
+    def update(self, x):
+        if (x != x):
+            if (self.value is None):
+                return nan
+            self.gap += 1
+            return self.value
+
+        self.value = self.peek(x)
+        self.gap = 0
+        return self.value
+
+    def peek(self, x):
+        if (self.value is None):
+            return x
+        if (x != x):
+            return self.value
+
+        old_weight = (1 - self.alpha) ** (self.gap + 1)
+        return (old_weight * self.value + self.alpha * x) / (old_weight + self.alpha)
+
+#-------------------------------------------------------------------------------
+# Simple Moving Average, same as rolling(window=window).mean()
+#
+# NaN prices are left out of the total and counted instead: the average is NaN
+# while one is in the window, like pandas, and recovers once it drops out.
+#-------------------------------------------------------------------------------
+class SMAState:
+    def __init__(self, window=100):
+        check_window(window)
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.nans = 0
+
+    def advance(self, x):
+        # The total and NaN count with x added, the state is unchanged
+        total, nans = self.total, self.nans
+
+        if (len(self.values) == self.window):
+            oldest = self.values[0]
+            if (oldest != oldest):
+                nans -= 1
+            else:
+                total -= oldest
+
+        if (x != x):
+            nans += 1
+        else:
+            total += x
+
+        return total, nans
+
+    def update(self, x):
+        self.total, self.nans = self.advance(x)
+        self.values.append(x)
+        return self.value(len(self.values), self.total, self.nans)
+
+    def peek(self, x):
+        return self.value(min(len(self.values) + 1, self.window), *self.advance(x))
+
+    def value(self, length, total, nans):
+        if (length < self.window or nans > 0):
+            return nan
+        return total / self.window
+
+#-------------------------------------------------------------------------------
+# Relative Strength Index, same as stock_performance.RSI: the average gain and
+# loss are plain rolling means of the last `window` price changes (min_periods=1)
+#-------------------------------------------------------------------------------
+class RSIState:
+    def __init__(self, window=14):
+        check_window(window)
+        self.previous = None
+        # (gain, loss) per bar, None for the first bar which has no change
+        self.changes = deque(maxlen=window)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.count = 0
+
+    def advance(self, x):
+        # The change of x and the sums with it added, the state is unchanged
+        gain_sum, loss_sum, count = self.gain_sum, self.loss_sum, self.count
+
+        if (len(self.changes) == self.changes.maxlen):
+            oldest = self.changes[0]
+            if (oldest is not None):
+                gain_sum -= oldest[0]
+                loss_sum -= oldest[1]
+                count -= 1
+
+        # No change next to a NaN close, like diff() in pandas
+        if (self.previous is None or x != x or self.previous != self.previous):
+            change = None
+        else:
+            diff = x - self.previous
+            change = (max(diff, 0.0), max(-diff, 0.0))
+            gain_sum += change[0]
+            loss_sum += change[1]
+            count += 1
+
+        return change, gain_sum, loss_sum, count
+
+    def update(self, x):
+        change, self.gain_sum, self.loss_sum, self.count = self.advance(x)
+        self.changes.append(change)
+        self.previous = x
+        return self.value(self.gain_sum, self.loss_sum, self.count)
+
+    def peek(self, x):
+        return self.value(*self.advance(x)[1:])
+
+    @staticmethod
+    def value(gain_sum, loss_sum, count):
+        if (count == 0):
+            return nan
+
+        avg_gain = gain_sum / count
+        avg_loss = loss_sum / count
+
+        # Division by zero the way pandas does it: x/0 -> inf (RSI 100), 0/0 -> NaN
+        if (avg_loss <= 0):
+            return 100.0 if avg_gain > 0 else nan
+
+        rs = avg_gain / avg_loss
+        return 100 - (100 / (1 + rs))
+
+#-------------------------------------------------------------------------------
+# Least squares line over the last `window` closes, value at the latest bar,
+# same as talib.LINEARREG(timeperiod=window)
+#
+# x runs 0..n-1 over the window. When the window slides, every x drops by one,
+# so sum(x*y) loses sum(y) of the remaining values and gains (n-1)*y_new.
+#
+# NaN closes count as 0 in the sums and are counted like in SMAState: the line
+# is NaN while one is in the window.
+#-------------------------------------------------------------------------------
+class LinearRegressionState:
+    def __init__(self, window=14):
+        check_window(window)
+        n = window
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.nans = 0
+        self.sum_x = n * (n - 1) / 2
+        self.divisor = n * (n * (n - 1) * (2 * n - 1) / 6) - self.sum_x * self.sum_x
+
+    def advance(self, y):
+        # The sums and NaN count with y added, the state is unchanged
+        n = self.window
+        sum_y, sum_xy, nans = self.sum_y, self.sum_xy, self.nans
+
+        if (y != y):
+            nans += 1
+            y = 0.0
+
+        if (len(self.values) == n):
+            oldest = self.values[0]
+            if (oldest != oldest):
+                nans -= 1
+                oldest = 0.0
+            sum_xy -= sum_y - oldest
+            sum_y -= oldest
+            sum_xy += (n - 1) * y
+        else:
+            sum_xy += len(self.values) * y
+
+        return sum_y + y, sum_xy, nans
+
+    def update(self, y):
+        self.sum_y, self.sum_xy, self.nans = self.advance(y)
+        self.values.append(y)
+        return self.value(y, len(self.values), self.sum_y, self.sum_xy, self.nans)
+
+    def peek(self, y):
+        return self.value(y, min(len(self.values) + 1, self.window), *self.advance(y))
+
+    def value(self, y, length, sum_y, sum_xy, nans):
+        n = self.window
+
+        if (length < n or nans > 0):
+            return nan
+        if (n == 1):
+            return y
+
+        slope = (n * sum_xy - self.sum_x * sum_y) / self.divisor
+        intercept = (sum_y - slope * self.sum_x) / n
+        return intercept + slope * (n - 1)
+
+#-------------------------------------------------------------------------------
+# MACD, Signal Line and Histogram, same as stock_performance.MACD
+#-------------------------------------------------------------------------------
+class MACDState:
+    def __init__(self, short_window=12, long_window=26, signal_window=9):
+        self.short = EMAState(short_window)
+        self.long = EMAState(long_window)
+        self.signal = EMAState(signal_window)
+
+    def update(self, x):
+        macd = self.short.update(x) - self.long.update(x)
+        signal = self.signal.update(macd)
+        return macd, signal, macd - signal
+
+    def peek(self, x):
+        macd = self.short.peek(x) - self.long.peek(x)
+        signal = self.signal.peek(macd)
+        return macd, signal, macd - signal
+
+#-------------------------------------------------------------------------------
+# All the indicators of the Technical analysis page, updated bar by bar
+#-------------------------------------------------------------------------------
+class IndicatorEngine:
+    """
+    Args:
+        ema_window (int): Window size for the EMA.
+        rsi_window (int): Window size for the RSI.
+        sma_window (int): Window size for the SMA.
+        regression_window (int): Window size for the linear regression.
+        macd_windows (Tuple[int, int, int]): Short, long and signal windows.
+
+    The output names are the DataFrame columns the batch functions add.
+    """
+    columns = ['EMA', 'RSI', 'SMA_100', 'Linear_Regression', 'MACD', 'Signal_Line', 'MACD_Hist']
+
+    def __init__(self, ema_window=20, rsi_window=14, sma_window=100, regression_window=14,
+                 macd_windows=(12, 26, 9)):
+        self.ema = EMAState(ema_window)
+        self.rsi = RSIState(rsi_window)
+        self.sma = SMAState(sma_window)
+        self.regression = LinearRegressionState(regression_window)
+        self.macd = MACDState(*macd_windows)
+        self.bars = 0
+
+    def update(self, close):
+        """
+        Args:
+            close (float): Closing price of the new bar.
+
+        Returns:
+            Dict[str, float]: The value of every indicator for the new bar.
+        """
+        close = float(close)
+        self.bars += 1
+
+        macd, signal, hist = self.macd.update(close)
+
+        return {
+            'EMA': self.ema.update(close),
+            'RSI': self.rsi.update(close),
+            'SMA_100': self.sma.update(close),
+            'Linear_Regression': self.regression.update(close),
+            'MACD': macd,
+            'Signal_Line': signal,
+            'MACD_Hist': hist,
+        }
+
+    def update_many(self, closes):
+        """
+        Returns:
+            Dict[str, List[float]]: The indicator values for every close.
+        """
+        outputs = {column: [] for column in self.columns}
+
+        for close in closes:
+            for column, value in self.update(close).items():
+                outputs[column].append(value)
+
+        return outputs
+
+    def peek(self, close):
+        """
+        Args:
+            close (float): Latest closing price of a bar that is still open.
+
+        Returns:
+            Dict[str, float]: The value of every indicator if the bar closed at
+            `close`, the engine is unchanged.
+        """
+        close = float(close)
+        macd, signal, hist = self.macd.peek(close)
+
+        return {
+            'EMA': self.ema.peek(close),
+            'RSI': self.rsi.peek(close),
+            'SMA_100': self.sma.peek(close),
+            'Linear_Regression': self.regression.peek(close),
+            'MACD': macd,
+            'Signal_Line': signal,
+            'MACD_Hist': hist,
+        }
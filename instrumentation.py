@@ -0,0 +1,186 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from universes import instrumentation_enabled
+
+#-------------------------------------------------------------------------------
+# Lightweight instrumentation of the hot paths
+#
+#   timed('scan')          - wall time and call count of a phase (context manager)
+#   count('bytes_read', n) - counters: bytes read, cache hits and misses, ...
+#   record_error(...)      - per-symbol errors, counted and the latest kept
+#   register_stats(...)    - stats dicts of long lived objects (price cache,
+#                            scan cache, ...) read at export time
+#
+# Everything is per process. It is off unless INSTRUMENTATION=1, then every
+# call returns after one attribute check, so the hooks can stay in the hot
+# paths. The metrics are exported as a JSON snapshot (structured log line),
+# in the Prometheus text format (served by start_http_server) and in the app's
+# sidebar debug panel.
+#-------------------------------------------------------------------------------
+log = logging.getLogger('metrics')
+
+# Latest errors kept for the debug panel
+max_errors = 50
+
+class Metrics:
+    def __init__(self, enabled=False, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # phase -> [calls, total seconds, max seconds]
+            self.phases = {}
+            self.counters = {}
+            self.error_counts = {}
+            self.errors = deque(maxlen=max_errors)
+            self.stats_sources = getattr(self, 'stats_sources', {})
+
+    #---------------------------------------------------------------------------
+    # Recording
+    #---------------------------------------------------------------------------
+    def add_time(self, phase, seconds):
+        with self.lock:
+            entry = self.phases.get(phase)
+            if (entry is None):
+                entry = self.phases[phase] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def count(self, name, n=1):
+        if (not self.enabled):
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_error(self, phase, symbol, error):
+        if (not self.enabled):
+            return
+        with self.lock:
+            self.error_counts[phase] = self.error_counts.get(phase, 0) + 1
+            self.errors.append({'time': time.time(), 'phase': phase, 'symbol': symbol,
+                                'error': f'{type(error).__name__}: {error}'})
+
+    def timed(self, phase):
+        if (not self.enabled):
+            return disabled_timer
+        return Timer(self, phase)
+
+    def register_stats(self, name, stats):
+        """
+        Args:
+            name (str): Prefix of the exported values, e.g. 'price_cache'.
+            stats (dict): Live dict of numbers, read at export time.
+        """
+        with self.lock:
+            self.stats_sources[name] = stats
+
+    #---------------------------------------------------------------------------
+    # Export
+    #---------------------------------------------------------------------------
+    def snapshot(self):
+        with self.lock:
+            return {
+                'phases': {phase: {'calls': calls, 'seconds': round(total, 6), 'max_seconds': round(longest, 6)}
+                           for phase, (calls, total, longest) in self.phases.items()},
+                'counters': dict(self.counters),
+                'stats': {name: dict(stats) for name, stats in self.stats_sources.items()},
+                'error_counts': dict(self.error_counts),
+                'errors': list(self.errors),
+            }
+
+    def log_snapshot(self, logger=log):
+        if (self.enabled):
+            logger.info(json.dumps(self.snapshot()))
+
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name, kind, samples):
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{{{labels}}} {value}' for labels, value in samples)
+
+        phases = sorted(snapshot['phases'].items())
+        family('app_phase_seconds_total', 'counter', [(f'phase="{phase}"', values['seconds']) for phase, values in phases])
+        family('app_phase_calls_total', 'counter', [(f'phase="{phase}"', values['calls']) for phase, values in phases])
+        family('app_phase_max_seconds', 'gauge', [(f'phase="{phase}"', values['max_seconds']) for phase, values in phases])
+        family('app_events_total', 'counter', [(f'name="{name}"', value)
+                                               for name, value in sorted(snapshot['counters'].items())])
+        family('app_stat', 'gauge', [(f'source="{source}",name="{name}"', value)
+                                     for source, stats in sorted(snapshot['stats'].items())
+                                     for name, value in sorted(stats.items()) if isinstance(value, (int, float))])
+        family('app_errors_total', 'counter', [(f'phase="{phase}"', value)
+                                               for phase, value in sorted(snapshot['error_counts'].items())])
+
+        return '\n'.join(lines) + '\n'
+
+#-------------------------------------------------------------------------------
+# Context manager timing a phase
+#-------------------------------------------------------------------------------
+class Timer:
+    __slots__ = ('metrics', 'phase', 'start')
+
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.start = self.metrics.clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.phase, self.metrics.clock() - self.start)
+        return False
+
+class DisabledTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+disabled_timer = DisabledTimer()
+
+#-------------------------------------------------------------------------------
+# The metrics of this process
+#-------------------------------------------------------------------------------
+metrics = Metrics(enabled=instrumentation_enabled)
+
+timed = metrics.timed
+count = metrics.count
+record_error = metrics.record_error
+register_stats = metrics.register_stats
+
+#-------------------------------------------------------------------------------
+# Serve the metrics in the Prometheus text format on /metrics
+#-------------------------------------------------------------------------------
+def start_http_server(port, host='0.0.0.0'):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if (self.path.split('?')[0] != '/metrics'):
+                self.send_error(404)
+                return
+
+            body = metrics.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
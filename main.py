@@ -2,11 +2,10 @@
 # Driver code for the Streamlit app
 # streamlit run filename.py to run the code
 #-------------------------------------------------------------------------------
+import importlib
 import streamlit as st
-import stock_performance as stock_performance
-import candlestick as candlestick
-import tickers as tickers
-import news as news
+from instrumentation import metrics, start_http_server
+from universes import metrics_port
 
 #-------------------------------------------------------------------------------
 # Set page configuration
@@ -16,13 +15,16 @@ st.set_page_config(
     initial_sidebar_state="expanded")
 
 #-------------------------------------------------------------------------------
-# Define page titles and URLs
+# Define page titles and the modules implementing them
+#
+# A page module (and with it talib, yfinance, plotly, matplotlib, ...) is only
+# imported once its page is opened, see benchmarks/bench_startup.py
 #-------------------------------------------------------------------------------
 pages = {
-    "📊 Technical analysis": stock_performance,
-    "🕯 Candlestick charts": candlestick,
-    "🔎 Ticker Search": tickers,
-    "💸 Top financial news": news
+    "📊 Technical analysis": 'stock_performance',
+    "🕯 Candlestick charts": 'candlestick',
+    "🔎 Ticker Search": 'tickers',
+    "💸 Top financial news": 'news'
 }
 
 #-------------------------------------------------------------------------------
@@ -33,5 +35,21 @@ selected_page = st.sidebar.radio("Navigation", list(pages.keys()))
 #-------------------------------------------------------------------------------
 # Page selection
 #-------------------------------------------------------------------------------
-page = pages[selected_page]
+page = importlib.import_module(pages[selected_page])
 page.main()
+
+#-------------------------------------------------------------------------------
+# Metrics (INSTRUMENTATION=1): Prometheus endpoint on METRICS_PORT, started
+# once per process, and a debug panel at the bottom of the sidebar
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def metrics_server(port):
+    return start_http_server(port)
+
+if (metrics.enabled):
+    if (metrics_port):
+        metrics_server(metrics_port)
+
+    with st.sidebar.expander("Metrics"):
+        st.json(metrics.snapshot(), expanded=False)
+        st.code(metrics.prometheus_text(), language='text')
@@ -1,69 +1,90 @@
 import streamlit as st
-from bs4 import BeautifulSoup as BS
-import requests as req
+from news_fetcher import NewsFetcher, default_sources
+from data_access import get_data_access, DeadlineExceeded
+from instrumentation import timed
 
-url = "https://www.businesstoday.in/latest/economy"
+#-------------------------------------------------------------------------------
+# News fetcher shared by all user sessions: pooled session, cached headlines,
+# at most one request per source every `ttl` seconds (see news_fetcher.py)
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def get_news_fetcher():
+    return NewsFetcher(sources=default_sources, ttl=10 * 60)
+
+#-------------------------------------------------------------------------------
+# Headlines of several sources, fetched at the same time through the data
+# access layer: a slow source gives its cached headlines after the fetch
+# deadline, or none if it was never fetched
+#-------------------------------------------------------------------------------
+def scrape_sources(sources):
+    """
+    Args:
+        sources (List[str]): The names of the news sources.
+
+    Returns:
+        Dict[str, Tuple[List[str], List[str], str]]: For each source its
+        headlines, article links and the error of its last fetch (None if
+        there was none).
+    """
+    access = get_data_access()
+    fetcher = get_news_fetcher()
+
+    with timed('news'):
+        entries = access.gather({source: access.news(fetcher, source) for source in sources})
+
+    results = {}
+    for source, entry in entries.items():
+        if (isinstance(entry, DeadlineExceeded)):
+            results[source] = ([], [], 'Still loading')
+        elif (isinstance(entry, Exception)):
+            results[source] = ([], [], str(entry))
+        else:
+            # Split the (headline, link) pairs into the headlines and the article links
+            headlines = [headline for headline, _ in entry['headlines']]
+            article_links = [link for _, link in entry['headlines']]
+            results[source] = (headlines, article_links, entry.get('error'))
+
+    return results
 
 #-------------------------------------------------------------------------------
 # Scrapes headlines and article links from a webpage.
 #-------------------------------------------------------------------------------
-def scraping(): 
+def scraping(source='Business Today'): 
     """
     Args:
-        url (str): The URL of the webpage to scrape.
+        source (str): The name of the news source to get the headlines of.
 
     Returns:
         Tuple[List[str], List[str]]: A tuple containing a list of headlines and a list of article links.
     """
-    # Make a GET request to the webpage
-    webpage = req.get(url)
-
-    # Create a BeautifulSoup object to parse the webpage content
-    trav = BS(webpage.content, "html.parser")
-
-    # Initialize empty lists to store the headlines and article links
-    headlines = []
-    article_links = []
-    M = 1
-
-    # Iterate over all 'a' tags in the parsed content
-    for link in trav.find_all('a'):
-        # Check if the link text is a NavigableString and has length > 35
-        if (
-            str(type(link.string)) == "<class 'bs4.element.NavigableString'>"
-            and len(link.string.strip()) > 35
-        ):
-            # Extract the headline and add it to the headlines list
-            headline = link.string.strip()
-            headlines.append(headline)
-
-            # Extract the article link and add it to the article links list
-            article_link = link['href'] if link['href'].startswith('http') else 'https://www.businesstoday.in' + link['href']
-            article_links.append(article_link)
-            M += 1
-
+    headlines, article_links, _ = scrape_sources([source])[source]
     return headlines, article_links
 
 #-------------------------------------------------------------------------------
 # This function displays the latest economy news headlines fetched from 
-# a specific source.
+# the configured sources.
 #-------------------------------------------------------------------------------
 
 def main():
     # Set the title of the page
     st.title("💸 Financial News")
 
-    # Fetch and display financial news headlines related to the Economy category with a length greater than 35 characters
-    headlines, article_links = scraping()
+    # All the sources at once, none waits longer than the fetch deadline
+    results = scrape_sources(get_news_fetcher().sources)
 
     # Display the header for the latest economy news headlines
     st.header("Latest Economy News Headlines:")
-    # Display the source of the news headlines
-    st.markdown('_Source: Business Today_')
 
-    # Display each headline with its corresponding link
-    for i, (headline, link) in enumerate(zip(headlines, article_links), 1):
-        st.markdown(f"{i}. [{headline}]({link})")
+    for source, (headlines, article_links, error) in results.items():
+        # Display the source of the news headlines
+        st.markdown(f'_Source: {source}_')
+
+        # Display each headline with its corresponding link
+        for count, (headline, link) in enumerate(zip(headlines, article_links), 1):
+            st.markdown(f"{count}. [{headline}]({link})")
+
+        if (not headlines and error):
+            st.warning(f"Couldn't load the headlines: {error}")
 
 #-------------------------------------------------------------------------------
 # Driver
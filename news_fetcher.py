@@ -0,0 +1,383 @@
+import codecs
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+
+#-------------------------------------------------------------------------------
+# News fetch layer
+#
+# - One pooled requests session for all sources and all user sessions.
+# - Parsed headlines are cached per source for `ttl` seconds. After that the
+#   stale headlines are still served while one background refresh runs, so a
+#   page render only waits on the network when a source was never fetched,
+#   and then the headlines are shown while the page is still being parsed.
+# - Refreshes are conditional GETs (ETag / Last-Modified), a 304 keeps the
+#   cached headlines without parsing anything.
+# - Sources are fetched concurrently, each with its own timeout.
+#
+# The HTTP call is injectable, so the layer can be run on saved HTML fixtures.
+#-------------------------------------------------------------------------------
+default_sources = [
+    {
+        'name': 'Business Today',
+        'url': 'https://www.businesstoday.in/latest/economy',
+        'base_url': 'https://www.businesstoday.in',
+        'timeout': 10,
+    },
+]
+
+# Only link texts longer than this are headlines, shorter ones are navigation
+min_headline_length = 35
+
+#-------------------------------------------------------------------------------
+# Fastest installed parser for BeautifulSoup
+#-------------------------------------------------------------------------------
+def html_parser():
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+#-------------------------------------------------------------------------------
+# Incremental parser that only looks at <a href=...> tags
+#
+# A link qualifies when its text is one plain string, possibly wrapped in
+# single nested tags (<a><span>text</span></a>), which is what BeautifulSoup's
+# link.string returns a NavigableString for. Anything with several children,
+# a comment or a void tag inside is navigation or markup, not a headline.
+#-------------------------------------------------------------------------------
+# HTML elements without an end tag, <img src=...> is the same as <img src=.../>
+void_elements = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                 'source', 'track', 'wbr'}
+
+class AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.href = None
+        self.depth = 0
+        self.text = None
+        self.valid = True
+        # Text can arrive in pieces when the page is fed in chunks
+        self.in_text = False
+
+    def handle_starttag(self, tag, attrs):
+        if (tag in void_elements):
+            self.handle_startendtag(tag, attrs)
+            return
+
+        self.in_text = False
+
+        if (tag == 'a' and self.href is None):
+            self.href = dict(attrs).get('href')
+            self.depth = 0
+            self.text = None
+            self.valid = self.href is not None
+        elif (self.href is not None):
+            # Only wrapping tags before the text, each the single child of its parent
+            if (self.text is not None):
+                self.valid = False
+            self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.in_text = False
+        if (self.href is not None):
+            self.valid = False
+
+    def handle_endtag(self, tag):
+        self.in_text = False
+        if (self.href is None or tag in void_elements):
+            return
+
+        if (tag == 'a' and self.depth == 0):
+            if (self.valid and self.text is not None):
+                self.links.append((self.text, self.href))
+            self.href = None
+        else:
+            self.depth -= 1
+            if (self.text is None):
+                self.valid = False
+
+    def handle_data(self, data):
+        if (self.href is None):
+            return
+
+        if (self.text is None):
+            self.text = data
+        elif (self.in_text):
+            self.text += data
+        else:
+            # Text split by a tag: more than one child
+            self.valid = False
+
+        self.in_text = True
+
+    def handle_comment(self, data):
+        self.in_text = False
+        if (self.href is not None):
+            self.valid = False
+
+#-------------------------------------------------------------------------------
+# Yield (headline, article link) pairs while the page is being parsed
+#-------------------------------------------------------------------------------
+def iter_headlines(chunks, base_url, min_length=min_headline_length):
+    """
+    Args:
+        chunks (Iterable[bytes or str]): The page content, e.g. response.iter_content().
+        base_url (str): Prepended to relative links.
+        min_length (int): Minimum headline length.
+
+    Yields:
+        Tuple[str, str]: Headline and article link, each headline and each link only once.
+    """
+    parser = AnchorParser()
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    seen = set()
+
+    def new_links():
+        for text, href in parser.links:
+            headline = text.strip()
+            if (len(headline) <= min_length):
+                continue
+
+            link = href if href.startswith('http') else base_url + href
+            if (headline in seen or link in seen):
+                continue
+
+            seen.add(headline)
+            seen.add(link)
+            yield headline, link
+
+        parser.links.clear()
+
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk) if isinstance(chunk, bytes) else chunk)
+        yield from new_links()
+
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from new_links()
+
+#-------------------------------------------------------------------------------
+# Extract (headline, article link) pairs from a page
+#-------------------------------------------------------------------------------
+def parse_headlines(html, base_url, min_length=min_headline_length):
+    """
+    Args:
+        html (bytes or str): The page content.
+        base_url (str): Prepended to relative links.
+        min_length (int): Minimum headline length.
+
+    Returns:
+        List[Tuple[str, str]]: Headlines and their article links.
+    """
+    return list(iter_headlines([html], base_url, min_length))
+
+#-------------------------------------------------------------------------------
+# Same extraction with BeautifulSoup, building only the <a> tags of the page
+#-------------------------------------------------------------------------------
+def parse_headlines_soup(html, base_url, min_length=min_headline_length):
+    from bs4 import BeautifulSoup as BS, NavigableString, SoupStrainer
+
+    trav = BS(html, html_parser(), parse_only=SoupStrainer('a', href=True))
+
+    headlines = []
+    seen = set()
+
+    for link in trav.find_all('a', href=True):
+        text = link.string
+
+        # A plain NavigableString, not a Comment or other subclass
+        if (type(text) is not NavigableString or len(text.strip()) <= min_length):
+            continue
+
+        headline = text.strip()
+        href = link['href']
+        article_link = href if href.startswith('http') else base_url + href
+
+        if (headline not in seen and article_link not in seen):
+            seen.add(headline)
+            seen.add(article_link)
+            headlines.append((headline, article_link))
+
+    return headlines
+
+#-------------------------------------------------------------------------------
+# Default HTTP call: GET on a pooled requests session
+#-------------------------------------------------------------------------------
+def session_getter(pool_size=10):
+    import requests as req
+    from requests.adapters import HTTPAdapter
+
+    session = req.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    # stream=True: the body is read chunk by chunk by response.iter_content
+    def get(url, headers, timeout):
+        return session.get(url, headers=headers, timeout=timeout, stream=True)
+
+    return get
+
+class NewsFetcher:
+    """
+    Args:
+        sources (List[dict]): name, url, base_url and timeout of every source.
+        ttl (float): Seconds the headlines of a source stay fresh.
+        http_get (Callable): http_get(url, headers, timeout) -> response with
+            status_code, headers and content (and optionally iter_content),
+            defaults to a pooled session.
+    """
+    def __init__(self, sources=default_sources, ttl=10 * 60, http_get=None,
+                 max_workers=4, clock=time.time):
+        self.sources = {source['name']: source for source in sources}
+        self.ttl = ttl
+        self.http_get = http_get if http_get is not None else session_getter()
+        self.clock = clock
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+        # name -> {'headlines', 'etag', 'last_modified', 'fetched_at', 'error'}
+        self.cache = {}
+        # name -> future of the refresh in flight, at most one per source
+        self.refreshing = {}
+        self.lock = threading.Lock()
+
+    #---------------------------------------------------------------------------
+    # Fetch one source, conditional on what is cached. Headlines are yielded
+    # while the page is parsed, the cache is updated once the page is done.
+    #---------------------------------------------------------------------------
+    def refresh_iter(self, name):
+        source = self.sources[name]
+        entry = self.cache.get(name, {})
+
+        headers = {}
+        if (entry.get('etag')):
+            headers['If-None-Match'] = entry['etag']
+        if (entry.get('last_modified')):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = self.http_get(source['url'], headers, source.get('timeout', 10))
+
+            if (response.status_code == 304 and 'headlines' in entry):
+                new_entry = dict(entry, fetched_at=self.clock(), error=None)
+                yield from new_entry['headlines']
+            elif (response.status_code == 200):
+                if (hasattr(response, 'iter_content')):
+                    chunks = response.iter_content(chunk_size=16 * 1024)
+                else:
+                    chunks = [response.content]
+
+                headlines = []
+                for headline in iter_headlines(chunks, source.get('base_url', '')):
+                    headlines.append(headline)
+                    yield headline
+
+                new_entry = {
+                    'headlines': headlines,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched_at': self.clock(),
+                    'error': None,
+                }
+            else:
+                raise RuntimeError(f'HTTP {response.status_code}')
+
+        except Exception as error:
+            # Keep serving the old headlines, retry after the ttl
+            new_entry = dict(entry, fetched_at=self.clock(), error=f'{type(error).__name__}: {error}')
+            new_entry.setdefault('headlines', [])
+
+        with self.lock:
+            self.cache[name] = new_entry
+            self.refreshing.pop(name, None)
+
+    def refresh(self, name):
+        for _ in self.refresh_iter(name):
+            pass
+        return self.cache[name]
+
+    #---------------------------------------------------------------------------
+    # Headlines of one source as they become available
+    #
+    # Cached headlines are yielded at once (a stale source is refreshed in the
+    # background). A source never fetched is fetched here and its headlines
+    # are yielded while the page is still being parsed.
+    #---------------------------------------------------------------------------
+    def stream(self, name):
+        entry = self.cache.get(name)
+
+        if (entry is not None):
+            if (self.clock() - entry['fetched_at'] >= self.ttl):
+                self.start_refresh(name)
+            yield from entry['headlines']
+            return
+
+        with self.lock:
+            future = self.refreshing.get(name)
+            owner = future is None
+            if (owner):
+                future = Future()
+                self.refreshing[name] = future
+
+        # Someone else is fetching it already, wait for their result
+        if (not owner):
+            wait([future], timeout=self.sources[name].get('timeout', 10))
+            yield from self.cache.get(name, {}).get('headlines', [])
+            return
+
+        try:
+            yield from self.refresh_iter(name)
+        finally:
+            # Also when the caller stopped early: let waiting sessions go on
+            with self.lock:
+                if (self.refreshing.get(name) is future):
+                    self.refreshing.pop(name)
+            future.set_result(None)
+
+    #---------------------------------------------------------------------------
+    # Start a background refresh unless one is already running
+    #---------------------------------------------------------------------------
+    def start_refresh(self, name):
+        with self.lock:
+            future = self.refreshing.get(name)
+            if (future is None):
+                future = self.pool.submit(self.refresh, name)
+                self.refreshing[name] = future
+            return future
+
+    #---------------------------------------------------------------------------
+    # Headlines of the sources, stale ones are refreshed in the background
+    #---------------------------------------------------------------------------
+    def get(self, names=None):
+        """
+        Args:
+            names (List[str]): Sources to get, defaults to all of them.
+
+        Returns:
+            Dict[str, dict]: Cache entry per source ('headlines', 'fetched_at',
+            'error'). Sources never fetched before are waited for, up to their
+            timeout, all at the same time.
+        """
+        if (names is None):
+            names = list(self.sources)
+
+        now = self.clock()
+        first_fetches = {}
+
+        for name in names:
+            entry = self.cache.get(name)
+            if (entry is None or now - entry['fetched_at'] >= self.ttl):
+                future = self.start_refresh(name)
+                if (entry is None):
+                    first_fetches[name] = future
+
+        if (first_fetches):
+            timeout = max(self.sources[name].get('timeout', 10) for name in first_fetches)
+            wait(list(first_fetches.values()), timeout=timeout)
+
+        empty = {'headlines': [], 'fetched_at': None, 'error': 'Still loading'}
+        return {name: self.cache.get(name, empty) for name in names}
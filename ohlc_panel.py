@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from datastore import CsvStore, ohlc_columns
+
+#-------------------------------------------------------------------------------
+# In-memory OHLC panel of a whole universe
+#
+#   values - float64 array of shape (4, bars of all symbols), one C-contiguous
+#            row per Open/High/Low/Close, the bars of a symbol side by side
+#   days   - the shared date axis: sorted int64 days since 1970-01-01 of every
+#            date any symbol has a bar on
+#   slots  - int32 position in `days` of every bar
+#   index  - symbol -> SymbolRecord (offset and length into the arrays)
+#
+# A symbol costs one small record instead of a DataFrame with an index,
+# date strings, Adj Close and Volume, and load_ohlc hands out zero-copy,
+# contiguous slices that TA-Lib takes as they are.
+#-------------------------------------------------------------------------------
+class SymbolRecord:
+    __slots__ = ('symbol', 'offset', 'length')
+
+    def __init__(self, symbol, offset, length):
+        self.symbol = symbol
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return f'SymbolRecord({self.symbol!r}, {self.offset}, {self.length})'
+
+class OHLCPanel:
+    __slots__ = ('values', 'days', 'slots', 'index')
+
+    def __init__(self, values, days, slots, index):
+        self.values = values
+        self.days = days
+        self.slots = slots
+        self.index = index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, symbol):
+        return symbol in self.index
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.days.nbytes + self.slots.nbytes
+
+    def symbols(self):
+        return list(self.index)
+
+    #---------------------------------------------------------------------------
+    # Same interface as the stores in datastore.py
+    #---------------------------------------------------------------------------
+    def load_ohlc(self, symbol):
+        """
+        Returns:
+            Tuple[np.ndarray, ...]: Zero-copy Open, High, Low and Close views,
+            or None if the symbol isn't in the panel.
+        """
+        record = self.index.get(symbol)
+        if (record is None):
+            return None
+
+        end = record.offset + record.length
+        return tuple(self.values[i, record.offset:end] for i in range(len(ohlc_columns)))
+
+    def load_dates(self, symbol):
+        record = self.index.get(symbol)
+        if (record is None):
+            return None
+
+        slots = self.slots[record.offset:record.offset + record.length]
+        return self.days[slots].astype('datetime64[D]')
+
+    #---------------------------------------------------------------------------
+    # Bars of a symbol from a date on, e.g. the last year for a scan
+    #---------------------------------------------------------------------------
+    def load_ohlc_since(self, symbol, date):
+        record = self.index.get(symbol)
+        if (record is None):
+            return None
+
+        # Bars are in date order, so are their slots
+        day = np.datetime64(pd.Timestamp(date).date(), 'D').astype(np.int64)
+        slot = np.searchsorted(self.days, day)
+        slots = self.slots[record.offset:record.offset + record.length]
+        start = record.offset + int(np.searchsorted(slots, slot))
+
+        end = record.offset + record.length
+        return tuple(self.values[i, start:end] for i in range(len(ohlc_columns)))
+
+    #---------------------------------------------------------------------------
+    # Build a panel from (symbol, ohlc, dates) triples
+    #---------------------------------------------------------------------------
+    @classmethod
+    def from_arrays(cls, items):
+        """
+        Args:
+            items (Iterable[Tuple[str, Tuple[np.ndarray, ...], np.ndarray]]):
+                Symbol, Open/High/Low/Close arrays and datetime64 dates, in
+                date order.
+        """
+        items = [(symbol, ohlc, np.asarray(dates, dtype='datetime64[D]').astype(np.int64))
+                 for symbol, ohlc, dates in items]
+
+        total_bars = sum(len(dates) for _, _, dates in items)
+        values = np.empty((len(ohlc_columns), total_bars), dtype=np.float64)
+        all_days = np.empty(total_bars, dtype=np.int64)
+        index = {}
+        offset = 0
+
+        for symbol, ohlc, days in items:
+            length = len(days)
+            for i in range(len(ohlc_columns)):
+                values[i, offset:offset + length] = ohlc[i]
+            all_days[offset:offset + length] = days
+
+            index[symbol] = SymbolRecord(symbol, offset, length)
+            offset += length
+
+        days, slots = np.unique(all_days, return_inverse=True)
+        return cls(values, days, slots.astype(np.int32), index)
+
+    @classmethod
+    def from_store(cls, store, symbol_list=None):
+        """
+        Args:
+            store: A store from datastore.open_store.
+            symbol_list (List[str]): Symbols to load, defaults to all of them.
+        """
+        if (symbol_list is None):
+            symbol_list = store.symbols()
+
+        def items():
+            for symbol in symbol_list:
+                ohlc = store.load_ohlc(symbol)
+                dates = store.load_dates(symbol) if ohlc is not None else None
+                if (dates is not None and len(dates) == len(ohlc[3]) and len(dates) > 0):
+                    yield symbol, ohlc, dates
+
+        return cls.from_arrays(items())
+
+#-------------------------------------------------------------------------------
+# Panel of the symbols in a csv store directory, each file read only once
+#-------------------------------------------------------------------------------
+def load_panel(directory, symbol_list=None):
+    store = CsvStore(directory)
+
+    if (symbol_list is None):
+        symbol_list = store.symbols()
+
+    def items():
+        for symbol in symbol_list:
+            # Only the columns the panel keeps
+            try:
+                data = pd.read_csv(store.path(symbol), usecols=['Date'] + ohlc_columns)
+            except (OSError, ValueError, pd.errors.EmptyDataError):
+                continue
+
+            if (data.empty):
+                continue
+
+            ohlc = tuple(data[column].to_numpy(dtype=np.float64) for column in ohlc_columns)
+            yield symbol, ohlc, pd.to_datetime(data['Date']).to_numpy().astype('datetime64[D]')
+
+    return OHLCPanel.from_arrays(items())
@@ -0,0 +1,318 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+from datastore import atomic_write
+from downloader import yfinance_fetcher
+from instrumentation import register_stats
+
+#-------------------------------------------------------------------------------
+# Read-through cache of price history
+#
+# Two tiers, both keyed by (symbol, interval, start, end):
+#   memory - LRU of DataFrames, evicted by total size in bytes
+#   disk   - one pickle per entry in data/cache/prices, evicted by total size,
+#            least recently used first (a hit refreshes the file's mtime)
+#
+# The disk entries are indexed in memory, the directory is listed once when the
+# cache is opened. Entries other processes write later are not seen (a miss,
+# then this process writes its own), ones they remove fail to read and are
+# dropped from the index.
+#
+# A request for a date range inside a cached range is served by slicing the
+# cached entry. Entries covering today can still change, they expire after
+# intraday_ttl; entries of closed days only after closed_ttl.
+#-------------------------------------------------------------------------------
+cache_directory = 'data/cache/prices'
+
+#-------------------------------------------------------------------------------
+# Day boundaries of a request, the end is exclusive like in yfinance
+#-------------------------------------------------------------------------------
+def day_range(start, end):
+    start = pd.Timestamp(start).normalize()
+    end = pd.Timestamp(end)
+
+    # A time of day on the end means 'up to now', so the whole day is included
+    end = end.normalize() if end == end.normalize() else end.normalize() + pd.Timedelta(days=1)
+
+    return start, end
+
+class PriceCache:
+    """
+    Args:
+        directory (str): Disk tier location, None for a memory-only cache.
+        memory_bytes (int): Size limit of the memory tier.
+        disk_bytes (int): Size limit of the disk tier.
+        intraday_ttl (float): Seconds an entry covering today stays fresh.
+        closed_ttl (float): Seconds an entry of closed days stays fresh.
+        fetcher (Callable): fetcher(symbol, start, end, interval) -> DataFrame.
+    """
+    def __init__(self, directory=cache_directory, memory_bytes=64 * 2**20, disk_bytes=512 * 2**20,
+                 intraday_ttl=15 * 60, closed_ttl=7 * 24 * 60 * 60, fetcher=yfinance_fetcher,
+                 clock=time.time):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.intraday_ttl = intraday_ttl
+        self.closed_ttl = closed_ttl
+        self.fetcher = fetcher
+        self.clock = clock
+
+        # key -> (fetched_at, DataFrame, size in bytes)
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.lock = threading.Lock()
+
+        # Disk tier index: (symbol, interval) -> set of keys, and key -> size in
+        # bytes, least recently used first
+        self.disk_index = {}
+        self.disk = OrderedDict()
+        self.disk_used = 0
+
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        if (directory is not None):
+            os.makedirs(directory, exist_ok=True)
+            self.load_disk_index()
+
+    #---------------------------------------------------------------------------
+    # Get price history, from the cache if fresh, else from the fetcher
+    #---------------------------------------------------------------------------
+    def get(self, symbol, start, end, interval='1d'):
+        """
+        Returns:
+            DataFrame: Bars of symbol with start <= date < end.
+        """
+        start, end = day_range(start, end)
+
+        data = self.get_memory(symbol, interval, start, end)
+        if (data is not None):
+            self.count('memory_hits')
+            return self.slice(data, start, end)
+
+        data = self.get_disk(symbol, interval, start, end)
+        if (data is not None):
+            self.count('disk_hits')
+            return self.slice(data, start, end)
+
+        self.count('misses')
+        data = self.fetcher(symbol, start, end, interval)
+
+        key = (symbol, interval, start, end)
+        fetched_at = self.clock()
+        self.put_memory(key, fetched_at, data)
+        self.put_disk(key, fetched_at, data)
+
+        # Always hand out a copy, callers add columns to what they get
+        return self.slice(data, start, end)
+
+    #---------------------------------------------------------------------------
+    # Cached price history however old, for when the fetcher is too slow or down
+    #---------------------------------------------------------------------------
+    def get_stale(self, symbol, start, end, interval='1d'):
+        """
+        Returns:
+            DataFrame: Bars of symbol with start <= date < end, None if no
+            cached entry covers the range.
+        """
+        start, end = day_range(start, end)
+
+        data = self.get_memory(symbol, interval, start, end, fresh_only=False)
+        if (data is None):
+            data = self.get_disk(symbol, interval, start, end, fresh_only=False)
+
+        return None if data is None else self.slice(data, start, end)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def slice(self, data, start, end):
+        return data[(data.index >= start) & (data.index < end)]
+
+    #---------------------------------------------------------------------------
+    # Freshness: a range reaching today may still get new or revised bars
+    #---------------------------------------------------------------------------
+    def is_fresh(self, key, fetched_at):
+        today = pd.Timestamp.fromtimestamp(self.clock()).normalize()
+        ttl = self.intraday_ttl if key[3] > today else self.closed_ttl
+        return self.clock() - fetched_at < ttl
+
+    def covers(self, key, symbol, interval, start, end):
+        return key[0] == symbol and key[1] == interval and key[2] <= start and end <= key[3]
+
+    #---------------------------------------------------------------------------
+    # Memory tier
+    #---------------------------------------------------------------------------
+    def get_memory(self, symbol, interval, start, end, fresh_only=True):
+        with self.lock:
+            for key, (fetched_at, data, size) in reversed(self.memory.items()):
+                if (self.covers(key, symbol, interval, start, end)
+                        and (not fresh_only or self.is_fresh(key, fetched_at))):
+                    self.memory.move_to_end(key)
+                    return data
+
+        return None
+
+    def put_memory(self, key, fetched_at, data):
+        size = int(data.memory_usage(deep=True).sum())
+        if (size > self.memory_bytes):
+            return
+
+        with self.lock:
+            if (key in self.memory):
+                self.memory_used -= self.memory.pop(key)[2]
+
+            self.memory[key] = (fetched_at, data, size)
+            self.memory_used += size
+
+            # Drop the least recently used entries
+            while self.memory_used > self.memory_bytes:
+                _, (_, _, evicted_size) = self.memory.popitem(last=False)
+                self.memory_used -= evicted_size
+                self.stats['evictions'] += 1
+
+    #---------------------------------------------------------------------------
+    # Disk tier, file names: <symbol>_<interval>_<start>_<end>.pkl
+    #---------------------------------------------------------------------------
+    def disk_path(self, key):
+        symbol, interval, start, end = key
+        return os.path.join(self.directory, '{}_{}_{}_{}.pkl'.format(
+            symbol, interval, start.strftime('%Y%m%d'), end.strftime('%Y%m%d')))
+
+    def load_disk_index(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if (not name.endswith('.pkl')):
+                continue
+
+            # Symbols like BRK_B contain '_' too, the interval and dates are the
+            # last three parts
+            parts = name[:-len('.pkl')].rsplit('_', 3)
+            if (len(parts) != 4):
+                continue
+
+            try:
+                key = (parts[0], parts[1], pd.Timestamp(parts[2]), pd.Timestamp(parts[3]))
+                stat = os.stat(os.path.join(self.directory, name))
+            except (OSError, ValueError):
+                continue
+            files.append((stat.st_mtime, key, stat.st_size))
+
+        # Oldest access first
+        with self.lock:
+            for _, key, size in sorted(files):
+                self.add_disk_entry(key, size)
+
+    def add_disk_entry(self, key, size):
+        # Called with self.lock held
+        self.disk_index.setdefault(key[:2], set()).add(key)
+        if (key in self.disk):
+            self.disk_used -= self.disk.pop(key)
+        self.disk[key] = size
+        self.disk_used += size
+
+    def remove_disk_entry(self, key):
+        # Called with self.lock held
+        keys = self.disk_index.get(key[:2])
+        if (keys is not None):
+            keys.discard(key)
+            if (not keys):
+                del self.disk_index[key[:2]]
+        self.disk_used -= self.disk.pop(key, 0)
+
+    def get_disk(self, symbol, interval, start, end, fresh_only=True):
+        if (self.directory is None):
+            return None
+
+        with self.lock:
+            keys = [key for key in self.disk_index.get((symbol, interval), ())
+                    if self.covers(key, symbol, interval, start, end)]
+
+        for key in keys:
+            path = self.disk_path(key)
+            try:
+                entry = pd.read_pickle(path)
+            except (OSError, ValueError, EOFError):
+                # Removed by another process, or unreadable
+                with self.lock:
+                    self.remove_disk_entry(key)
+                continue
+
+            fetched_at, data = entry['fetched_at'], entry['data']
+            if (fresh_only and not self.is_fresh(key, fetched_at)):
+                continue
+
+            # Mark as recently used and promote to the memory tier
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            with self.lock:
+                if (key in self.disk):
+                    self.disk.move_to_end(key)
+            self.put_memory(key, fetched_at, data)
+            return data
+
+        return None
+
+    def put_disk(self, key, fetched_at, data):
+        if (self.directory is None):
+            return
+
+        # Other processes share the directory, a failed write only loses the
+        # disk copy, the data is in the memory tier
+        path = self.disk_path(key)
+        try:
+            atomic_write(path, lambda tmp_path: pd.to_pickle(
+                {'fetched_at': fetched_at, 'data': data}, tmp_path))
+            size = os.path.getsize(path)
+        except OSError:
+            return
+
+        with self.lock:
+            self.add_disk_entry(key, size)
+        self.evict_disk()
+
+    def evict_disk(self):
+        # Least recently used first
+        while True:
+            with self.lock:
+                if (self.disk_used <= self.disk_bytes or not self.disk):
+                    return
+                key = next(iter(self.disk))
+                self.remove_disk_entry(key)
+                self.stats['evictions'] += 1
+
+            try:
+                os.remove(self.disk_path(key))
+            except OSError:
+                pass
+
+#-------------------------------------------------------------------------------
+# Fetcher for downloader.bulk_download / datastore.refresh_store reading
+# through a cache
+#-------------------------------------------------------------------------------
+def cached_fetcher(cache, interval='1d'):
+    def fetcher(symbol, start, end):
+        return cache.get(symbol, start, end, interval)
+
+    fetcher.host = getattr(cache.fetcher, 'host', 'default')
+    return fetcher
+
+#-------------------------------------------------------------------------------
+# The cache shared by all pages of this process
+#-------------------------------------------------------------------------------
+shared_cache = None
+shared_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    global shared_cache
+
+    with shared_cache_lock:
+        if (shared_cache is None):
+            shared_cache = PriceCache()
+            register_stats('price_cache', shared_cache.stats)
+
+    return shared_cache
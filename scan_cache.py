@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from datastore import atomic_write
+from instrumentation import register_stats
+
+#-------------------------------------------------------------------------------
+# Disk cache of scan results, shared by every process using the directory
+#
+# An entry is keyed by a hash of the patterns, the symbols and the version of
+# their data: size and mtime of every symbol's csv file. A refresh rewrites
+# the files it changes, so exactly the entries scanning those symbols stop
+# matching, and an app restart or a new replica finds everything else. Old
+# entries are evicted least recently used first (a hit refreshes the file's
+# mtime) once the directory grows over max_bytes.
+#-------------------------------------------------------------------------------
+cache_directory = 'data/cache/scans'
+
+#-------------------------------------------------------------------------------
+# Version of the data of the symbols in a csv store
+#-------------------------------------------------------------------------------
+def data_version(data_directory, symbol_list):
+    digest = hashlib.sha256()
+
+    for symbol in symbol_list:
+        try:
+            stat = os.stat(os.path.join(data_directory, symbol + '.csv'))
+            digest.update(f'{symbol}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+        except OSError:
+            digest.update(f'{symbol}:missing\n'.encode())
+
+    return digest.hexdigest()
+
+#-------------------------------------------------------------------------------
+# Cache key of a scan
+#-------------------------------------------------------------------------------
+def scan_cache_key(data_directory, symbol_list, patterns, mode='last'):
+    """
+    Args:
+        mode (str): Kind of scan, e.g. 'last' for the last bar scan.
+    """
+    digest = hashlib.sha256()
+    digest.update(mode.encode())
+    digest.update(('\n'.join(patterns) + '\n').encode())
+    digest.update(('\n'.join(symbol_list) + '\n').encode())
+    digest.update(data_version(data_directory, symbol_list).encode())
+
+    return digest.hexdigest()
+
+class ScanCache:
+    """
+    Args:
+        directory (str): Where the entries are kept.
+        max_bytes (int): Size limit of all the entries.
+    """
+    def __init__(self, directory=cache_directory, max_bytes=64 * 2**20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'write_errors': 0}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    #---------------------------------------------------------------------------
+    # Matches of a scan, None if it isn't cached
+    #---------------------------------------------------------------------------
+    def get(self, key):
+        path = self.path(key)
+
+        try:
+            with open(path, 'r') as f:
+                matches = [tuple(match) for match in json.load(f)['matches']]
+        except (OSError, ValueError, KeyError):
+            self.count('misses')
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.count('hits')
+        return matches
+
+    def put(self, key, matches):
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump({'matches': [list(match) for match in matches]}, f)
+
+        # The directory is shared with other processes, a failed write only
+        # loses the cache entry, never the scan that produced it
+        try:
+            atomic_write(self.path(key), write)
+        except OSError:
+            self.count('write_errors')
+            return
+
+        self.evict()
+
+    def evict(self):
+        files = []
+        for name in os.listdir(self.directory):
+            if (name.endswith('.json')):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        used = sum(size for _, size, _ in files)
+
+        # Oldest access first
+        for _, size, path in sorted(files):
+            if (used <= self.max_bytes):
+                break
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+            used -= size
+            self.count('evictions')
+
+#-------------------------------------------------------------------------------
+# The cache shared by all sessions of this process
+#-------------------------------------------------------------------------------
+shared_cache = None
+shared_cache_lock = threading.Lock()
+
+def get_shared_scan_cache():
+    global shared_cache
+
+    with shared_cache_lock:
+        if (shared_cache is None):
+            shared_cache = ScanCache()
+            register_stats('scan_cache', shared_cache.stats)
+
+    return shared_cache
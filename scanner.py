@@ -0,0 +1,442 @@
+import os
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import talib
+from candlestick_patterns import candlesticks
+from datastore import open_store, memmap_index_file, load_timeframe, ohlc_columns
+from instrumentation import count
+
+#-------------------------------------------------------------------------------
+# Scan engine for candlestick patterns
+#
+# Each symbol is loaded from the store once, the OHLC columns are kept as
+# float64 arrays and all the TA-Lib pattern functions run on those arrays.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# Stores opened by this process. The pools of run_chunks live as long as the
+# process, so a worker opens each store once and reuses it in later scans.
+#
+# Only the latest version of each (directory, backend) is kept: a refresh
+# replaces the old panel or mapping, which is freed once no scan uses it.
+#-------------------------------------------------------------------------------
+# (data_directory, backend) -> (version, store)
+opened_stores = {}
+opened_stores_lock = threading.Lock()
+
+def get_store(data_directory, backend='csv'):
+    # A rebuilt memmap store gets a new index file, its mtime keeps a stale
+    # mapping from being reused. Refreshed csv files are renamed into the
+    # directory, which changes its mtime, so a panel of old data isn't reused.
+    version = None
+    if (backend == 'memmap'):
+        version = os.stat(os.path.join(data_directory, memmap_index_file)).st_mtime_ns
+    elif (backend == 'panel'):
+        version = os.stat(data_directory).st_mtime_ns
+
+    key = (data_directory, backend)
+    with opened_stores_lock:
+        entry = opened_stores.get(key)
+        if (entry is not None and entry[0] == version):
+            return entry[1]
+
+    # Opened outside the lock, a panel takes a while to load
+    store = open_store(data_directory, backend)
+    with opened_stores_lock:
+        opened_stores[key] = (version, store)
+
+    return store
+
+#-------------------------------------------------------------------------------
+# Load the Open/High/Low/Close arrays of a symbol
+#-------------------------------------------------------------------------------
+def load_symbol_ohlc(data_directory, symbol, backend='csv', timeframe='1d'):
+    """
+    Args:
+        data_directory (str): Directory of the symbol store.
+        symbol (str): The ticker symbol.
+        backend (str): Storage backend, 'csv', 'memmap' or 'panel'.
+        timeframe (str): Bars to load, e.g. '1wk' or '1h'. Anything but daily
+            bars is resampled from the csv files (see datastore.load_timeframe).
+
+    Returns:
+        Tuple[np.ndarray, ...]: Open, High, Low and Close as float64 arrays,
+        or None if the symbol is missing or can't be read.
+    """
+    if (timeframe == '1d'):
+        return get_store(data_directory, backend).load_ohlc(symbol)
+
+    data = load_timeframe(data_directory, symbol, timeframe)
+    if (data is None):
+        return None
+
+    # TA-Lib wants contiguous float64 arrays
+    return tuple(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)) for column in ohlc_columns)
+
+#-------------------------------------------------------------------------------
+# Run all the patterns on one symbol, return the patterns bullish on the last bar
+#-------------------------------------------------------------------------------
+def scan_symbol(ohlc, patterns):
+    """
+    Args:
+        ohlc (Tuple[np.ndarray, ...]): Open, High, Low and Close arrays.
+        patterns (Iterable[str]): TA-Lib function names, e.g. 'CDLENGULFING'.
+
+    Returns:
+        List[str]: The patterns whose last value is 100 (bullish).
+    """
+    matches = []
+
+    # Nothing to look at
+    if (len(ohlc[3]) == 0):
+        return matches
+
+    for pattern in patterns:
+        talib_function = getattr(talib, pattern)
+
+        # Ignore any errors in the data such as 'NaN'
+        try:
+            ret = talib_function(*ohlc)
+        except Exception:
+            count('pattern_errors')
+            continue
+
+        # talib returns 100 for bullish, -100 for bearish, only concerned about bullish
+        if (ret[-1] == 100):
+            matches.append(pattern)
+
+    return matches
+
+#-------------------------------------------------------------------------------
+# Scan a chunk of symbols, runs inside a pool worker so it must stay top level
+#-------------------------------------------------------------------------------
+def scan_chunk(data_directory, symbol_chunk, patterns, backend='csv', timeframe='1d'):
+    """
+    Returns:
+        List[List[str]]: For each symbol in symbol_chunk, the matching patterns.
+    """
+    chunk_matches = []
+
+    for symbol in symbol_chunk:
+        ohlc = load_symbol_ohlc(data_directory, symbol, backend, timeframe)
+        chunk_matches.append(scan_symbol(ohlc, patterns) if ohlc is not None else [])
+
+    return chunk_matches
+
+#-------------------------------------------------------------------------------
+# Split the symbol list into chunks of (nearly) equal size
+#-------------------------------------------------------------------------------
+def split_into_chunks(symbol_list, chunk_size):
+    return [symbol_list[i:i + chunk_size] for i in range(0, len(symbol_list), chunk_size)]
+
+#-------------------------------------------------------------------------------
+# Pools shared by all the scans of this process, one per executor and size
+#
+# A pool per scan would start new workers every time, which load the panel or
+# map the memmap files again. A broken pool (a worker died) is dropped, the
+# next scan starts a new one.
+#-------------------------------------------------------------------------------
+# (executor, workers) -> pool
+shared_pools = {}
+shared_pools_lock = threading.Lock()
+
+def get_shared_pool(executor, workers):
+    if (executor == 'process'):
+        pool_class = ProcessPoolExecutor
+    elif (executor == 'thread'):
+        pool_class = ThreadPoolExecutor
+    else:
+        raise ValueError(f"Unknown executor '{executor}', expected 'process' or 'thread'")
+
+    with shared_pools_lock:
+        pool = shared_pools.get((executor, workers))
+        if (pool is None):
+            pool = pool_class(max_workers=workers)
+            shared_pools[(executor, workers)] = pool
+
+    return pool
+
+def drop_shared_pool(executor, workers, pool):
+    with shared_pools_lock:
+        if (shared_pools.get((executor, workers)) is pool):
+            del shared_pools[(executor, workers)]
+
+    pool.shutdown(wait=False, cancel_futures=True)
+
+#-------------------------------------------------------------------------------
+# Run a chunk function over all the symbols
+#
+# With workers > 1 the symbols are split into chunks and the chunks run on a
+# process pool (or a thread pool, TA-Lib releases the GIL in its C calls),
+# shared with the other scans of the process (see get_shared_pool).
+# Chunk results are kept by chunk position, so the output is the same as the
+# serial run no matter in which order the chunks finish.
+#-------------------------------------------------------------------------------
+def run_chunks(chunk_function, data_directory, symbol_list, args, progress=None,
+               workers=1, executor='process', chunk_size=None):
+    """
+    Args:
+        chunk_function (Callable): chunk_function(data_directory, symbol_chunk, *args),
+            top level so it can run in a process pool.
+
+    Returns:
+        Tuple[List[List[str]], List]: The chunks and the result of each chunk.
+    """
+    total_entries = len(symbol_list)
+
+    if (chunk_size is None):
+        chunk_size = 1 if workers <= 1 else max(1, -(-total_entries // (workers * 4)))
+
+    chunks = split_into_chunks(symbol_list, chunk_size)
+    chunk_results = [None] * len(chunks)
+    done_entries = 0
+
+    if (workers <= 1 or len(chunks) <= 1):
+        for i, symbol_chunk in enumerate(chunks):
+            chunk_results[i] = chunk_function(data_directory, symbol_chunk, *args)
+
+            done_entries += len(symbol_chunk)
+            if (progress is not None):
+                progress(done_entries / total_entries)
+    else:
+        pool = get_shared_pool(executor, workers)
+        futures = {}
+
+        try:
+            for i, symbol_chunk in enumerate(chunks):
+                futures[pool.submit(chunk_function, data_directory, symbol_chunk, *args)] = i
+
+            # Progress is reported from the calling thread as chunks finish
+            for future in as_completed(futures):
+                i = futures[future]
+                chunk_results[i] = future.result()
+
+                done_entries += len(chunks[i])
+                if (progress is not None):
+                    progress(done_entries / total_entries)
+        except BrokenExecutor:
+            drop_shared_pool(executor, workers, pool)
+            raise
+        finally:
+            # The pool outlives the scan, don't leave chunks of a failed scan queued
+            for future in futures:
+                future.cancel()
+
+    return chunks, chunk_results
+
+#-------------------------------------------------------------------------------
+# Scan all the symbols for all the patterns, loading each symbol only once
+#-------------------------------------------------------------------------------
+def scan_symbols(data_directory, symbol_list, patterns=None, progress=None,
+                 workers=1, executor='process', chunk_size=None, backend='csv', timeframe='1d'):
+    """
+    Args:
+        data_directory (str): Directory of the symbol store.
+        symbol_list (List[str]): Symbols to scan.
+        patterns (List[str]): TA-Lib function names, defaults to all candlesticks.
+        progress (Callable[[float], None]): Called with the fraction completed.
+        workers (int): Number of pool workers, 1 (or less) scans serially.
+        executor (str): 'process' or 'thread'. Timeframes resampled from the
+            csv files always scan on threads (see below).
+        backend (str): Storage backend, 'csv', 'memmap' or 'panel'.
+        chunk_size (int): Symbols per chunk, defaults to about 4 chunks per worker.
+            A serial scan uses chunks of one symbol for a smooth progress bar.
+        timeframe (str): Bars the patterns run on, e.g. '1d', '1wk' or '1h'.
+
+    Returns:
+        List[Tuple[str, str]]: (pattern, symbol) matches ordered by pattern and
+        then by the position of the symbol in symbol_list.
+    """
+    if (patterns is None):
+        patterns = list(candlesticks.keys())
+
+    # Resampled bars are cached per process (see timeframes.ResampleCache). In
+    # pool processes each worker would resample its own share again on every
+    # scan; on threads all the scans and the pages share this process's cache.
+    if (timeframe != '1d' and executor == 'process'):
+        executor = 'thread'
+
+    chunks, chunk_results = run_chunks(scan_chunk, data_directory, list(symbol_list), (patterns, backend, timeframe),
+                                       progress, workers, executor, chunk_size)
+
+    # Matches collected per pattern so the result keeps the pattern-major order
+    matches_by_pattern = {pattern: [] for pattern in patterns}
+
+    for symbol_chunk, chunk_matches in zip(chunks, chunk_results):
+        for symbol, symbol_matches in zip(symbol_chunk, chunk_matches):
+            for pattern in symbol_matches:
+                matches_by_pattern[pattern].append(symbol)
+
+    return [(pattern, symbol) for pattern in patterns for symbol in matches_by_pattern[pattern]]
+
+#-------------------------------------------------------------------------------
+# Full history scan: every bullish and bearish occurrence of every pattern
+#
+# All the patterns of a symbol are stacked into one (patterns x bars) array,
+# a single np.nonzero over its lookback window gives all the occurrences.
+# Each occurrence becomes a compact record (symbol and pattern as positions
+# into the lists that were scanned) with the close-to-close return over the
+# following bars, so the patterns can be backtested across a universe in one
+# pass.
+#-------------------------------------------------------------------------------
+default_horizons = (1, 5, 10)
+
+def history_dtype(horizons=default_horizons):
+    return np.dtype([('symbol', np.int32), ('pattern', np.int16), ('date', 'datetime64[D]'),
+                     ('signal', np.int8)] + [(f'return_{h}', np.float64) for h in horizons])
+
+#-------------------------------------------------------------------------------
+# Occurrences of the patterns in the last `lookback` bars of one symbol
+#-------------------------------------------------------------------------------
+def scan_symbol_history(ohlc, dates, patterns, lookback=None, horizons=default_horizons):
+    """
+    Args:
+        ohlc (Tuple[np.ndarray, ...]): Open, High, Low and Close arrays.
+        dates (np.ndarray): datetime64[D] date of every bar.
+        patterns (List[str]): TA-Lib function names.
+        lookback (int): Number of most recent bars to report, None for all.
+        horizons (Tuple[int, ...]): Bars ahead of each forward return.
+
+    Returns:
+        np.ndarray: Records of history_dtype(horizons), symbol left at 0, in
+        bar order and then pattern order.
+    """
+    bars = len(ohlc[3])
+    records = np.empty(0, dtype=history_dtype(horizons))
+    if (bars == 0):
+        return records
+
+    signals = np.zeros((len(patterns), bars), dtype=np.int8)
+    for i, pattern in enumerate(patterns):
+        # Ignore any errors in the data such as 'NaN'
+        try:
+            signals[i] = np.sign(getattr(talib, pattern)(*ohlc))
+        except Exception:
+            continue
+
+    first = 0 if lookback is None else max(0, bars - lookback)
+
+    # Transposed so the occurrences come out in date order
+    bar_index, pattern_index = np.nonzero(signals[:, first:].T)
+    bar_index += first
+
+    records = np.zeros(len(bar_index), dtype=records.dtype)
+    records['pattern'] = pattern_index
+    records['date'] = dates[bar_index]
+    records['signal'] = signals[pattern_index, bar_index] * 100
+
+    close = ohlc[3]
+    for h in horizons:
+        ahead = bar_index + h
+        returns = np.full(len(bar_index), np.nan)
+        inside = ahead < bars
+        returns[inside] = close[ahead[inside]] / close[bar_index[inside]] - 1
+        records[f'return_{h}'] = returns
+
+    return records
+
+#-------------------------------------------------------------------------------
+# History scan of a chunk of symbols, runs inside a pool worker
+#-------------------------------------------------------------------------------
+def history_chunk(data_directory, symbol_chunk, patterns, lookback, horizons, backend='csv'):
+    store = get_store(data_directory, backend)
+    chunk_records = []
+
+    for symbol in symbol_chunk:
+        ohlc = store.load_ohlc(symbol)
+        dates = store.load_dates(symbol) if ohlc is not None else None
+
+        if (ohlc is None or dates is None or len(dates) != len(ohlc[3])):
+            chunk_records.append(np.empty(0, dtype=history_dtype(horizons)))
+        else:
+            chunk_records.append(scan_symbol_history(ohlc, dates, patterns, lookback, horizons))
+
+    return chunk_records
+
+#-------------------------------------------------------------------------------
+# Every occurrence of the patterns over the last `lookback` bars of all symbols
+#-------------------------------------------------------------------------------
+def scan_history(data_directory, symbol_list, patterns=None, lookback=250, horizons=default_horizons,
+                 progress=None, workers=1, executor='process', chunk_size=None, backend='csv'):
+    """
+    Args:
+        lookback (int): Most recent bars of every symbol to report, None for all.
+        horizons (Tuple[int, ...]): Bars ahead of each forward return.
+        Others as in scan_symbols.
+
+    Returns:
+        np.ndarray: Records of history_dtype(horizons): 'symbol' and 'pattern'
+        are positions in symbol_list and patterns, 'signal' is 100 (bullish)
+        or -100 (bearish), 'return_<h>' the close-to-close return h bars
+        later (NaN when those bars don't exist yet). Ordered by symbol, date
+        and pattern.
+    """
+    if (patterns is None):
+        patterns = list(candlesticks.keys())
+
+    symbol_list = list(symbol_list)
+    chunks, chunk_results = run_chunks(history_chunk, data_directory, symbol_list,
+                                       (patterns, lookback, tuple(horizons), backend),
+                                       progress, workers, executor, chunk_size)
+
+    all_records = []
+    position = 0
+    for symbol_chunk, chunk_records in zip(chunks, chunk_results):
+        for records in chunk_records:
+            records['symbol'] = position
+            all_records.append(records)
+            position += 1
+
+    if (not all_records):
+        return np.empty(0, dtype=history_dtype(horizons))
+
+    return np.concatenate(all_records)
+
+#-------------------------------------------------------------------------------
+# Hit counts and forward return statistics per pattern and direction
+#-------------------------------------------------------------------------------
+def pattern_statistics(records, patterns=None):
+    """
+    Args:
+        records (np.ndarray): Result of scan_history.
+        patterns (List[str]): The patterns passed to scan_history.
+
+    Returns:
+        pd.DataFrame: One row per pattern and signal with 'hits' and, per
+        horizon, the mean return ('mean_<h>') and the share of occurrences
+        moving in the signalled direction ('win_rate_<h>'), most hits first.
+    """
+    if (patterns is None):
+        patterns = list(candlesticks.keys())
+
+    horizons = [name[len('return_'):] for name in records.dtype.names if name.startswith('return_')]
+
+    # One group per (pattern, signal): sort once, then reduce over the group boundaries
+    keys = records['pattern'].astype(np.int64) * 2 + (records['signal'] > 0)
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    group_keys, starts, hits = np.unique(keys, return_index=True, return_counts=True)
+
+    stats = {
+        'pattern': [patterns[key // 2] for key in group_keys],
+        'signal': np.where(group_keys % 2 == 1, 100, -100),
+        'hits': hits,
+    }
+
+    direction = np.sign(records['signal'][order]).astype(np.float64)
+    for h in horizons:
+        returns = records[f'return_{h}'][order]
+        valid = ~np.isnan(returns)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        sums = np.add.reduceat(np.where(valid, returns, 0.0), starts)
+        wins = np.add.reduceat((valid & (returns * direction > 0)).astype(np.int64), starts)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stats[f'mean_{h}'] = sums / counts
+            stats[f'win_rate_{h}'] = wins / counts
+
+    table = pd.DataFrame(stats)
+    table.insert(1, 'name', table['pattern'].map(candlesticks))
+    return table.sort_values(['hits', 'pattern'], ascending=[False, True], ignore_index=True)
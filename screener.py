@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+#-------------------------------------------------------------------------------
+# Typed screener table over nasdaq_screener.csv
+#
+# The csv keeps prices and changes as text ('$123.38', '0.244%'). Here they are
+# parsed once into float arrays, Sector/Industry/Country become categorical
+# codes and every numeric column gets a precomputed sort order, so a facet
+# filter is a few NumPy comparisons and 'top N by X' walks an existing order.
+#-------------------------------------------------------------------------------
+screener_file = 'nasdaq_screener.csv'
+
+numeric_columns = ['Last Sale', 'Net Change', '% Change', 'Market Cap', 'IPO Year', 'Volume']
+categorical_columns = ['Sector', 'Industry', 'Country']
+
+#-------------------------------------------------------------------------------
+# Parse '$123.38' / '0.244%' / '1,234' strings into floats, NaN if empty
+#-------------------------------------------------------------------------------
+def parse_number(series):
+    if (series.dtype.kind in 'if'):
+        return series.to_numpy(dtype=np.float64)
+
+    cleaned = series.astype(str).str.replace(r'[$%,]', '', regex=True).str.strip()
+    return pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype=np.float64)
+
+#-------------------------------------------------------------------------------
+# Screener symbol as Yahoo Finance spells it: 'BRK/A' -> 'BRK-A'
+#-------------------------------------------------------------------------------
+def yahoo_symbol(symbol):
+    return symbol.replace('/', '-')
+
+class ScreenerTable:
+    """
+    Args:
+        df (pd.DataFrame): The screener csv as read by pd.read_csv.
+    """
+    def __init__(self, df):
+        # keep_default_na=False in load_screener keeps 'NA' (Nathan's) a symbol
+        self.symbols = df['Symbol'].astype(str).str.strip().to_numpy()
+        self.names = df['Name'].astype(str).str.strip().to_numpy()
+
+        self.numbers = {column: parse_number(df[column]) for column in numeric_columns}
+
+        self.categories = {}
+        self.codes = {}
+        for column in categorical_columns:
+            values = df[column].replace('', np.nan)
+            categorical = pd.Categorical(values)
+            self.categories[column] = list(categorical.categories)
+            self.codes[column] = categorical.codes
+
+        # Row order of every numeric column, largest first, NaN last
+        self.orders = {}
+        for column, values in self.numbers.items():
+            order = np.argsort(-np.nan_to_num(values, nan=-np.inf), kind='stable')
+            self.orders[column] = order
+
+    def __len__(self):
+        return len(self.symbols)
+
+    #---------------------------------------------------------------------------
+    # Rows matching all the facets
+    #---------------------------------------------------------------------------
+    def mask(self, sector=None, industry=None, country=None, ranges=None):
+        """
+        Args:
+            sector, industry, country (str or List[str]): Allowed values.
+            ranges (Dict[str, Tuple[float, float]]): Numeric column -> (minimum,
+                maximum), either bound can be None.
+
+        Returns:
+            np.ndarray: Boolean mask of the matching rows.
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        for column, allowed in zip(categorical_columns, (sector, industry, country)):
+            if (allowed is None):
+                continue
+            if (isinstance(allowed, str)):
+                allowed = [allowed]
+
+            codes = [self.categories[column].index(value) for value in allowed
+                     if value in self.categories[column]]
+            mask &= np.isin(self.codes[column], codes)
+
+        for column, (minimum, maximum) in (ranges or {}).items():
+            values = self.numbers[column]
+            if (minimum is not None):
+                mask &= values >= minimum
+            if (maximum is not None):
+                mask &= values <= maximum
+
+        return mask
+
+    #---------------------------------------------------------------------------
+    # Symbols matching the facets, optionally the top N by a numeric column
+    #---------------------------------------------------------------------------
+    def select(self, sector=None, industry=None, country=None, ranges=None,
+               top=None, by='Market Cap', ascending=False):
+        """
+        Example:
+            table.select(sector='Technology', ranges={'Market Cap': (1e10, None)},
+                         top=20, by='Volume')
+
+        Returns:
+            List[str]: Matching symbols, ordered by the `by` column.
+        """
+        mask = self.mask(sector, industry, country, ranges)
+        order = self.orders[by]
+
+        if (ascending):
+            # Reverse the order but keep NaN last
+            valid = ~np.isnan(self.numbers[by][order])
+            order = np.concatenate([order[valid][::-1], order[~valid]])
+
+        rows = order[mask[order]]
+        if (top is not None):
+            rows = rows[:top]
+
+        return self.symbols[rows].tolist()
+
+    def options(self, column):
+        return self.categories[column]
+
+#-------------------------------------------------------------------------------
+# Read the screener csv
+#-------------------------------------------------------------------------------
+def load_screener(path=screener_file):
+    return ScreenerTable(pd.read_csv(path, keep_default_na=False))
@@ -0,0 +1,158 @@
+import heapq
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+#-------------------------------------------------------------------------------
+# In-memory search index over company names and ticker symbols
+#
+# Built once per process from the screener DataFrame:
+#   symbols  - upper case symbol -> row, for exact symbol matches
+#   prefixes - sorted (word, row) pairs of symbols and name words, a prefix
+#              lookup is a bisect into this list
+#   trigrams - trigram -> rows whose name contains it (inverted index), used
+#              to find substring candidates and for fuzzy matching, plus the
+#              trigram set of every name to score fuzzy candidates
+#
+# Results are ranked: exact symbol, symbol prefix, name word prefix, name
+# substring and finally fuzzy (trigram similarity) matches.
+#-------------------------------------------------------------------------------
+score_exact_symbol = 100
+score_symbol_prefix = 80
+score_word_prefix = 60
+score_substring = 40
+score_fuzzy = 20
+
+# Share of the query trigrams a name must contain to be a fuzzy match
+fuzzy_threshold = 0.5
+
+# Trigrams in more than this share of the names are ignored by fuzzy matching
+common_trigram_share = 0.1
+
+word_pattern = re.compile(r'[a-z0-9]+')
+
+def trigrams(text):
+    text = f'  {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TickerIndex:
+    """
+    Args:
+        df (pd.DataFrame): Company data with 'Name' and 'Symbol' columns.
+    """
+    def __init__(self, df):
+        self.names = df['Name'].fillna('').astype(str).tolist()
+        self.symbols = df['Symbol'].fillna('').astype(str).tolist()
+        self.lower_names = [name.lower() for name in self.names]
+
+        self.symbol_rows = {}
+        prefixes = []
+        self.trigram_rows = defaultdict(set)
+        self.row_trigrams = [trigrams(name) for name in self.lower_names]
+
+        for row, (symbol, name) in enumerate(zip(self.symbols, self.lower_names)):
+            self.symbol_rows.setdefault(symbol.upper(), row)
+            prefixes.append((symbol.lower(), row, True))
+
+            for word in set(word_pattern.findall(name)):
+                prefixes.append((word, row, False))
+
+            for gram in self.row_trigrams[row]:
+                self.trigram_rows[gram].add(row)
+
+        prefixes.sort()
+        self.prefix_words = [word for word, _, _ in prefixes]
+        self.prefix_entries = [(row, is_symbol) for _, row, is_symbol in prefixes]
+
+    #---------------------------------------------------------------------------
+    # Rows of all symbols / name words starting with the prefix
+    #---------------------------------------------------------------------------
+    def prefix_lookup(self, prefix):
+        i = bisect_left(self.prefix_words, prefix)
+        while i < len(self.prefix_words) and self.prefix_words[i].startswith(prefix):
+            yield self.prefix_entries[i]
+            i += 1
+
+    #---------------------------------------------------------------------------
+    # Search, best matches first
+    #---------------------------------------------------------------------------
+    def search(self, query, limit=None, fuzzy=True):
+        """
+        Args:
+            query (str): Company name or ticker symbol, or a part of it.
+            limit (int): Maximum number of results, None for all.
+            fuzzy (bool): Also return names similar to the query.
+
+        Returns:
+            List[int]: Row numbers of the matching companies, best first.
+        """
+        query = query.strip().lower()
+        if (not query):
+            return []
+
+        scores = {}
+
+        def add(row, score):
+            if (score > scores.get(row, 0)):
+                scores[row] = score
+
+        # Exact symbol
+        row = self.symbol_rows.get(query.upper())
+        if (row is not None):
+            add(row, score_exact_symbol)
+
+        # Symbol and name word prefixes, every word of the query must match
+        words = word_pattern.findall(query)
+        word_matches = None
+        for word in words:
+            rows = set()
+            for row, is_symbol in self.prefix_lookup(word):
+                if (is_symbol and len(words) == 1):
+                    add(row, score_symbol_prefix)
+                elif (not is_symbol):
+                    rows.add(row)
+            word_matches = rows if word_matches is None else word_matches & rows
+
+        for row in word_matches or ():
+            add(row, score_word_prefix)
+
+        # Substring of the name, candidates from the trigram index
+        query_grams = trigrams(query) if len(query) >= 3 else set()
+        inner_grams = {gram for gram in query_grams if ' ' not in gram[:2] and not gram.endswith(' ')}
+
+        if (inner_grams):
+            # Smallest posting lists first, the intersection shrinks fastest
+            postings = sorted((self.trigram_rows.get(gram, set()) for gram in inner_grams), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+        elif (len(query) >= 3):
+            # Only trigrams across spaces, check every name
+            candidates = range(len(self.lower_names))
+        else:
+            # One or two characters: prefix matches are enough while typing
+            candidates = ()
+
+        for row in candidates:
+            if (query in self.lower_names[row]):
+                add(row, score_substring)
+
+        # Fuzzy: names sharing most of the query's trigrams. Candidates come
+        # from the rarer trigrams only, the ones found in a large share of all
+        # names (' in', 'inc') would make nearly every name a candidate.
+        common = len(self.names) * common_trigram_share
+        rare_grams = [gram for gram in query_grams if len(self.trigram_rows.get(gram, ())) <= common]
+
+        if (fuzzy and rare_grams and (limit is None or len(scores) < limit)):
+            candidates = set().union(*(self.trigram_rows.get(gram, ()) for gram in rare_grams))
+
+            for row in candidates.difference(scores):
+                similarity = len(query_grams & self.row_trigrams[row]) / len(query_grams)
+                if (similarity >= fuzzy_threshold):
+                    add(row, score_fuzzy * similarity)
+
+        # Best score first, then shorter names, then symbol
+        def rank(row):
+            return (-scores[row], len(self.names[row]), self.symbols[row])
+
+        if (limit is None):
+            return sorted(scores, key=rank)
+        return heapq.nsmallest(limit, scores, key=rank)
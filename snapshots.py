@@ -0,0 +1,94 @@
+import json
+import os
+from datetime import datetime
+from datastore import atomic_write
+
+#-------------------------------------------------------------------------------
+# Versioned scan result snapshots
+#
+# <snapshot_directory>/<universe>/<YYYYmmddTHHMMSS>.json  - one scan result
+# <snapshot_directory>/<universe>/latest.json            - name of the newest
+#
+# The worker writes a snapshot file first and then swaps latest.json, both by
+# renaming a temporary file, so readers (any number of app replicas sharing the
+# directory) always see a complete snapshot.
+#-------------------------------------------------------------------------------
+latest_file = 'latest.json'
+
+# Snapshots kept per universe, older ones are removed
+snapshots_kept = 10
+
+#-------------------------------------------------------------------------------
+# Write the scan result of a universe as a new snapshot
+#-------------------------------------------------------------------------------
+def write_snapshot(snapshot_directory, universe, matches, symbol_list, **meta):
+    """
+    Args:
+        snapshot_directory (str): Root directory of all snapshots.
+        universe (str): Universe key, e.g. 'sp500'.
+        matches (List[Tuple[str, str]]): (pattern, symbol) scan matches.
+        symbol_list (List[str]): The symbols that were scanned.
+        meta: Anything else to record, e.g. timings.
+
+    Returns:
+        str: The name of the snapshot.
+    """
+    directory = os.path.join(snapshot_directory, universe)
+    os.makedirs(directory, exist_ok=True)
+
+    created = datetime.now()
+    name = created.strftime('%Y%m%dT%H%M%S')
+
+    snapshot = dict(meta, universe=universe, created=created.isoformat(timespec='seconds'),
+                    symbols=list(symbol_list), matches=[list(match) for match in matches])
+
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+
+    def write_latest(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump({'name': name}, f)
+
+    atomic_write(os.path.join(directory, name + '.json'), write)
+    atomic_write(os.path.join(directory, latest_file), write_latest)
+
+    prune_snapshots(directory)
+
+    return name
+
+#-------------------------------------------------------------------------------
+# Remove all but the newest snapshots
+#-------------------------------------------------------------------------------
+def prune_snapshots(directory, keep=snapshots_kept):
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json') and name != latest_file)
+
+    for name in names[:-keep]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+
+#-------------------------------------------------------------------------------
+# Name of the newest snapshot of a universe, None if there is none
+#-------------------------------------------------------------------------------
+def latest_snapshot_name(snapshot_directory, universe):
+    try:
+        with open(os.path.join(snapshot_directory, universe, latest_file), 'r') as f:
+            return json.load(f)['name']
+    except (OSError, ValueError, KeyError):
+        return None
+
+#-------------------------------------------------------------------------------
+# Read a snapshot
+#-------------------------------------------------------------------------------
+def load_snapshot(snapshot_directory, universe, name):
+    """
+    Returns:
+        dict: The snapshot, 'matches' holding (pattern, symbol) tuples.
+    """
+    with open(os.path.join(snapshot_directory, universe, name + '.json'), 'r') as f:
+        snapshot = json.load(f)
+
+    snapshot['matches'] = [tuple(match) for match in snapshot['matches']]
+    return snapshot
@@ -1,9 +1,15 @@
+import io
+from collections import OrderedDict
 import streamlit as st
 import matplotlib.pyplot as plt
 import numpy as np
-import yfinance as yf
 import datetime as dt
-import talib as ta
+from indicator_engine import IndicatorEngine
+from data_access import get_data_access, DeadlineExceeded
+from downloader import DownloadError
+from downsample import downsample_indices
+from instrumentation import timed, count
+from timeframes import resample_ohlcv, intraday_history_days
 
 #-------------------------------------------------------------------------------
 # Simple Moving Average
@@ -36,6 +42,9 @@ def RSI(data, window=14):
 # Calculate Linear Regression using the least squares method
 #-------------------------------------------------------------------------------
 def linear_regression(data, window=14):
+    # Only needed here, the page itself uses the indicator engine
+    import talib as ta
+
     x = np.arange(len(data))
     y = data['Close'].values
 
@@ -67,6 +76,195 @@ def MACD(data, short_window=12, long_window=26, signal_window=9):
     data['MACD_Hist'] = data['MACD'] - data['Signal_Line']
     return data
 
+#-------------------------------------------------------------------------------
+# Add all indicator columns using the streaming indicator engine
+#
+# The engine and its outputs are kept in the session. On a rerun with the same
+# ticker and parameters only the bars after the last processed one are fed to
+# the engine, anything else (new parameters, changed history) starts over.
+#
+# Other timeframes are resampled from the fetched bars. Their last bar is still
+# open (this week's bar changes every day), so it is only peeked at and fed to
+# the engine once a later bar exists.
+#-------------------------------------------------------------------------------
+def update_indicators(data, source, ema_period, rsi_period, sma_window, timeframe=None):
+    """
+    Args:
+        data (DataFrame): Stock data.
+        source (Tuple): Identifies the data, e.g. (ticker, start date).
+        ema_period, rsi_period, sma_window (int): Indicator window sizes.
+        timeframe (str): Timeframe to resample the data to, e.g. '1wk', None
+            for the bars as fetched.
+
+    Returns:
+        DataFrame: Stock data with EMA, RSI, SMA_100, Linear_Regression, MACD,
+        Signal_Line and MACD_Hist columns added.
+    """
+    open_bars = 0
+    if (timeframe is not None):
+        data = resample_ohlcv(data, timeframe)
+        open_bars = min(1, len(data))
+    closed = len(data) - open_bars
+
+    key = (source, timeframe, ema_period, rsi_period, sma_window)
+    state = st.session_state.get('indicator_state')
+    processed = 0 if state is None else len(state['dates'])
+
+    # The last processed bar must still be there with the same close, an
+    # intraday bar that moved since the last rerun means starting over
+    if (state is None or state['key'] != key or processed > closed
+            or (processed > 0 and (data.index[processed - 1] != state['dates'][-1]
+                                   or data['Close'].iloc[processed - 1] != state['last_close']))):
+        engine = IndicatorEngine(ema_window=ema_period, rsi_window=rsi_period, sma_window=sma_window)
+        state = {'key': key, 'engine': engine, 'dates': [], 'last_close': None,
+                 'outputs': {column: [] for column in IndicatorEngine.columns}}
+        st.session_state['indicator_state'] = state
+        processed = 0
+
+    # Feed only the new closed bars
+    new_outputs = state['engine'].update_many(data['Close'].values[processed:closed])
+    for column, values in new_outputs.items():
+        state['outputs'][column].extend(values)
+    state['dates'].extend(data.index[processed:closed])
+    if (closed > 0):
+        state['last_close'] = data['Close'].iloc[closed - 1]
+
+    outputs = state['outputs']
+    if (open_bars):
+        peeked = state['engine'].peek(data['Close'].iloc[-1])
+        outputs = {column: values + [peeked[column]] for column, values in outputs.items()}
+
+    for column in IndicatorEngine.columns:
+        data[column] = outputs[column]
+
+    return data
+
+#-------------------------------------------------------------------------------
+# Chart rendering
+#
+# The four indicator panels are separate images. In fast mode every series is
+# downsampled to about the chart's pixel width first (LTTB for lines, min-max
+# for the MACD histogram, which is drawn as one filled area instead of a bar
+# per day), so drawing takes the same time for one year or for decades.
+#-------------------------------------------------------------------------------
+chart_width = 10        # inches, at 100 dpi
+chart_points = 1000     # about one point per pixel
+panel_heights = {'price': 8, 'rsi': 2, 'regression': 2, 'macd': 2}
+
+# Rendered panels kept per session
+chart_cache_size = 16
+
+# Rows per page of the data table
+table_page_size = 100
+
+# Chart timeframes: label -> (fetched interval, timeframe to resample to).
+# Intraday charts are built from 5 minute bars, which Yahoo Finance only
+# serves for the last 60 days
+chart_timeframes = {
+    'Daily': ('1d', None),
+    'Weekly': ('1d', '1wk'),
+    'Monthly': ('1d', '1mo'),
+    'Hourly': ('5m', '1h'),
+    '15 minutes': ('5m', '15m'),
+    '5 minutes': ('5m', None),
+}
+
+def chart_series(data, column, fast, method='lttb'):
+    values = data[column].to_numpy(dtype=np.float64)
+    if (not fast):
+        return data.index, values
+
+    days = data.index.values.astype('datetime64[s]').astype(np.float64)
+    indices = downsample_indices(days, values, chart_points, method)
+    return data.index[indices], values[indices]
+
+#-------------------------------------------------------------------------------
+# Draw one indicator panel, returns it as PNG bytes
+#-------------------------------------------------------------------------------
+def render_panel(panel, data, ticker, ema_period, rsi_period, sma_window, fast=True):
+    fig, ax = plt.subplots(figsize=(chart_width, panel_heights[panel]))
+
+    if (panel == 'price'):
+        # Plot the Closing Price, Exponential Moving Average (EMA), and Simple Moving Average (SMA)
+        ax.plot(*chart_series(data, 'Close', fast), label='Closing Price', color='blue')
+        ax.plot(*chart_series(data, 'EMA', fast), label=f'EMA ({ema_period} periods)', color='orange')
+        ax.plot(*chart_series(data, 'SMA_100', fast), label=f'SMA ({sma_window} periods)', color='red')
+        ax.plot(*chart_series(data, 'Linear_Regression', fast), label='Linear Regression', color='green', linestyle='dashed')
+        ax.set_ylabel('Price')
+        ax.set_title(f'{ticker} - Closing Price, EMA, and SMA')
+
+    elif (panel == 'rsi'):
+        ax.plot(*chart_series(data, 'RSI', fast), label=f'RSI ({rsi_period} periods)', color='purple')
+        ax.axhline(y=30, color='g', linestyle='dashed')  # Add lower bound RSI threshold at 30
+        ax.axhline(y=70, color='r', linestyle='dashed')  # Add upper bound RSI threshold at 70
+        ax.set_xlabel('Date')
+        ax.set_ylabel('RSI')
+        ax.set_title(f'{ticker} - RSI')
+
+    elif (panel == 'regression'):
+        ax.plot(*chart_series(data, 'Close', fast), label='Closing Price', color='blue')
+        ax.plot(*chart_series(data, 'Linear_Regression', fast), label='Linear Regression', color='green', linestyle='dashed')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('Price')
+        ax.set_title(f'{ticker} - Closing Price vs. Linear Regression')
+
+    else:
+        if (fast):
+            # Highest and lowest bar of every pixel column, as one area
+            dates, hist = chart_series(data, 'MACD_Hist', fast, method='minmax')
+            ax.fill_between(dates, hist, 0, step='mid', label='MACD Hist', color='blue')
+        else:
+            ax.bar(data.index, data['MACD_Hist'], label='MACD Hist', color='blue')
+        ax.plot(*chart_series(data, 'MACD', fast), label='MACD', color='orange')
+        ax.plot(*chart_series(data, 'Signal_Line', fast), label='Signal Line', color='green')
+        ax.set_xlabel('Date')
+        ax.set_ylabel('MACD')
+        ax.set_title(f'{ticker} - MACD')
+
+    # Same date range on every panel, they are stacked like shared axes
+    if (len(data) > 0):
+        ax.set_xlim(data.index[0], data.index[-1])
+    ax.legend()
+    fig.tight_layout()
+
+    image = io.BytesIO()
+    fig.savefig(image, format='png', dpi=100)
+    plt.close(fig)
+
+    return image.getvalue()
+
+#-------------------------------------------------------------------------------
+# Rendered panels of this session, least recently used dropped first
+#-------------------------------------------------------------------------------
+def cached_chart(key, render):
+    cache = st.session_state.setdefault('chart_cache', OrderedDict())
+
+    if (key in cache):
+        cache.move_to_end(key)
+        count('chart_cache_hits')
+        return cache[key]
+
+    with timed('render_chart'):
+        image = cache[key] = render()
+    while len(cache) > chart_cache_size:
+        cache.popitem(last=False)
+
+    return image
+
+#-------------------------------------------------------------------------------
+# One page of the data table, only that page is sent to the browser
+#-------------------------------------------------------------------------------
+def show_table_page(data):
+    pages = max(1, -(-len(data) // table_page_size))
+
+    # Newest rows on the first page
+    page = st.number_input(f'Page (of {pages})', min_value=1, max_value=pages, value=1)
+    end = len(data) - (page - 1) * table_page_size
+    start = max(0, end - table_page_size)
+
+    st.dataframe(data.iloc[start:end][::-1])
+    st.caption(f'Rows {start + 1}-{end} of {len(data)}')
+
 #-------------------------------------------------------------------------------
 # Main
 #-------------------------------------------------------------------------------
@@ -78,75 +276,56 @@ def main():
     selected_ticker = st.text_input('Enter Ticker Symbol (e.g., META)', 'META')
     start_date = st.date_input("Select Start Date", value=dt.datetime(2021, 1, 1))
     end_date = dt.datetime.now()
+    timeframe_label = st.selectbox('Timeframe', list(chart_timeframes))
+    interval, timeframe = chart_timeframes[timeframe_label]
 
-    # Fetching the historical data for a selected stock and date range
-    data = yf.download(selected_ticker, start=start_date, end=end_date)
+    # Intraday bars only go back so far, today's bars are part of the range
+    if (interval != '1d'):
+        earliest = (end_date - dt.timedelta(days=intraday_history_days[interval] - 1)).date()
+        if (start_date < earliest):
+            st.caption(f'{timeframe_label} bars start on {earliest}.')
+            start_date = earliest
+        end_date = end_date + dt.timedelta(days=1)
 
-    # Calculate Exponential Moving Average (EMA)
-    ema_period = st.slider("Select EMA Period", min_value=0, max_value=100, value=20)
-    data = EMA(data, window=ema_period)
+    # Fetching the historical data for a selected stock and date range, through the shared price cache.
+    # A slow download shows the cached data, if any, and goes on in the background
+    access = get_data_access()
+    try:
+        with timed('prices'):
+            data = access.run(access.prices(selected_ticker, start_date, end_date, interval=interval))
+    except DownloadError:
+        st.warning(f"No data found for {selected_ticker}.")
+        return
+    except DeadlineExceeded:
+        st.info(f"Still downloading {selected_ticker}, rerun in a moment.")
+        return
 
-    # Calculate Relative Strength Index (RSI)
+    # Indicator parameters
+    ema_period = st.slider("Select EMA Period", min_value=0, max_value=100, value=20)
     rsi_period = st.slider("Select RSI Period", min_value=0, max_value=100, value=14)
-    data = RSI(data, window=rsi_period)
-
-    # Calculate Simple Moving Average (SMA)
     sma_window = st.slider("Select SMA Period", min_value=0, max_value=100, value=50)
-    data = SMA(data, window=sma_window)
-
-    # Calculate Linear Regression for Closing Price
-    data['Linear_Regression'] = linear_regression(data)
 
-    # Calculate MACD
-    data = MACD(data)
+    # Calculate EMA, RSI, SMA, Linear Regression for Closing Price and MACD,
+    # only the bars added since the last rerun are processed
+    with timed('indicators'):
+        data = update_indicators(data, (selected_ticker, start_date, interval), ema_period, rsi_period, sma_window,
+                                 timeframe)
 
-    # Display the DataFrame with EMA, RSI, SMA, MACD, Signal_Line, and MACD_Hist columns as a table in Streamlit app
+    # Display the DataFrame with EMA, RSI, SMA, MACD, Signal_Line, and MACD_Hist columns as a table in Streamlit app,
+    # one page at a time
     st.subheader("Historical Stock Data:")
-    st.dataframe(data)
+    show_table_page(data)
 
     st.header("Indicators")
-    # Create four subplots with a ratio of 4:1:1:1
-    fig, axs = plt.subplots(4, 1, figsize=(10, 14), sharex=True, gridspec_kw={'height_ratios': [4, 1, 1, 1]})
-
-    # Plot the Closing Price, Exponential Moving Average (EMA), and Simple Moving Average (SMA) on the first subplot
-    axs[0].plot(data.index, data['Close'], label='Closing Price', color='blue')
-    axs[0].plot(data.index, data['EMA'], label=f'EMA ({ema_period} periods)', color='orange')
-    axs[0].plot(data.index, data['SMA_100'], label=f'SMA ({sma_window} periods)', color='red')
-    axs[0].plot(data.index, data['Linear_Regression'], label='Linear Regression', color='green', linestyle='dashed')
-    axs[0].set_ylabel('Price')
-    axs[0].set_title(f'{selected_ticker} - Closing Price, EMA, and SMA')
-    axs[0].legend()
-
-    # Plot the RSI on the second subplot
-    axs[1].plot(data.index, data['RSI'], label=f'RSI ({rsi_period} periods)', color='purple')
-    axs[1].axhline(y=30, color='g', linestyle='dashed')  # Add lower bound RSI threshold at 30
-    axs[1].axhline(y=70, color='r', linestyle='dashed')  # Add upper bound RSI threshold at 70
-    axs[1].set_xlabel('Date')
-    axs[1].set_ylabel('RSI')
-    axs[1].set_title(f'{selected_ticker} - RSI')
-    axs[1].legend()
-
-    # Plot the Linear Regressi on the third subplot
-    axs[2].plot(data.index, data['Close'], label='Closing Price', color='blue')
-    axs[2].plot(data.index, data['Linear_Regression'], label='Linear Regression', color='green', linestyle='dashed')
-    axs[2].set_xlabel('Date')
-    axs[2].set_ylabel('Price')
-    axs[2].set_title(f'{selected_ticker} - Closing Price vs. Linear Regression')
-    axs[2].legend()
-
-    # Plot the MACD and Signal Line on the fourth subplot
-    axs[3].bar(data.index, data['MACD_Hist'], label='MACD Hist', color='blue')
-    axs[3].plot(data.index, data['MACD'], label='MACD', color='orange')
-    axs[3].plot(data.index, data['Signal_Line'], label=f'Signal Line', color='green')
-    axs[3].set_xlabel('Date')
-    axs[3].set_ylabel('MACD')
-    axs[3].set_title(f'{selected_ticker} - MACD')
-    axs[3].legend()
-
-
-    plt.tight_layout()
-
-    st.pyplot(fig)
+    fast = st.checkbox('Fast charts (downsampled to the chart width)', value=True)
+
+    # Each panel is drawn once and reused until its own data or parameters change
+    version = (len(data), data.index[-1], data['Close'].iloc[-1]) if len(data) > 0 else None
+    for panel, params in (('price', (ema_period, sma_window)), ('rsi', (rsi_period,)),
+                          ('regression', ()), ('macd', ())):
+        key = (panel, selected_ticker, start_date, timeframe_label, version, params, fast)
+        st.image(cached_chart(key, lambda: render_panel(panel, data, selected_ticker, ema_period, rsi_period,
+                                                        sma_window, fast)))
 
 #-------------------------------------------------------------------------------
 # Driver
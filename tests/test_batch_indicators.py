@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from batch_indicators import ema_matrix
+
+def test_ema_matrix_matches_pandas_over_inner_gaps():
+    closes = np.array([[np.nan, 10.0],
+                       [100.0, 11.0],
+                       [101.0, np.nan],
+                       [np.nan, np.nan],
+                       [np.nan, 12.0],
+                       [104.0, 13.0],
+                       [105.0, 12.5]])
+
+    expected = pd.DataFrame(closes).ewm(span=20, adjust=False).mean().values
+
+    np.testing.assert_allclose(ema_matrix(closes, 20), expected, rtol=1e-12)
+
+def test_ema_matrix_carries_the_last_value_over_a_gap():
+    ema = ema_matrix(np.array([1.0, 2.0, np.nan, np.nan, 3.0]), 5)[:, 0]
+
+    assert ema[2] == ema[1] and ema[3] == ema[1]
+    assert not np.isnan(ema[4])
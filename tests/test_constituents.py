@@ -0,0 +1,68 @@
+import os
+import pytest
+from constituents import ConstituentsManager
+import universes
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def universe(tmp_path, monkeypatch):
+    monkeypatch.setitem(universes.universes, 'test', {
+        'title': 'Test', 'url': 'https://example.com', 'table_num': 0, 'column_name': 'Symbol',
+        'data_directory': str(tmp_path), 'symbols_file': os.path.join(str(tmp_path), 'test.txt'),
+    })
+    return 'test'
+
+def test_failed_refresh_is_not_retried_before_retry_seconds(universe):
+    clock = Clock(1000.0)
+    calls = []
+
+    def fetch(url, table_num, column_name):
+        calls.append(clock.now)
+        if (len(calls) > 1):
+            raise OSError('Wikipedia is down')
+        return ['AAPL', 'MSFT']
+
+    manager = ConstituentsManager(universe, max_age=100, fetch=fetch, clock=clock, retry_seconds=50)
+    assert manager.get().symbols == ['AAPL', 'MSFT']
+
+    # Stale, the refresh fails and the local list is kept
+    clock.now = 1200.0
+    assert manager.get().symbols == ['AAPL', 'MSFT']
+    assert calls == [1000.0, 1200.0]
+
+    # Reruns inside the backoff, also from a new manager, don't ask again
+    clock.now = 1240.0
+    assert manager.get().symbols == ['AAPL', 'MSFT']
+    assert ConstituentsManager(universe, max_age=100, fetch=fetch, clock=clock,
+                               retry_seconds=50).get().symbols == ['AAPL', 'MSFT']
+    assert calls == [1000.0, 1200.0]
+
+    # Once it expires Wikipedia is asked again
+    clock.now = 1250.0
+    manager.get()
+    assert calls == [1000.0, 1200.0, 1250.0]
+
+def test_refresh_after_a_failure_clears_it(universe):
+    clock = Clock(1000.0)
+    fail = [True]
+
+    def fetch(url, table_num, column_name):
+        if (fail[0]):
+            raise OSError('Wikipedia is down')
+        return ['AAPL']
+
+    manager = ConstituentsManager(universe, max_age=100, fetch=fetch, clock=clock, retry_seconds=50)
+    with pytest.raises(OSError):
+        manager.get()
+
+    # Without a local list there is nothing to fall back on, it is asked again
+    fail[0] = False
+    clock.now = 1001.0
+    assert manager.get().symbols == ['AAPL']
+    assert 'failed' not in manager.load_state()
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from indicator_engine import IndicatorEngine, LinearRegressionState, SMAState
+import stock_performance
+
+def test_sma_recovers_once_a_nan_leaves_the_window():
+    closes = [1.0, 2.0, np.nan, 4.0, 5.0, 6.0, 7.0, 8.0]
+    state = SMAState(window=3)
+
+    values = [state.update(close) for close in closes]
+    expected = pd.Series(closes).rolling(window=3).mean().tolist()
+
+    np.testing.assert_allclose(values, expected)
+    assert values[-1] == 7.0
+
+def test_sma_peek_matches_update_after_a_nan():
+    state = SMAState(window=2)
+    for close in (1.0, np.nan, 3.0):
+        state.update(close)
+
+    assert state.peek(5.0) == state.update(5.0) == 4.0
+
+#-------------------------------------------------------------------------------
+# Closes with leading and inner gaps, one of them several bars long
+#-------------------------------------------------------------------------------
+def gapped_closes():
+    rng = np.random.default_rng(3)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 300)))
+    closes[[0, 1, 50, 51, 52, 120, 200]] = np.nan
+    return closes
+
+def engine_outputs(closes):
+    engine = IndicatorEngine(ema_window=20, rsi_window=14, sma_window=30)
+    return engine.update_many(closes)
+
+def test_engine_matches_pandas_over_gaps():
+    closes = gapped_closes()
+    data = pd.DataFrame({'Close': closes})
+    stock_performance.EMA(data, 20)
+    stock_performance.RSI(data, 14)
+    stock_performance.SMA(data, 30)
+    stock_performance.MACD(data)
+
+    outputs = engine_outputs(closes)
+
+    for column in ('EMA', 'RSI', 'SMA_100', 'MACD', 'Signal_Line', 'MACD_Hist'):
+        np.testing.assert_allclose(outputs[column], data[column].values, rtol=1e-9, atol=1e-9, err_msg=column)
+
+    # A close after a gap updates the indicators instead of turning them NaN
+    assert not np.isnan(outputs['EMA'][-1]) and not np.isnan(outputs['RSI'][-1])
+
+def test_linear_regression_is_nan_only_while_a_gap_is_in_the_window():
+    closes = gapped_closes()
+    window = 14
+
+    state = LinearRegressionState(window)
+    values = [state.update(close) for close in closes]
+
+    for end in range(len(closes)):
+        y = closes[max(0, end - window + 1):end + 1]
+        if (len(y) < window or np.isnan(y).any()):
+            assert np.isnan(values[end])
+        else:
+            slope, intercept = np.polyfit(np.arange(window), y, 1)
+            assert np.isclose(values[end], intercept + slope * (window - 1), rtol=1e-9)
+
+def test_peek_matches_update_over_gaps():
+    engine = IndicatorEngine(ema_window=20, rsi_window=14, sma_window=30)
+
+    for close in gapped_closes():
+        peeked = engine.peek(close)
+        updated = engine.update(close)
+        np.testing.assert_allclose(list(peeked.values()), list(updated.values()), rtol=1e-12)
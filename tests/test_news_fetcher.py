@@ -0,0 +1,19 @@
+from news_fetcher import parse_headlines
+
+headline = 'Markets rally as inflation cools for the third month in a row'
+
+def test_image_link_without_closing_slash_keeps_later_headlines():
+    html = ('<a href="/a1"><img src="x.jpg"></a>'
+            f'<a href="/story-1">{headline}</a>'
+            '<p>Text<br>more text</p>'
+            '<a href="/story-2"><span>Oil prices slip after the latest OPEC meeting ends</span></a>')
+
+    assert parse_headlines(html, 'https://example.com') == [
+        (headline, 'https://example.com/story-1'),
+        ('Oil prices slip after the latest OPEC meeting ends', 'https://example.com/story-2'),
+    ]
+
+def test_link_with_a_void_element_next_to_its_text_is_skipped():
+    html = f'<a href="/photo"><img src="x.jpg">{headline}</a><a href="/story">{headline}!</a>'
+
+    assert parse_headlines(html, '') == [(headline + '!', '/story')]
@@ -1,21 +1,39 @@
 import streamlit as st
 import pandas as pd
+from search_index import TickerIndex
+
+# Most results shown for one search
+max_results = 50
 
 #-------------------------------------------------------------------------------
 # Search for companies by name in the given DataFrame. 
 #-------------------------------------------------------------------------------
-def search_company_by_name(df, query):
+def search_company_by_name(df, query, index=None, limit=None):
     """
     Args:
         df (pd.DataFrame): The DataFrame containing company data.
-        query (str): The company name to search for.
+        query (str): The company name (or ticker symbol) to search for.
+        index (TickerIndex): Search index built from df, built here if None.
+        limit (int): Maximum number of results, None for all.
 
     Returns:
-        pd.DataFrame: The DataFrame containing the search results.
+        pd.DataFrame: The DataFrame containing the search results, best matches first.
     """
-    result = df[df['Name'].str.contains(query, case=False, na=False)]
+    if (index is None):
+        index = TickerIndex(df)
+
+    result = df.iloc[index.search(query, limit=limit)]
     return result[['Name', 'Symbol']]
 
+#-------------------------------------------------------------------------------
+# Load the company data and build the search index once per process, the
+# index is shared by all sessions
+#-------------------------------------------------------------------------------
+@st.cache_resource
+def load_search_index():
+    df = pd.read_csv("nasdaq_screener.csv")
+    return df, TickerIndex(df)
+
 
 #-------------------------------------------------------------------------------
 # The main function that runs the Streamlit application.
@@ -24,15 +42,15 @@ def main():
     st.title("🔎 Company Search")
     st.write("There is no need to open Google Search if you are unsure what is the ticker of a company you want to find. Search our NASDAQ database of companies by name.")
 
-    # Load data from the CSV file
-    df = pd.read_csv("nasdaq_screener.csv")
+    # Load data from the CSV file and the search index
+    df, index = load_search_index()
 
     # Input box to enter the company name to search
     search_query = st.text_input("Enter the company name to search:")
 
     if search_query:
         # Search and display results
-        search_results = search_company_by_name(df, search_query)
+        search_results = search_company_by_name(df, search_query, index=index, limit=max_results)
         if not search_results.empty:
             st.header("Search Results:")
             st.dataframe(search_results, height=len(search_results) * 50)
@@ -0,0 +1,248 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from instrumentation import register_stats
+
+#-------------------------------------------------------------------------------
+# Timeframes and OHLCV resampling
+#
+# The stores keep the finest bars downloaded: daily bars in the universe's
+# directory, intraday bars (e.g. 5m) in a subdirectory per interval (see
+# datastore.py). Every other timeframe is derived from those bars here:
+#
+#   bucket_ids     - which bar of the timeframe every stored bar falls in,
+#                    integer arithmetic on the int64 timestamps
+#   resample_ohlcv - first Open, highest High, lowest Low, last Close and
+#                    summed Volume of every bucket with reduceat, no groupby
+#
+# Bars are labelled with the start of their bucket, weeks start on Monday.
+# Intraday buckets are aligned to the clock (a 1h bar covers 10:00-11:00) of
+# the bars' own times, the downloaded bars are in the exchange's local time.
+#-------------------------------------------------------------------------------
+
+# name -> length in seconds, None for the calendar timeframes
+timeframes = {
+    '1m': 60,
+    '2m': 2 * 60,
+    '5m': 5 * 60,
+    '15m': 15 * 60,
+    '30m': 30 * 60,
+    '1h': 60 * 60,
+    '1d': 24 * 60 * 60,
+    '1wk': None,
+    '1mo': None,
+}
+
+# Intervals that can be downloaded and stored, finest first, with the days
+# of history Yahoo Finance serves for them
+intraday_history_days = {
+    '1m': 7,
+    '2m': 60,
+    '5m': 60,
+    '15m': 60,
+    '30m': 60,
+    '1h': 730,
+}
+
+# Trading days in a bar of the calendar timeframes
+trading_days_per_bar = {'1wk': 5, '1mo': 21}
+
+# Bars of history a new symbol gets for a scan of weeks or months, most TA-Lib
+# patterns look back about 10 bars
+scan_history_bars = 20
+
+day_ns = 24 * 60 * 60 * 10**9
+
+def check_timeframe(timeframe):
+    if (timeframe not in timeframes):
+        raise ValueError(f"Unknown timeframe '{timeframe}', expected one of {list(timeframes)}")
+
+def is_intraday(timeframe):
+    check_timeframe(timeframe)
+    return timeframes[timeframe] is not None and timeframes[timeframe] < timeframes['1d']
+
+#-------------------------------------------------------------------------------
+# Trading days of daily bars to download for a scan of the timeframe
+#-------------------------------------------------------------------------------
+def history_days(timeframe, days=10):
+    """
+    Args:
+        days (int): Trading days for daily and intraday scans.
+
+    Returns:
+        int: `days`, or scan_history_bars weeks or months of trading days.
+    """
+    check_timeframe(timeframe)
+
+    if (timeframe in trading_days_per_bar):
+        return max(days, scan_history_bars * trading_days_per_bar[timeframe])
+    return days
+
+#-------------------------------------------------------------------------------
+# Can bars of `interval` be aggregated into bars of `timeframe`
+#-------------------------------------------------------------------------------
+def derivable(interval, timeframe):
+    check_timeframe(interval)
+    check_timeframe(timeframe)
+
+    step, target = timeframes[interval], timeframes[timeframe]
+    if (target is None):
+        # Weeks and months from days or anything finer
+        return step is not None or interval == timeframe
+    return step is not None and target % step == 0
+
+#-------------------------------------------------------------------------------
+# Bucket of every timestamp and the start of every bucket
+#-------------------------------------------------------------------------------
+def bucket_ids(times, timeframe):
+    """
+    Args:
+        times (np.ndarray): datetime64 timestamps.
+
+    Returns:
+        np.ndarray: int64 bucket number of every timestamp, increasing with time.
+    """
+    check_timeframe(timeframe)
+    ns = np.asarray(times).astype('datetime64[ns]').astype(np.int64)
+
+    if (timeframe == '1wk'):
+        # 1970-01-01 was a Thursday, shifted so the weeks start on Monday
+        return (ns // day_ns + 3) // 7
+    if (timeframe == '1mo'):
+        return np.asarray(times).astype('datetime64[M]').astype(np.int64)
+
+    return ns // (timeframes[timeframe] * 10**9)
+
+def bucket_starts(buckets, timeframe):
+    if (timeframe == '1wk'):
+        return (buckets * 7 - 3).astype('datetime64[D]').astype('datetime64[ns]')
+    if (timeframe == '1mo'):
+        return buckets.astype('datetime64[M]').astype('datetime64[ns]')
+
+    return (buckets * (timeframes[timeframe] * 10**9)).astype('datetime64[ns]')
+
+#-------------------------------------------------------------------------------
+# Aggregate bars into a coarser timeframe
+#-------------------------------------------------------------------------------
+def resample_ohlcv(data, timeframe):
+    """
+    Args:
+        data (DataFrame): Bars indexed by time with Open, High, Low, Close and
+            optionally Adj Close and Volume columns.
+        timeframe (str): Key of timeframes, e.g. '1h' or '1wk'.
+
+    Returns:
+        DataFrame: One row per bucket holding at least one bar, indexed by the
+        start of the bucket.
+    """
+    check_timeframe(timeframe)
+
+    if (not data.index.is_monotonic_increasing):
+        data = data.sort_index()
+
+    if (len(data) == 0):
+        return data.copy()
+
+    buckets = bucket_ids(data.index.values, timeframe)
+
+    # First and last bar of every bucket
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.append(starts[1:], len(buckets)) - 1
+
+    columns = {}
+    for column in data.columns:
+        values = data[column].to_numpy(dtype=np.float64)
+
+        if (column == 'Open'):
+            columns[column] = values[starts]
+        elif (column == 'High'):
+            # fmax / fmin skip the NaN bars of a bucket
+            columns[column] = np.fmax.reduceat(values, starts)
+        elif (column == 'Low'):
+            columns[column] = np.fmin.reduceat(values, starts)
+        elif (column == 'Volume'):
+            columns[column] = np.add.reduceat(np.nan_to_num(values), starts)
+        else:
+            # Close, Adj Close and anything else: the last bar's value
+            columns[column] = values[ends]
+
+    # Time zone aware bars are bucketed in UTC, the index keeps their time zone
+    index = pd.DatetimeIndex(bucket_starts(buckets[starts], timeframe), name=data.index.name)
+    if (getattr(data.index, 'tz', None) is not None):
+        index = index.tz_localize('UTC').tz_convert(data.index.tz)
+    return pd.DataFrame(columns, index=index)
+
+#-------------------------------------------------------------------------------
+# Resampled bars shared by all sessions of the process
+#
+# Entries are keyed by the version of the source bars (e.g. the csv file's
+# size and mtime), so a refresh of the source makes a new entry and the old
+# one is evicted, least recently used first, once the cache is over max_bytes.
+#-------------------------------------------------------------------------------
+class ResampleCache:
+    def __init__(self, max_bytes=128 * 2**20):
+        self.max_bytes = max_bytes
+        self.used = 0
+        # key -> (DataFrame, size in bytes)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key, timeframe, load):
+        """
+        Args:
+            key (Tuple): Identifies the source bars and their version.
+            load (Callable): load() -> source DataFrame or None, only called
+                when the bars aren't cached.
+
+        Returns:
+            DataFrame: The bars of the timeframe, shared: callers must copy it
+            before changing it. None if load() had no data.
+        """
+        key = key + (timeframe,)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if (entry is not None):
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[0]
+            self.stats['misses'] += 1
+
+        data = load()
+        if (data is None):
+            return None
+        bars = resample_ohlcv(data, timeframe)
+
+        size = int(bars.memory_usage(deep=True).sum())
+        if (size > self.max_bytes):
+            return bars
+
+        with self.lock:
+            if (key in self.entries):
+                self.used -= self.entries.pop(key)[1]
+
+            self.entries[key] = (bars, size)
+            self.used += size
+
+            while self.used > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.used -= evicted_size
+                self.stats['evictions'] += 1
+
+        return bars
+
+shared_cache = None
+shared_cache_lock = threading.Lock()
+
+def get_shared_resample_cache():
+    global shared_cache
+
+    with shared_cache_lock:
+        if (shared_cache is None):
+            shared_cache = ResampleCache()
+            register_stats('resample_cache', shared_cache.stats)
+
+    return shared_cache
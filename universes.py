@@ -0,0 +1,79 @@
+import os
+
+#-------------------------------------------------------------------------------
+# Paths, files and urls of the symbol universes
+#-------------------------------------------------------------------------------
+ndx_url = 'https://en.wikipedia.org/wiki/Nasdaq-100'
+sp500_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
+
+ndx_data_directory = 'data/ndx'
+ndx_symbols = ndx_data_directory + '/ndx.txt'
+
+sp500_data_directory = 'data/sp500'
+sp500_symbols = sp500_data_directory + '/sp500.txt'
+
+screener_data_directory = 'data/screener'
+screener_symbols = screener_data_directory + '/screener.txt'
+
+# Where the precomputed scan results of every universe are kept (see snapshots.py)
+snapshot_directory = 'data/snapshots'
+
+#-------------------------------------------------------------------------------
+# Scan and download settings, shared by the app and the background worker
+#   scan_workers  - number of pool workers used by the scan, 1 scans serially
+#   scan_executor - 'process' or 'thread' pool
+#-------------------------------------------------------------------------------
+scan_workers = int(os.environ.get('SCAN_WORKERS', os.cpu_count() or 1))
+scan_executor = os.environ.get('SCAN_EXECUTOR', 'process')
+
+# Number of symbols downloaded at the same time
+download_workers = int(os.environ.get('DOWNLOAD_WORKERS', 8))
+
+# Where scans load symbol data from: 'csv', 'memmap' (converted after each refresh) or
+# 'panel' (all csv files loaded into memory once per process, see ohlc_panel.py)
+storage_backend = os.environ.get('OHLC_BACKEND', 'csv')
+
+# How long downloaded data is considered fresh before missing days are fetched again
+data_refresh_seconds = int(os.environ.get('DATA_REFRESH_SECONDS', 60 * 60))
+
+# How long the index constituents are used before Wikipedia is asked again (see constituents.py)
+constituents_refresh_seconds = int(os.environ.get('CONSTITUENTS_REFRESH_SECONDS', 7 * 24 * 60 * 60))
+
+# How long a failed constituents refresh is not retried, the local list is used meanwhile
+constituents_retry_seconds = int(os.environ.get('CONSTITUENTS_RETRY_SECONDS', 60 * 60))
+
+# Seconds a page waits for a fetch before showing cached data instead (see data_access.py)
+fetch_deadline_seconds = float(os.environ.get('FETCH_DEADLINE_SECONDS', 5))
+
+# Serve earnings only from the local store, without network calls (see earnings.py)
+earnings_offline = os.environ.get('EARNINGS_OFFLINE', '') not in ('', '0')
+
+# Record phase timings, counters and errors of the hot paths (see instrumentation.py)
+instrumentation_enabled = os.environ.get('INSTRUMENTATION', '') not in ('', '0')
+
+# Port of the Prometheus /metrics endpoint of the app, 0 for none
+metrics_port = int(os.environ.get('METRICS_PORT', 0))
+
+#-------------------------------------------------------------------------------
+# Universes built from a Wikipedia table
+#   For nasdaq -> the fifth table (4) and column named 'Ticker'
+#   For S&P 500 -> the first table (0) and column named 'Symbol'
+#-------------------------------------------------------------------------------
+universes = {
+    'ndx': {
+        'title': 'Nasdaq 100',
+        'url': ndx_url,
+        'table_num': 4,
+        'column_name': 'Ticker',
+        'data_directory': ndx_data_directory,
+        'symbols_file': ndx_symbols,
+    },
+    'sp500': {
+        'title': 'S&P 500',
+        'url': sp500_url,
+        'table_num': 0,
+        'column_name': 'Symbol',
+        'data_directory': sp500_data_directory,
+        'symbols_file': sp500_symbols,
+    },
+}
@@ -0,0 +1,91 @@
+#-------------------------------------------------------------------------------
+# Background worker: refresh symbol lists, data and scan results
+#
+#   python worker.py                      # loop forever, every hour
+#   python worker.py --once               # one refresh, e.g. from cron
+#   python worker.py --universe sp500 --interval 900
+#
+# Each run writes a versioned snapshot of the scan results (see snapshots.py),
+# the Candlestick page only loads the latest snapshot.
+#-------------------------------------------------------------------------------
+import argparse
+import logging
+import time
+from batch_scan import run_batch_scan
+from datastore import storage_backends
+from scan_cache import get_shared_scan_cache
+from snapshots import write_snapshot
+from constituents import ConstituentsManager
+from instrumentation import metrics, start_http_server
+from universes import universes, snapshot_directory, scan_workers, scan_executor, storage_backend
+
+log = logging.getLogger('worker')
+
+#-------------------------------------------------------------------------------
+# Refresh one universe and write its snapshot
+#-------------------------------------------------------------------------------
+def refresh_universe(key, workers=scan_workers, executor=scan_executor, backend=storage_backend):
+    universe = universes[key]
+    timings = {}
+
+    start = time.perf_counter()
+    change = ConstituentsManager(key).get()
+    symbol_list = change.symbols
+    if (change):
+        log.info('%s: constituents added %s, removed %s', key, change.added, change.removed)
+    timings['symbols'] = time.perf_counter() - start
+
+    # Results also go to the scan cache, so an app without snapshots finds them too
+    result = run_batch_scan(universe['data_directory'], symbol_list, workers=workers, executor=executor,
+                            backend=backend, timings=timings, cache=get_shared_scan_cache())
+
+    name = write_snapshot(snapshot_directory, key, result.matches, symbol_list,
+                          failed_downloads=result.failed, timings=result.timings)
+
+    log.info('%s: snapshot %s, %d symbols, %d matches, %d failed downloads, %s', key, name,
+             len(symbol_list), len(result.matches), len(result.failed),
+             ', '.join(f'{phase} {seconds:.1f}s' for phase, seconds in result.timings.items()))
+
+#-------------------------------------------------------------------------------
+# Main
+#-------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description='Precompute candlestick scan results.')
+    parser.add_argument('--universe', nargs='+', choices=sorted(universes), default=sorted(universes))
+    parser.add_argument('--interval', type=float, default=60 * 60, help='seconds between refreshes')
+    parser.add_argument('--once', action='store_true', help='refresh once and exit')
+    parser.add_argument('--workers', type=int, default=scan_workers)
+    parser.add_argument('--executor', choices=['process', 'thread'], default=scan_executor)
+    parser.add_argument('--backend', choices=sorted(storage_backends), default=storage_backend)
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='serve Prometheus metrics on this port (with INSTRUMENTATION=1)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if (args.metrics_port and metrics.enabled):
+        start_http_server(args.metrics_port)
+
+    while True:
+        started = time.monotonic()
+
+        for key in args.universe:
+            # One failing universe (e.g. Wikipedia down) doesn't stop the others
+            try:
+                refresh_universe(key, args.workers, args.executor, args.backend)
+            except Exception:
+                log.exception('%s: refresh failed, keeping the previous snapshot', key)
+
+        # One JSON line with the phase timings, counters and errors so far
+        metrics.log_snapshot()
+
+        if (args.once):
+            break
+
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+#-------------------------------------------------------------------------------
+# Driver
+#-------------------------------------------------------------------------------
+if __name__ == '__main__':
+    main()